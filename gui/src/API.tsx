@@ -30,6 +30,11 @@ export class SeismicRecord {
 
     public magnitude: number = 0;
     public maximum_acceleration: number = 0;
+    public maximum_velocity: number = 0;
+    public maximum_displacement: number = 0;
+    public arias_intensity: number = 0;
+    public cumulative_absolute_velocity: number = 0;
+    public significant_duration: number = 0;
 
     public event_time: Date = new Date(0);
     public event_location: number[] = Array<number>(2);
@@ -100,6 +105,16 @@ export class QueryConfig {
     public to_date: Date | undefined;
     public min_pga: number | undefined;
     public max_pga: number | undefined;
+    public min_pgv: number | undefined;
+    public max_pgv: number | undefined;
+    public min_pgd: number | undefined;
+    public max_pgd: number | undefined;
+    public min_arias_intensity: number | undefined;
+    public max_arias_intensity: number | undefined;
+    public min_cav: number | undefined;
+    public max_cav: number | undefined;
+    public min_significant_duration: number | undefined;
+    public max_significant_duration: number | undefined;
     public file_name: string | undefined;
     public station_code: string | undefined;
     public direction: string | undefined;
@@ -183,11 +198,21 @@ export class ProcessConfig {
     public with_filter: Boolean | undefined;
     public with_spectrum: Boolean | undefined;
     public with_response_spectrum: Boolean | undefined;
+    public with_spectrogram: Boolean | undefined;
+    public with_scalogram: Boolean | undefined;
     public remove_head: number | undefined;
 }
 
+export interface TimeFrequency {
+    time: number[];
+    frequency: number[];
+    amplitude: number[][];
+}
+
 export class ProcessResponse extends SeismicRecord {
     process_config: ProcessConfig;
+    spectrogram: TimeFrequency | undefined;
+    scalogram: TimeFrequency | undefined;
 }
 
 export async function process_api(record_id: string, config: ProcessConfig) {
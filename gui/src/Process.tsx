@@ -35,7 +35,16 @@ import {
     Stack,
     TextField,
 } from "./ui";
-import { createDownloadLink, ifError, isNumeric, process_api, ProcessConfig, ProcessResponse, sxProps } from "./API";
+import {
+    createDownloadLink,
+    ifError,
+    isNumeric,
+    process_api,
+    ProcessConfig,
+    ProcessResponse,
+    sxProps,
+    TimeFrequency,
+} from "./API";
 import Plotly from "plotly.js-basic-dist-min";
 
 const [processed, setProcessed] = createSignal<ProcessResponse>({} as ProcessResponse);
@@ -52,6 +61,8 @@ const [withSpectrum, setWithSpectrum] = createSignal(false);
 const [withEnergy, setWithEnergy] = createSignal(false);
 const [withLogScale, setWithLogScale] = createSignal(false);
 const [withResponseSpectrum, setWithResponseSpectrum] = createSignal(false);
+const [withSpectrogram, setWithSpectrogram] = createSignal(false);
+const [withScalogram, setWithScalogram] = createSignal(false);
 
 const [lowCut, setLowCut] = createSignal("");
 const [highCut, setHighCut] = createSignal("");
@@ -76,6 +87,8 @@ const Settings: Component<sxProps> = (props) => {
         setWithLogScale(false);
         setWithEnergy(false);
         setWithResponseSpectrum(false);
+        setWithSpectrogram(false);
+        setWithScalogram(false);
 
         setLowCut("");
         setHighCut("");
@@ -101,6 +114,8 @@ const Settings: Component<sxProps> = (props) => {
         if (normalised()) config.normalised = normalised();
 
         config.with_spectrum = withSpectrum();
+        config.with_spectrogram = withSpectrogram();
+        config.with_scalogram = withScalogram();
 
         config.with_filter = withFilter();
         if (upRatio() > 1) config.up_ratio = upRatio();
@@ -198,6 +213,14 @@ const Settings: Component<sxProps> = (props) => {
             content: "Further process the record by applying a filter.",
             animation: "scale",
         });
+        tippy(`#chk-spectrogram`, {
+            content: "Compute the short-time Fourier amplitude spectrum of the processed waveform.",
+            animation: "scale",
+        });
+        tippy(`#chk-scalogram`, {
+            content: "Compute the Morlet wavelet scalogram of the processed waveform.",
+            animation: "scale",
+        });
         tippy(`#chk-response-spectrum`, {
             content: "Compute response spectra of the original waveform.",
             animation: "scale",
@@ -261,6 +284,25 @@ const Settings: Component<sxProps> = (props) => {
                         label="Energy Accumulation"
                         control={<Checkbox checked={withEnergy()} onChange={(_, checked) => setWithEnergy(checked)} />}
                     />
+                    <FormControlLabel
+                        id="chk-spectrogram"
+                        name="chk-spectrogram"
+                        label="Spectrogram"
+                        control={
+                            <Checkbox
+                                checked={withSpectrogram()}
+                                onChange={(_, checked) => setWithSpectrogram(checked)}
+                            />
+                        }
+                    />
+                    <FormControlLabel
+                        id="chk-scalogram"
+                        name="chk-scalogram"
+                        label="Scalogram"
+                        control={
+                            <Checkbox checked={withScalogram()} onChange={(_, checked) => setWithScalogram(checked)} />
+                        }
+                    />
                     <TextField
                         size="small"
                         id="record-id"
@@ -785,6 +827,58 @@ const ResponseSpectrum: Component<sxProps> = (props) => {
     return <For each={["a_spectrum", "v_spectrum", "u_spectrum"]}>{(item) => <Paper id={item} sx={props.sx} />}</For>;
 };
 
+interface TimeFrequencyProps extends sxProps {
+    name: "spectrogram" | "scalogram";
+}
+
+// the tiles are drawn on a canvas since the basic plotly bundle does not ship heatmaps
+const TimeFrequencyMap: Component<TimeFrequencyProps> = (props) => {
+    let canvas: HTMLCanvasElement | undefined;
+
+    createEffect(() => {
+        const tile: TimeFrequency | undefined = processed()[props.name];
+        if (loading() || !tile || !canvas) return;
+
+        const height = tile.amplitude.length;
+        const width = height > 0 ? tile.amplitude[0].length : 0;
+        if (width === 0) return;
+
+        canvas.width = width;
+        canvas.height = height;
+
+        // colours follow the logarithmic amplitude over a range of 60 dB
+        const peak = Math.log10(Math.max(...tile.amplitude.map((row) => Math.max(...row))) || 1);
+        const context = canvas.getContext("2d")!;
+        const image = context.createImageData(width, height);
+        for (let i = 0; i < height; i++)
+            for (let j = 0; j < width; j++) {
+                const level = Math.min(1, Math.max(0, 1 + (Math.log10(tile.amplitude[i][j]) - peak) / 3));
+                // low frequencies at the bottom
+                const k = 4 * ((height - 1 - i) * width + j);
+                image.data[k] = 255 * Math.min(1, 2 * level);
+                image.data[k + 1] = 255 * Math.max(0, 2 * level - 1);
+                image.data[k + 2] = 255 * (1 - level);
+                image.data[k + 3] = 255;
+            }
+        context.putImageData(image, 0, 0);
+    });
+
+    const range = (values: number[] | undefined) =>
+        values && values.length ? `${values[0].toPrecision(3)} - ${values[values.length - 1].toPrecision(3)}` : "";
+
+    return (
+        <Paper sx={{ ...props.sx, display: "flex", flexDirection: "column", padding: "1rem", gap: "0.5rem" }}>
+            <Box>
+                {`${props.name === "spectrogram" ? "Spectrogram" : "Scalogram"} of ${processed().file_name}, `}
+                {`time ${range(processed()[props.name]?.time)} s, `}
+                {`frequency ${range(processed()[props.name]?.frequency)} Hz`}
+                {props.name === "scalogram" ? " (log scale)" : ""}
+            </Box>
+            <canvas ref={canvas} style={{ width: "100%", "flex-grow": 1, "image-rendering": "pixelated" }} />
+        </Paper>
+    );
+};
+
 const Process: Component<sxProps> = (props) => {
     return (
         <Stack sx={{ gap: "1rem", flexGrow: 1 }}>
@@ -794,6 +888,12 @@ const Process: Component<sxProps> = (props) => {
             {withSpectrum() && withEnergy() && processed().spectrum && (
                 <EnergyAccumulation sx={{ ...props.sx, height: "70vh" }} />
             )}
+            {withSpectrogram() && processed().spectrogram && (
+                <TimeFrequencyMap name="spectrogram" sx={{ ...props.sx, height: "70vh" }} />
+            )}
+            {withScalogram() && processed().scalogram && (
+                <TimeFrequencyMap name="scalogram" sx={{ ...props.sx, height: "70vh" }} />
+            )}
             {withResponseSpectrum() && processed().period && <ResponseSpectrum sx={{ ...props.sx, height: "70vh" }} />}
         </Stack>
     );
@@ -15,31 +15,60 @@
 
 from __future__ import annotations
 
+import json
 from contextlib import asynccontextmanager
 from http import HTTPStatus
 from uuid import UUID
 
 import aiohttp
 from beanie.operators import In
-from fastapi import Body, Depends, FastAPI, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import BackgroundTasks, Body, Depends, FastAPI, Form, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from pyinstrument import Profiler
 from starlette.middleware import Middleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 
-from ..record.async_record import MetadataRecord, Record, UploadTask
+from ..record import async_record
+from ..record.async_record import (
+    MetadataRecord,
+    Record,
+    UploadTask,
+    backfill_record,
+    build_archive,
+    create_task,
+    delete_result,
+    delete_waveform,
+    find_records,
+    load_waveform,
+    migrate_waveform,
+    waveform_projection,
+)
+from ..record.warm_up import warm_up
+from ..utility.cache import cache_stats
 from ..utility.config import init_mongo
 from ..utility.elastic import async_elastic
-from ..utility.env import TURNSTILE_SECRET
+from ..utility.env import MB_WARM_UP, TURNSTILE_SECRET
 from .jp import router as jp_router
 from .nz import router as nz_router
-from .process import process_record_local
+from .process import (
+    PROCESS_POOL,
+    RESULT_CACHE,
+    config_digest,
+    offload,
+    process_pair,
+    process_record_json,
+    process_records_json,
+)
 from .response import (
     BulkRequest,
+    CorrelationConfig,
+    ListCorrelatedRecordResponse,
     ListMetadataResponse,
+    ListProcessedResponse,
     ListRecordResponse,
+    ListSimilarRecordResponse,
     MetadataResponse,
     PaginationResponse,
     ProcessConfig,
@@ -47,15 +76,20 @@ from .response import (
     QueryConfig,
     RawRecordResponse,
     RecordResponse,
+    RotatedSpectrumResponse,
+    SimilarityConfig,
     TotalResponse,
+    UploadResponse,
     UploadTaskResponse,
     UploadTasksResponse,
 )
+from .similarity import search_correlated, search_similar
 from .user import router as user_router
 from .utility import (
     User,
     create_superuser,
     is_active,
+    is_admin,
 )
 
 
@@ -63,7 +97,12 @@ from .utility import (
 async def lifespan(_: FastAPI):
     async with init_mongo():
         await create_superuser()
+        # uvicorn only starts accepting requests after startup completes
+        # thus `/alive` reports readiness only after all kernels are compiled
+        if MB_WARM_UP:
+            warm_up()
         yield
+        PROCESS_POOL.shutdown()
 
 
 async def profile_request(request, call_next):
@@ -134,6 +173,24 @@ async def get_total():
     }
 
 
+@app.get("/cache", tags=["status"])
+def get_cache_stats():
+    """
+    Retrieve the statistics of in-process caches of the current worker.
+    """
+    return cache_stats()
+
+
+@app.get("/pool", tags=["status"])
+def get_pool_stats():
+    """
+    Retrieve the statistics of the processing pool of the current worker.
+
+    Wait and run times are in seconds, `rejected` counts requests refused due to backpressure.
+    """
+    return PROCESS_POOL.stats()
+
+
 @app.get(
     "/task/status/{task_id}",
     tags=["status"],
@@ -171,11 +228,14 @@ async def for_test_only():
 
 
 async def get_random_record() -> Record:
+    pipeline: list[dict] = [{"$sample": {"size": 1}}]
+    if (projection := waveform_projection()) is not None:
+        pipeline.append({"$project": projection})
     result: list[Record] = await Record.aggregate(
-        [{"$sample": {"size": 1}}], projection_model=Record
+        pipeline, projection_model=Record
     ).to_list()
     if result:
-        return result[0]
+        return (await load_waveform(result))[0]
 
     raise HTTPException(HTTPStatus.NO_CONTENT, detail="Record not found.")
 
@@ -187,7 +247,9 @@ async def download_single_random_raw_record():
     """
     result: Record = await get_random_record()
     return RawRecordResponse(
-        **result.model_dump(exclude_none=True), endpoint="/raw/jackpot"
+        **result.model_dump(exclude_none=True, exclude={"raw_data"}),
+        raw_data=result.to_raw_waveform()[1].tolist(),
+        endpoint="/raw/jackpot",
     )
 
 
@@ -201,7 +263,8 @@ async def download_single_random_waveform(normalised: bool = False):
     interval, record = result.to_waveform(normalised=normalised, unit="cm/s/s")
     # noinspection PyTypeChecker
     return RecordResponse(
-        **result.model_dump(exclude_none=True),
+        **result.model_dump(exclude_none=True, exclude={"raw_data"}),
+        raw_data=result.to_raw_waveform()[1].tolist(),
         endpoint="/waveform/jackpot",
         time_interval=interval,
         waveform=record.tolist(),
@@ -219,7 +282,8 @@ async def download_single_random_spectrum():
     frequency, record = result.to_spectrum()
     # noinspection PyTypeChecker
     return RecordResponse(
-        **result.model_dump(exclude_none=True),
+        **result.model_dump(exclude_none=True, exclude={"raw_data"}),
+        raw_data=result.to_raw_waveform()[1].tolist(),
         endpoint="/spectrum/jackpot",
         frequency_interval=frequency,
         spectrum=record.tolist(),
@@ -232,19 +296,19 @@ async def download_waveform(record_id: UUID | list[UUID]):
     Retrieve waveform from the database by given IDs.
     """
 
-    results: list[Record] = await Record.find(
-        In(
-            Record.id,
+    results: list[Record] = await load_waveform(
+        await find_records(
             [str(x) for x in record_id]
             if isinstance(record_id, list)
-            else [str(record_id)],
+            else [str(record_id)]
         )
-    ).to_list()
+    )
 
     def _populate_waveform(result: Record):
         interval, record = result.to_waveform(unit="cm/s/s")
         return RecordResponse(
-            **result.model_dump(exclude_none=True),
+            **result.model_dump(exclude_none=True, exclude={"raw_data"}),
+            raw_data=result.to_raw_waveform()[1].tolist(),
             endpoint="/waveform",
             time_interval=interval,
             waveform=record.tolist(),
@@ -379,6 +443,9 @@ async def purge_records(
             )
 
     await Record.find(In(Record.id, all_records)).delete()
+    await delete_waveform(all_records)
+    await delete_result(all_records)
+    RESULT_CACHE.invalidate(all_records)
 
     return {"deleted": all_records}
 
@@ -419,12 +486,192 @@ async def index_records(body: BulkRequest = Body(...), user: User = Depends(is_a
         return await client.bulk(index="record", body=body.records)
 
 
+@app.post("/migrate", status_code=HTTPStatus.ACCEPTED, response_model=UploadResponse)
+async def migrate_records(
+    tasks: BackgroundTasks, batch_size: int = 1000, _: User = Depends(is_admin)
+):
+    """
+    Convert waveforms stored as integer arrays by earlier versions into the compact binary format.
+
+    If waveforms are configured to be stored apart from metadata, waveforms still embedded
+    in records are moved to the configured store.
+
+    The migration runs in the background and can be resumed if interrupted.
+    Use `/task/status/{task_id}` to check the progress.
+    """
+    task_id: str = await create_task()
+    tasks.add_task(migrate_waveform, task_id, max(1, batch_size))
+
+    return UploadResponse(
+        message="Migration will be processed in the background.",
+        task_ids=[task_id],
+        records=None,
+    )
+
+
+@app.post("/backfill", status_code=HTTPStatus.ACCEPTED, response_model=UploadResponse)
+async def backfill_records(
+    tasks: BackgroundTasks, batch_size: int = 1000, _: User = Depends(is_admin)
+):
+    """
+    Compute response spectra of records ingested by earlier versions.
+
+    Records without spectra are not considered by `/similar`.
+    The backfill runs in the background and can be resumed if interrupted.
+    Use `/task/status/{task_id}` to check the progress.
+    """
+    task_id: str = await create_task()
+    tasks.add_task(backfill_record, task_id, max(1, batch_size))
+
+    return UploadResponse(
+        message="Backfill will be processed in the background.",
+        task_ids=[task_id],
+        records=None,
+    )
+
+
+@app.get("/archive", tags=["status"])
+def get_archive_stats():
+    """
+    Retrieve the statistics of the local waveform archive of the current worker.
+    """
+    if async_record.WAVEFORM_ARCHIVE is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, detail="Archive is not enabled.")
+
+    async_record.WAVEFORM_ARCHIVE.refresh()
+    return async_record.WAVEFORM_ARCHIVE.stats()
+
+
+@app.post("/archive", status_code=HTTPStatus.ACCEPTED, response_model=UploadResponse)
+async def update_archive(
+    tasks: BackgroundTasks,
+    batch_size: int = 1000,
+    compact: bool = False,
+    _: User = Depends(is_admin),
+):
+    """
+    Update the local waveform archive with new and changed records in the background.
+
+    Waveforms are served from the memory-mapped archive without being transferred from the database,
+    regardless of `MB_WAVEFORM_STORE`, records missing from the archive fall back to the store.
+    Use `compact` to rewrite the archive and reclaim the space of changed and deleted records.
+    Use `/task/status/{task_id}` to check the progress.
+    """
+    if async_record.WAVEFORM_ARCHIVE is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, detail="Archive is not enabled.")
+
+    task_id: str = await create_task()
+    tasks.add_task(build_archive, task_id, max(1, batch_size), compact)
+
+    return UploadResponse(
+        message="Archive will be updated in the background.",
+        task_ids=[task_id],
+        records=None,
+    )
+
+
 @app.post("/process", response_model=ProcessedResponse)
 async def process_record(record_id: UUID, process_config: ProcessConfig = Body(...)):
-    if result := await Record.find_one(Record.id == str(record_id)):
-        return process_record_local(result, process_config)
+    """
+    Process a record with the given configuration.
+
+    Results are cached, see `/cache`, a cached result is served without loading the waveform.
+    """
+    if not (results := await find_records([str(record_id)])):
+        raise HTTPException(HTTPStatus.NOT_FOUND, detail="Record not found.")
+
+    result: Record = results[0]
+    digest: str = config_digest(process_config)
+    if not (content := (await RESULT_CACHE.fetch([result], digest)).get(result.id)):
+        await load_waveform([result])
+        content = await offload(process_record_json, result, process_config)
+        await RESULT_CACHE.store([(result, content)], digest)
+
+    return Response(content, media_type="application/json")
+
+
+@app.post("/process/bulk", response_model=ListProcessedResponse)
+async def process_records(
+    record_id: list[UUID] = Body(..., min_length=1, max_length=1000),
+    process_config: ProcessConfig = Body(...),
+):
+    """
+    Process records with the same configuration.
+
+    The response spectra and integrations of all records are computed in batched calls.
+    Results are in the order of the requested ids, ids that cannot be found are reported in `missing`.
+    Cached results are reused, only the others are computed.
+    """
+    requested: list[str] = list(dict.fromkeys(str(x) for x in record_id))
+    found: dict[str, Record] = {x.id: x for x in await find_records(requested)}
+    results: list[Record] = [found[x] for x in requested if x in found]
+
+    digest: str = config_digest(process_config)
+    cached: dict[str, bytes] = await RESULT_CACHE.fetch(results, digest)
+    if missing := [x for x in results if x.id not in cached]:
+        computed: list[bytes] = await offload(
+            process_records_json, await load_waveform(missing), process_config
+        )
+        await RESULT_CACHE.store(list(zip(missing, computed, strict=True)), digest)
+        cached.update((x.id, y) for x, y in zip(missing, computed, strict=True))
+
+    return Response(
+        b'{"records":['
+        + b",".join(cached[x.id] for x in results)
+        + b'],"missing":'
+        + json.dumps([x for x in requested if x not in found]).encode()
+        + b"}",
+        media_type="application/json",
+    )
+
+
+@app.post("/process/rotd", response_model=RotatedSpectrumResponse)
+async def process_rotd(record_id: UUID, process_config: ProcessConfig = Body(...)):
+    """
+    Compute orientation-independent RotD50 and RotD100 spectra.
+
+    The given record shall be a horizontal component, the other horizontal component
+    of the same sensor of the same station and event is located automatically.
+    """
+    if (result := await Record.find_one(Record.id == str(record_id))) is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, detail="Record not found.")
+
+    if (partner := await result.horizontal_partner()) is None:
+        raise HTTPException(
+            HTTPStatus.NOT_FOUND, detail="The other horizontal component not found."
+        )
+
+    return await process_pair(result, partner, process_config)
+
+
+@app.post("/similar", response_model=ListSimilarRecordResponse)
+async def similar_records(config: SimilarityConfig):
+    """
+    Find records whose 5%-damped response spectra best match the target spectrum.
+
+    Spectra are precomputed at ingestion on a fixed log-period grid, the target is interpolated onto it.
+    Records are ranked by the root mean square of log spectral ratios over the period range of the target.
+    If `with_scaling` is enabled, each record is scaled by the factor minimising its misfit.
+    If `query` is given, only the records matching the query are considered.
+    """
+    return await search_similar(config)
+
+
+@app.post("/correlated", response_model=ListCorrelatedRecordResponse)
+async def correlated_records(config: CorrelationConfig):
+    """
+    Find records whose waveforms are highly correlated with the given record.
+
+    Candidates are the records matching `query`, paginated in the same way as in `/query`.
+    All waveforms are resampled to a common sampling frequency, the peak normalised
+    cross-correlation over all lags (or lags within `max_lag`) is computed via FFT.
+    Spectra of candidates are cached, thus repeated searches over the same candidates are fast.
+    Near-duplicates, such as re-uploads or the same motion from different networks, score close to one.
+    """
+    if (result := await search_correlated(config)) is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, detail="Record not found.")
 
-    raise HTTPException(HTTPStatus.NOT_FOUND, detail="Record not found.")
+    return result
 
 
 @app.post("/turnstile", tags=["misc"])
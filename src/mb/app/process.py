@@ -15,37 +15,265 @@
 
 from __future__ import annotations
 
+import asyncio
+from hashlib import sha256
 from http import HTTPStatus
+from importlib.metadata import PackageNotFoundError, version
 
 import numpy as np
+import structlog
 from fastapi import HTTPException
 
-from ..record.async_record import Record
-from ..record.response_spectrum import response_spectrum
-from ..record.utility import apply_filter, get_window, perform_fft, zero_stuff
-from .response import ProcessConfig, ProcessedResponse
+from ..record.async_record import (
+    Record,
+    ResultStore,
+    load_result,
+    load_waveform,
+    store_result,
+)
+from ..record.response_spectrum import (
+    adaptive_response_spectra,
+    batch_integrate,
+    batch_response_spectrum,
+    constant_ductility_spectrum,
+    constant_strength_spectrum,
+    log_period,
+    response_spectra,
+    rotd_spectrum,
+)
+from ..record.utility import (
+    IntegrationType,
+    PeriodGrid,
+    apply_filter,
+    apply_taper,
+    get_window,
+    pack_waveforms,
+    perform_fft,
+    polyphase_resample,
+    remove_baseline,
+    scalogram,
+    smooth_spectrum,
+    spectrogram,
+    to_list,
+    zstd,
+)
+from ..utility.cache import LRUCache
+from ..utility.env import (
+    MB_PROCESS_QUEUE,
+    MB_PROCESS_THREADS,
+    MB_PROCESS_WORKERS,
+    MB_RESULT_CACHE_SIZE,
+    MB_RESULT_STORE,
+    MB_WARM_UP,
+)
+from ..utility.pool import ComputePool, PoolSaturatedError
+from .response import (
+    ProcessConfig,
+    ProcessedResponse,
+    RotatedSpectrumResponse,
+    TimeFrequencyResponse,
+)
 
+ROTD_CACHE = LRUCache("rotd_spectrum", 256)
+PROCESS_POOL = ComputePool(
+    "process", MB_PROCESS_WORKERS, MB_PROCESS_THREADS, MB_PROCESS_QUEUE, MB_WARM_UP
+)
 
-def process_record_local(result: Record, process_config: ProcessConfig):
+
+async def offload(func, *args, local: bool = False):
+    """
+    Run `func(*args)` in `PROCESS_POOL` without blocking the event loop.
+
+    A saturated pool is reported as 503 so that clients can back off.
+    See `ComputePool.run` for `local`.
+    """
+    try:
+        return await PROCESS_POOL.run(func, *args, local=local)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            detail="Too many processing requests, please retry later.",
+            headers={"Retry-After": "1"},
+        ) from e
+
+
+# size of the logarithmic grid the adaptive refinement starts from
+ADAPTIVE_INITIAL_SIZE: int = 32
+
+try:
+    # results computed by a different build are not reused
+    RESULT_VERSION: str = version("motion-base")
+except PackageNotFoundError:
+    RESULT_VERSION = "dev"
+
+_logger = structlog.get_logger(__name__)
+
+
+def config_digest(process_config: ProcessConfig) -> str:
+    """
+    A canonical digest of the configuration, equal configurations give equal digests.
+    """
+    return sha256(
+        f"{RESULT_VERSION}:{process_config.model_dump_json()}".encode()
+    ).hexdigest()
+
+
+class ResultCache(LRUCache):
+    """
+    A two-tier cache of serialised processing results.
+
+    The first tier is an in-process LRU bounded by bytes, the second tier is shared by all
+    workers, see `MB_RESULT_STORE`, and stores compressed results. Entries are keyed by the
+    record id, the hash of the file it was parsed from, and the digest of the configuration,
+    so that results of an overwritten record are never served.
+    Failures of the shared tier are logged and treated as misses.
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        super().__init__(name, 65536, max_bytes)
+
+        self.shared: bool = ResultStore(MB_RESULT_STORE) != ResultStore.Disabled
+        self.shared_hits: int = 0
+        self.shared_misses: int = 0
+
+    @staticmethod
+    def key(record: Record, digest: str) -> str:
+        return sha256(f"{record.file_hash}:{digest}".encode()).hexdigest()
+
+    async def fetch(self, records: list[Record], digest: str) -> dict[str, bytes]:
+        """
+        Get the cached results of records under the configuration digest, missing ones are omitted.
+        """
+        found: dict[str, bytes] = {}
+        missing: dict[str, str] = {}
+        for record in records:
+            key: str = self.key(record, digest)
+            if (content := self.get((record.id, key))) is not None:
+                found[record.id] = content
+            else:
+                missing[record.id] = key
+
+        if not missing or not self.shared:
+            return found
+
+        try:
+            shared: dict[str, bytes] = await load_result(missing)
+        except Exception as e:  # noqa
+            _logger.warning("Failed to load shared results.", exc_info=e)
+            shared = {}
+
+        self.shared_hits += len(shared)
+        self.shared_misses += len(missing) - len(shared)
+        for record_id, data in shared.items():
+            found[record_id] = content = zstd.decompress(data)
+            self.put((record_id, missing[record_id]), content, len(content))
+
+        return found
+
+    async def store(self, results: list[tuple[Record, bytes]], digest: str):
+        """
+        Cache the results of records computed under the configuration digest in both tiers.
+        """
+        entries: list[tuple[str, str, bytes]] = []
+        for record, content in results:
+            self.put(
+                (record.id, key := self.key(record, digest)), content, len(content)
+            )
+            entries.append((record.id, key, content))
+
+        if not self.shared:
+            return
+
+        try:
+            await asyncio.gather(
+                *(
+                    store_result(record_id, key, zstd.compress(content))
+                    for record_id, key, content in entries
+                )
+            )
+        except Exception as e:  # noqa
+            _logger.warning("Failed to store shared results.", exc_info=e)
+
+    def invalidate(self, record_ids: list[str]) -> int:
+        """
+        Remove the cached results of records in this worker, the shared tier is purged with records.
+        """
+        ids: set[str] = set(record_ids)
+        return self.remove_if(lambda k: k[0] in ids)
+
+    def stats(self) -> dict:
+        total: int = self.shared_hits + self.shared_misses
+        return super().stats() | {
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+            "shared_hit_rate": self.shared_hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        super().clear()
+        self.shared_hits = self.shared_misses = 0
+
+
+RESULT_CACHE = ResultCache("process_result", MB_RESULT_CACHE_SIZE * 2**20)
+
+
+def _process_waveform(
+    result: Record, process_config: ProcessConfig
+) -> tuple[ProcessedResponse, np.ndarray]:
     if process_config.low_cut >= process_config.high_cut:
         raise HTTPException(
             HTTPStatus.BAD_REQUEST,
             detail="Low cut frequency should be smaller than high cut frequency.",
         )
+    if (
+        process_config.with_smoothed_spectrum
+        and process_config.smoothing_frequency_min
+        >= process_config.smoothing_frequency_max
+    ):
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST,
+            detail="Minimum smoothing frequency should be smaller than maximum smoothing frequency.",
+        )
+    if (
+        process_config.with_scalogram
+        and process_config.scalogram_frequency_min
+        >= process_config.scalogram_frequency_max
+    ):
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST,
+            detail="Minimum scalogram frequency should be smaller than maximum scalogram frequency.",
+        )
+    if (
+        process_config.period_grid != PeriodGrid.Uniform
+        and process_config.period_start >= process_config.period_end
+    ):
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST,
+            detail="Start period should be smaller than end period.",
+        )
 
+    # samples may be served from the archive while `raw_data` is not loaded
     record = ProcessedResponse(
-        **result.model_dump(exclude_none=True),
+        **result.model_dump(exclude_none=True, exclude={"raw_data"}),
+        raw_data=result.to_raw_waveform()[1].tolist(),
         endpoint="/process",
         process_config=process_config,
         processed_data_unit="cm/s/s",
     )
 
     time_interval, waveform = result.to_waveform(
-        normalised=process_config.normalised, unit="cm/s/s"
+        normalised=process_config.normalised,
+        unit="cm/s/s",
+        dtype=process_config.precision.dtype,
     )
 
     waveform = waveform[int(process_config.remove_head // time_interval) :]
 
+    if process_config.detrend_order is not None:
+        waveform = remove_baseline(waveform, process_config.detrend_order)
+    if process_config.taper_ratio > 0:
+        waveform = apply_taper(waveform, process_config.taper_ratio)
+
     if process_config.with_filter:
         new_interval = time_interval / process_config.up_ratio
 
@@ -71,47 +299,359 @@ def process_record_local(result: Record, process_config: ProcessConfig):
                 HTTPStatus.BAD_REQUEST,
                 detail="Filter type should be one of bandpass, bandstop, lowpass and highpass.",
             )
-        new_waveform: np.ndarray = apply_filter(
-            get_window(
-                process_config.filter_type,
-                process_config.window_type,
-                min(
-                    process_config.filter_length,
-                    process_config.up_ratio * len(waveform) // 2,
-                ),
-                freq_list,
-                ratio=process_config.up_ratio,
+        window = get_window(
+            process_config.filter_type,
+            process_config.window_type,
+            min(
+                process_config.filter_length,
+                process_config.up_ratio * len(waveform) // 2,
             ),
-            zero_stuff(process_config.up_ratio, waveform),
+            freq_list,
+            ratio=process_config.up_ratio,
         )
-    else:
-        new_interval = time_interval
-        new_waveform = waveform
-
-    if process_config.down_ratio > 1:
+        if process_config.up_ratio == process_config.down_ratio == 1:
+            new_waveform: np.ndarray = apply_filter(window, waveform)
+        else:
+            new_waveform = polyphase_resample(
+                process_config.up_ratio, process_config.down_ratio, window, waveform
+            )
         new_interval *= process_config.down_ratio
-        new_waveform = new_waveform[:: process_config.down_ratio]
+    else:
+        new_interval = time_interval * process_config.down_ratio
+        new_waveform = waveform[:: process_config.down_ratio]
 
     record.time_interval = new_interval
-    record.waveform = new_waveform.tolist()
+    record.waveform = to_list(new_waveform)
 
-    if process_config.with_spectrum:
+    if process_config.with_spectrum or process_config.with_smoothed_spectrum:
         frequency_interval, spectrum = perform_fft(1 / new_interval, new_waveform)
-        record.frequency_interval = frequency_interval
-        record.spectrum = spectrum.tolist()
+        if process_config.with_spectrum:
+            record.frequency_interval = frequency_interval
+            record.spectrum = to_list(spectrum)
+        if process_config.with_smoothed_spectrum:
+            frequency = np.geomspace(
+                process_config.smoothing_frequency_min,
+                process_config.smoothing_frequency_max,
+                process_config.smoothing_frequency_count,
+            )
+            record.frequency = frequency.tolist()
+            record.smoothed_spectrum = _to_list(
+                smooth_spectrum(
+                    frequency_interval,
+                    spectrum,
+                    frequency,
+                    process_config.smoothing_bandwidth,
+                ),
+                process_config,
+            )
 
-    if process_config.with_response_spectrum:
-        period = np.arange(
+    if process_config.with_spectrogram:
+        time, frequency, amplitude = spectrogram(
+            new_interval,
+            new_waveform,
+            process_config.spectrogram_window_length,
+            process_config.spectrogram_overlap,
+            time_bins=process_config.tile_time_bins,
+            frequency_bins=process_config.tile_frequency_bins,
+        )
+        record.spectrogram = TimeFrequencyResponse(
+            time=time.tolist(),
+            frequency=frequency.tolist(),
+            amplitude=_to_list(amplitude, process_config),
+        )
+
+    if process_config.with_scalogram:
+        frequency = np.geomspace(
+            process_config.scalogram_frequency_min,
+            process_config.scalogram_frequency_max,
+            process_config.tile_frequency_bins,
+        )
+        time, amplitude = scalogram(
+            new_interval,
+            new_waveform,
+            frequency,
+            time_bins=process_config.tile_time_bins,
+        )
+        record.scalogram = TimeFrequencyResponse(
+            time=time.tolist(),
+            frequency=frequency.tolist(),
+            amplitude=_to_list(amplitude, process_config),
+        )
+
+    return record, new_waveform
+
+
+def _to_list(data: np.ndarray, process_config: ProcessConfig) -> list:
+    return to_list(data.astype(process_config.precision.dtype, copy=False))
+
+
+def _period(process_config: ProcessConfig) -> np.ndarray:
+    if process_config.period_grid == PeriodGrid.Uniform:
+        return np.arange(
             0,
             process_config.period_end + process_config.period_step,
             process_config.period_step,
         )
-        spectrum = response_spectrum(
-            process_config.damping_ratio, new_interval, new_waveform, period
+
+    # consumers other than elastic response spectra use the logarithmic grid for adaptive grids
+    return log_period(
+        process_config.period_start,
+        process_config.period_end,
+        process_config.period_count,
+    )
+
+
+def _response_spectra(
+    interval: float, waveform: np.ndarray, process_config: ProcessConfig
+) -> tuple[np.ndarray, np.ndarray]:
+    if process_config.period_grid == PeriodGrid.Adaptive:
+        return adaptive_response_spectra(
+            _damping_ratio(process_config),
+            interval,
+            waveform,
+            log_period(
+                process_config.period_start,
+                process_config.period_end,
+                min(ADAPTIVE_INITIAL_SIZE, process_config.period_count),
+            ),
+            process_config.period_tolerance,
+            process_config.period_count,
+        )
+
+    period = _period(process_config)
+    return period, response_spectra(
+        _damping_ratio(process_config), interval, waveform, period
+    )
+
+
+def _damping_ratio(process_config: ProcessConfig) -> np.ndarray:
+    return np.array(
+        process_config.damping_ratios or [process_config.damping_ratio],
+        dtype=np.float64,
+    )
+
+
+def _populate_response_spectrum(
+    record: ProcessedResponse,
+    process_config: ProcessConfig,
+    period: np.ndarray,
+    spectra: np.ndarray,
+):
+    record.period = period.tolist()
+    if process_config.damping_ratios:
+        record.damping_ratios = process_config.damping_ratios
+        record.displacement_spectra = _to_list(spectra[:, :, 0], process_config)
+        record.velocity_spectra = _to_list(spectra[:, :, 1], process_config)
+        record.acceleration_spectra = _to_list(spectra[:, :, 2], process_config)
+    else:
+        record.displacement_spectrum = _to_list(spectra[0, :, 0], process_config)
+        record.velocity_spectrum = _to_list(spectra[0, :, 1], process_config)
+        record.acceleration_spectrum = _to_list(spectra[0, :, 2], process_config)
+
+
+INTEGRATION_PARAMETER: dict[IntegrationType, dict] = {
+    # average acceleration method
+    IntegrationType.Newmark: {"gamma": 0.5, "beta": 0.25},
+}
+
+
+def _integrate(
+    processed: list[tuple[ProcessedResponse, np.ndarray]],
+    process_config: ProcessConfig,
+):
+    motion, offset = pack_waveforms(
+        [waveform for _, waveform in processed], process_config.precision.dtype
+    )
+    displacement, velocity = batch_integrate(
+        np.array([record.time_interval for record, _ in processed]),
+        motion,
+        offset,
+        baseline_correction=process_config.baseline_correction,
+        **INTEGRATION_PARAMETER[process_config.integration_type],
+    )
+    for i, (record, _) in enumerate(processed):
+        record.displacement = to_list(displacement[offset[i] : offset[i + 1]])
+        record.velocity = to_list(velocity[offset[i] : offset[i + 1]])
+
+
+def _populate_inelastic_spectrum(
+    record: ProcessedResponse, waveform: np.ndarray, process_config: ProcessConfig
+):
+    # share the grid of elastic spectra, which may be adaptive
+    if record.period is None:
+        period = _period(process_config)
+        record.period = _to_list(period, process_config)
+    else:
+        period = np.array(record.period)
+
+    spectra = constant_ductility_spectrum(
+        process_config.damping_ratio,
+        record.time_interval,
+        waveform,
+        period,
+        np.array(process_config.ductility),
+        process_config.hardening_ratio,
+    )
+    record.ductility = process_config.ductility
+    record.yield_strength = _to_list(spectra[:, :, 0], process_config)
+    record.strength_reduction = _to_list(spectra[:, :, 1], process_config)
+    record.inelastic_displacement = _to_list(spectra[:, :, 2], process_config)
+
+    if process_config.strength_reduction_factor:
+        spectra = constant_strength_spectrum(
+            process_config.damping_ratio,
+            record.time_interval,
+            waveform,
+            period,
+            np.array(process_config.strength_reduction_factor),
+            process_config.hardening_ratio,
+        )
+        record.strength_reduction_factor = process_config.strength_reduction_factor
+        record.ductility_demand = _to_list(spectra[:, :, 0], process_config)
+        record.constant_strength_displacement = _to_list(
+            spectra[:, :, 1], process_config
+        )
+
+
+def process_record_local(result: Record, process_config: ProcessConfig):
+    record, waveform = _process_waveform(result, process_config)
+
+    if process_config.with_integration:
+        _integrate([(record, waveform)], process_config)
+
+    if process_config.with_response_spectrum:
+        period, spectra = _response_spectra(
+            record.time_interval, waveform, process_config
         )
-        record.period = period.tolist()
-        record.displacement_spectrum = spectrum[:, 0].tolist()
-        record.velocity_spectrum = spectrum[:, 1].tolist()
-        record.acceleration_spectrum = spectrum[:, 2].tolist()
+        _populate_response_spectrum(record, process_config, period, spectra)
+
+    if process_config.with_inelastic_spectrum:
+        _populate_inelastic_spectrum(record, waveform, process_config)
 
     return record
+
+
+def process_record_json(result: Record, process_config: ProcessConfig) -> bytes:
+    """
+    Process a record and serialise the result so that it can be cached as is.
+    """
+    return process_record_local(result, process_config).model_dump_json().encode()
+
+
+def process_records_json(
+    results: list[Record], process_config: ProcessConfig
+) -> list[bytes]:
+    return [
+        x.model_dump_json().encode()
+        for x in process_records_local(results, process_config)
+    ]
+
+
+def process_records_local(
+    results: list[Record], process_config: ProcessConfig
+) -> list[ProcessedResponse]:
+    """
+    Process many records with the same configuration.
+
+    Response spectra and integrations of all records are computed in batched calls.
+    """
+    processed = [_process_waveform(result, process_config) for result in results]
+
+    if process_config.with_integration and processed:
+        _integrate(processed, process_config)
+
+    if (
+        process_config.with_response_spectrum
+        and process_config.period_grid == PeriodGrid.Adaptive
+    ):
+        # each record has its own grid
+        for record, waveform in processed:
+            period, spectra = _response_spectra(
+                record.time_interval, waveform, process_config
+            )
+            _populate_response_spectrum(record, process_config, period, spectra)
+    elif process_config.with_response_spectrum and processed:
+        period = _period(process_config)
+        motion, offset = pack_waveforms(
+            [waveform for _, waveform in processed], process_config.precision.dtype
+        )
+        spectra = batch_response_spectrum(
+            _damping_ratio(process_config),
+            np.array([record.time_interval for record, _ in processed]),
+            motion,
+            offset,
+            period,
+        )
+        for (record, _), spectrum in zip(processed, spectra, strict=True):
+            _populate_response_spectrum(record, process_config, period, spectrum)
+
+    if process_config.with_inelastic_spectrum:
+        for record, waveform in processed:
+            _populate_inelastic_spectrum(record, waveform, process_config)
+
+    return [record for record, _ in processed]
+
+
+def process_pair_local(
+    first: Record, second: Record, process_config: ProcessConfig
+) -> RotatedSpectrumResponse:
+    """
+    Compute RotD50 and RotD100 spectra of two horizontal components.
+
+    Both components are processed with the same configuration before rotation.
+    Only `damping_ratio` is used, `damping_ratios` is ignored.
+    """
+    first, second = sorted((first, second), key=lambda x: x.id)
+    (first_record, first_waveform), (second_record, second_waveform) = (
+        _process_waveform(x, process_config) for x in (first, second)
+    )
+    if not np.isclose(first_record.time_interval, second_record.time_interval):
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST,
+            detail="Both components should have the same sampling frequency.",
+        )
+
+    period = _period(process_config)
+    spectra = rotd_spectrum(
+        process_config.damping_ratio,
+        first_record.time_interval,
+        first_waveform,
+        second_waveform,
+        period,
+    )
+    return RotatedSpectrumResponse(
+        endpoint="/process/rotd",
+        record_id=[first.id, second.id],
+        direction=[first.direction, second.direction],
+        process_config=process_config,
+        period=period.tolist(),
+        rotd50=spectra[:, 0].tolist(),
+        rotd100=spectra[:, 1].tolist(),
+    )
+
+
+async def process_pair(
+    first: Record, second: Record, process_config: ProcessConfig
+) -> RotatedSpectrumResponse:
+    """
+    Compute RotD50 and RotD100 spectra of two horizontal components in `PROCESS_POOL`.
+
+    Results are cached per pair, the file hashes are part of the key so that
+    overwritten records are not served stale results.
+    Waveforms are only loaded on cache misses.
+    """
+    first, second = sorted((first, second), key=lambda x: x.id)
+    key = (
+        first.id,
+        first.file_hash,
+        second.id,
+        second.file_hash,
+        process_config.model_dump_json(),
+    )
+    if (cached := ROTD_CACHE.get(key)) is not None:
+        return cached
+
+    await load_waveform([first, second])
+    result = await offload(process_pair_local, first, second, process_config)
+    ROTD_CACHE.put(key, result)
+    return result
@@ -17,13 +17,27 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import StrEnum
-from typing import Literal
+from typing import Annotated, Literal
 
 import numpy as np
 from pydantic import BaseModel, Field, field_validator, model_validator
 
-from ..record.response_spectrum import response_spectrum
-from ..record.utility import apply_filter, zero_stuff
+from ..record.response_spectrum import (
+    adaptive_response_spectra,
+    integrate,
+    response_spectrum,
+)
+from ..record.utility import (
+    IntegrationType,
+    PeriodGrid,
+    Precision,
+    apply_filter,
+    decode_waveform,
+    perform_fft,
+    smooth_spectrum,
+    zero_stuff,
+)
+from ..utility.env import MB_FLOAT32
 
 
 class MetadataResponse(BaseModel):
@@ -36,6 +50,11 @@ class MetadataResponse(BaseModel):
         station_location: geographic location of the station. [longitude, latitude]
         depth: depth of the event, in kilometer.
         maximum_acceleration: maximum acceleration (PGA) of the record, in cm/s/s.
+        maximum_velocity: maximum velocity (PGV) of the record, in cm/s.
+        maximum_displacement: maximum displacement (PGD) of the record, in cm.
+        arias_intensity: Arias intensity of the record, in m/s.
+        cumulative_absolute_velocity: cumulative absolute velocity (CAV) of the record, in cm/s.
+        significant_duration: significant duration (D5-95) of the record, in seconds.
     """
 
     endpoint: str = Field(None)
@@ -48,6 +67,11 @@ class MetadataResponse(BaseModel):
 
     magnitude: float = Field(None)
     maximum_acceleration: float = Field(None)
+    maximum_velocity: float = Field(None)
+    maximum_displacement: float = Field(None)
+    arias_intensity: float = Field(None)
+    cumulative_absolute_velocity: float = Field(None)
+    significant_duration: float = Field(None)
 
     event_time: datetime = Field(None)
     event_location: list[float] = Field(None)
@@ -83,6 +107,27 @@ class RawRecordResponse(MetadataResponse):
     raw_data_unit: str = Field(None)
     offset: float = Field(None)
 
+    @field_validator("raw_data", mode="before")
+    @classmethod
+    def decode_raw_data(cls, v):
+        # records store samples in binary, see `encode_waveform`
+        return decode_waveform(v).tolist() if isinstance(v, bytes) else v
+
+
+class TimeFrequencyResponse(BaseModel):
+    """
+    Time-frequency representation of a waveform.
+
+    Attributes:
+        time: centres of time bins, in s.
+        frequency: centres of frequency bins, in Hz.
+        amplitude: amplitudes of shape (n_frequency, n_time), in the processed data unit.
+    """
+
+    time: list[float] = Field(...)
+    frequency: list[float] = Field(...)
+    amplitude: list[list[float]] = Field(...)
+
 
 class RecordResponse(RawRecordResponse):
     """
@@ -97,11 +142,34 @@ class RecordResponse(RawRecordResponse):
     frequency_interval: float = Field(None)
     spectrum: list[float] = Field(None)
 
+    frequency: list[float] = Field(None)
+    smoothed_spectrum: list[float] = Field(None)
+
+    spectrogram: TimeFrequencyResponse = Field(None)
+    scalogram: TimeFrequencyResponse = Field(None)
+
     period: list[float] = Field(None)
     displacement_spectrum: list[float] = Field(None)
     velocity_spectrum: list[float] = Field(None)
     acceleration_spectrum: list[float] = Field(None)
 
+    damping_ratios: list[float] = Field(None)
+    displacement_spectra: list[list[float]] = Field(None)
+    velocity_spectra: list[list[float]] = Field(None)
+    acceleration_spectra: list[list[float]] = Field(None)
+
+    velocity: list[float] = Field(None)
+    displacement: list[float] = Field(None)
+
+    ductility: list[float] = Field(None)
+    yield_strength: list[list[float]] = Field(None)
+    strength_reduction: list[list[float]] = Field(None)
+    inelastic_displacement: list[list[float]] = Field(None)
+
+    strength_reduction_factor: list[float] = Field(None)
+    ductility_demand: list[list[float]] = Field(None)
+    constant_strength_displacement: list[list[float]] = Field(None)
+
     @model_validator(mode="before")
     @classmethod
     def default_unit(cls, values):
@@ -139,10 +207,47 @@ class RecordResponse(RawRecordResponse):
             2 * np.abs(np.fft.rfft(self.waveform)) / len(self.waveform)
         ).tolist()
 
+    def to_smoothed_spectrum(
+        self, frequency: list[float] | np.ndarray, bandwidth: float = 40.0
+    ):
+        if self.time_interval is None or self.waveform is None:
+            raise RuntimeError("Cannot convert to spectrum.")
+
+        frequency_interval, spectrum = perform_fft(
+            1 / self.time_interval, np.array(self.waveform)
+        )
+        self.frequency = np.asarray(frequency).tolist()
+        self.smoothed_spectrum = smooth_spectrum(
+            frequency_interval, spectrum, np.array(self.frequency), bandwidth
+        ).tolist()
+
+        return self
+
     def to_response_spectrum(
-        self, damping_ratio: float, period: list[float] | np.ndarray
+        self,
+        damping_ratio: float,
+        period: list[float] | np.ndarray,
+        tolerance: float | None = None,
+        max_size: int = 1000,
     ):
-        if isinstance(period, np.ndarray):
+        """
+        Compute response spectra on the given periods.
+
+        If `tolerance` is given, the periods are taken as the initial grid and refined adaptively,
+        see `adaptive_response_spectra`.
+        """
+        if tolerance is not None:
+            period, spectra = adaptive_response_spectra(
+                np.array([damping_ratio]),
+                self.time_interval,
+                np.array(self.waveform),
+                np.asarray(period, dtype=np.float64),
+                tolerance,
+                max_size,
+            )
+            self.period = period.tolist()
+            spectra = spectra[0]
+        elif isinstance(period, np.ndarray):
             # noinspection PyTypeChecker
             self.period = period.tolist()
             spectra = response_spectrum(
@@ -160,6 +265,20 @@ class RecordResponse(RawRecordResponse):
         self.velocity_spectrum = spectra[:, 1].tolist()
         self.acceleration_spectrum = spectra[:, 2].tolist()
 
+    def to_integration(self, baseline_correction: bool = False):
+        if self.time_interval is None or self.waveform is None:
+            raise RuntimeError("Cannot integrate the waveform.")
+
+        displacement, velocity = integrate(
+            self.time_interval,
+            np.array(self.waveform),
+            baseline_correction=baseline_correction,
+        )
+        self.displacement = displacement.tolist()
+        self.velocity = velocity.tolist()
+
+        return self
+
 
 class ListRecordResponse(BaseModel):
     records: list[RecordResponse] = Field(None)
@@ -168,6 +287,11 @@ class ListRecordResponse(BaseModel):
 class SortBy(StrEnum):
     magnitude = "magnitude"
     maximum_acceleration = "maximum_acceleration"
+    maximum_velocity = "maximum_velocity"
+    maximum_displacement = "maximum_displacement"
+    arias_intensity = "arias_intensity"
+    cumulative_absolute_velocity = "cumulative_absolute_velocity"
+    significant_duration = "significant_duration"
     event_time = "event_time"
     depth = "depth"
 
@@ -241,25 +365,159 @@ class ProcessConfig(BaseModel):
     low_cut: float = Field(0.01, gt=0)
     high_cut: float = Field(50.0, gt=0)
     damping_ratio: float = Field(0.05, ge=0, le=1)
+    damping_ratios: list[Annotated[float, Field(ge=0, le=1)]] | None = Field(
+        None,
+        min_length=1,
+        description="A list of damping ratios, if given, response spectra of all damping ratios are computed in one pass "
+        "and `damping_ratio` is ignored.",
+    )
     period_end: float = Field(10.0, ge=0)
     period_step: float = Field(0.01, ge=0)
+    period_grid: PeriodGrid = Field(
+        PeriodGrid.Uniform,
+        description="The uniform grid spans `[0, period_end]` with `period_step`, "
+        "the logarithmic grid spans `[period_start, period_end]` with `period_count` periods, "
+        "the adaptive grid refines a coarse logarithmic grid until the spectra are "
+        "interpolated within `period_tolerance` or `period_count` periods are used.",
+    )
+    period_start: float = Field(0.01, gt=0)
+    period_count: int = Field(200, ge=2, le=10000)
+    period_tolerance: float = Field(0.01, gt=0, lt=1)
     normalised: bool = Field(False)
     with_filter: bool = Field(False)
     with_spectrum: bool = Field(False)
     with_response_spectrum: bool = Field(False)
+    with_smoothed_spectrum: bool = Field(
+        False,
+        description="Compute the Konno-Ohmachi smoothed Fourier amplitude spectrum "
+        "on `smoothing_frequency_count` log-spaced frequencies.",
+    )
+    smoothing_bandwidth: float = Field(40.0, gt=0)
+    smoothing_frequency_min: float = Field(0.1, gt=0)
+    smoothing_frequency_max: float = Field(50.0, gt=0)
+    smoothing_frequency_count: int = Field(100, ge=2, le=10000)
+    with_spectrogram: bool = Field(
+        False, description="Compute the short-time Fourier amplitude spectrum."
+    )
+    spectrogram_window_length: int = Field(256, ge=8, le=65536)
+    spectrogram_overlap: float = Field(0.75, ge=0, lt=1)
+    with_scalogram: bool = Field(
+        False,
+        description="Compute the Morlet wavelet scalogram on `tile_frequency_bins` log-spaced "
+        "frequencies between `scalogram_frequency_min` and `scalogram_frequency_max`.",
+    )
+    scalogram_frequency_min: float = Field(0.1, gt=0)
+    scalogram_frequency_max: float = Field(25.0, gt=0)
+    tile_time_bins: int = Field(
+        256,
+        ge=1,
+        le=4096,
+        description="Time-frequency results are block averaged to at most this many time bins.",
+    )
+    tile_frequency_bins: int = Field(128, ge=1, le=4096)
+    with_integration: bool = Field(
+        False,
+        description="Integrate the processed waveform into velocity and displacement.",
+    )
+    integration_type: IntegrationType = Field(IntegrationType.Newmark)
+    baseline_correction: bool = Field(
+        False,
+        description="Remove the least squares linear trend of velocity after integration, "
+        "displacement is corrected consistently.",
+    )
+    with_inelastic_spectrum: bool = Field(
+        False,
+        description="Compute inelastic spectra of bilinear oscillators with `damping_ratio`.",
+    )
+    ductility: list[Annotated[float, Field(ge=1)]] = Field(
+        [2.0, 4.0, 6.0],
+        min_length=1,
+        description="Target ductilities of constant-ductility spectra, "
+        "each pair of period and ductility is solved independently in parallel.",
+    )
+    strength_reduction_factor: list[Annotated[float, Field(ge=1)]] | None = Field(
+        None,
+        min_length=1,
+        description="Strength reduction factors of constant-strength spectra, computed if given.",
+    )
+    hardening_ratio: float = Field(
+        0.0,
+        ge=0,
+        lt=1,
+        description="Ratio of post-yield stiffness to initial stiffness, zero for elastoplastic.",
+    )
     remove_head: float = Field(0.0, ge=0)
+    detrend_order: int | None = Field(
+        None,
+        ge=0,
+        le=10,
+        description="Remove the least squares polynomial baseline of this order before filtering, "
+        "zero removes the mean and one removes the linear trend.",
+    )
+    taper_ratio: float = Field(
+        0.0,
+        ge=0,
+        le=0.5,
+        description="Fraction of the waveform tapered by a half cosine at each end before filtering.",
+    )
+    precision: Precision = Field(
+        Precision.Single if MB_FLOAT32 else Precision.Double,
+        description="Floating point precision of waveforms and results, "
+        "the default can be changed via the `MB_FLOAT32` environment variable.",
+    )
 
 
 class ProcessedResponse(RecordResponse):
     process_config: ProcessConfig
 
 
+class ListProcessedResponse(BaseModel):
+    records: list[ProcessedResponse] = Field(None)
+    missing: list[str] = Field(
+        None, description="The requested record ids that cannot be found."
+    )
+
+
+class RotatedSpectrumResponse(BaseModel):
+    """
+    Orientation-independent response spectra of a pair of horizontal components.
+
+    Attributes:
+        record_id: IDs of both horizontal components.
+        direction: directions of both horizontal components.
+        rotd50: median of pseudo-spectral accelerations over all rotation angles, in cm/s/s.
+        rotd100: maximum of pseudo-spectral accelerations over all rotation angles, in cm/s/s.
+    """
+
+    endpoint: str = Field(None)
+    record_id: list[str] = Field(...)
+    direction: list[str] = Field(...)
+    process_config: ProcessConfig
+    period: list[float] = Field(...)
+    rotd50: list[float] = Field(...)
+    rotd100: list[float] = Field(...)
+
+
 class UploadResponse(BaseModel):
     message: str
     task_ids: list | None = Field(None)
     records: list | None = Field(None)
 
 
+# intensity measure field -> (lower bound, upper bound) in `QueryConfig`
+INTENSITY_MEASURE_FILTER: dict[str, tuple[str, str]] = {
+    "maximum_velocity": ("min_pgv", "max_pgv"),
+    "maximum_displacement": ("min_pgd", "max_pgd"),
+    "arias_intensity": ("min_arias_intensity", "max_arias_intensity"),
+    "cumulative_absolute_velocity": ("min_cav", "max_cav"),
+    "significant_duration": ("min_significant_duration", "max_significant_duration"),
+}
+
+
+# intensity measures are computed at ingestion, records ingested earlier need `/backfill`
+_MISSING_IM: str = ", records without intensity measures never match, see `/backfill`."
+
+
 class QueryConfig(BaseModel):
     region: Literal["jp", "nz"] | None = Field(None)
     min_magnitude: float | None = Field(None, ge=0, le=10)
@@ -285,6 +543,24 @@ class QueryConfig(BaseModel):
     to_date: datetime | None = Field(None)
     min_pga: float | None = Field(None, ge=0)
     max_pga: float | None = Field(None, ge=0)
+    min_pgv: float | None = Field(None, ge=0, description="in cm/s" + _MISSING_IM)
+    max_pgv: float | None = Field(None, ge=0, description="in cm/s" + _MISSING_IM)
+    min_pgd: float | None = Field(None, ge=0, description="in cm" + _MISSING_IM)
+    max_pgd: float | None = Field(None, ge=0, description="in cm" + _MISSING_IM)
+    min_arias_intensity: float | None = Field(
+        None, ge=0, description="in m/s" + _MISSING_IM
+    )
+    max_arias_intensity: float | None = Field(
+        None, ge=0, description="in m/s" + _MISSING_IM
+    )
+    min_cav: float | None = Field(None, ge=0, description="in cm/s" + _MISSING_IM)
+    max_cav: float | None = Field(None, ge=0, description="in cm/s" + _MISSING_IM)
+    min_significant_duration: float | None = Field(
+        None, ge=0, description="D5-95 in seconds" + _MISSING_IM
+    )
+    max_significant_duration: float | None = Field(
+        None, ge=0, description="D5-95 in seconds" + _MISSING_IM
+    )
     file_name: str | None = Field(None)
     station_code: str | None = Field(None)
     direction: str | None = Field(None)
@@ -355,6 +631,15 @@ class QueryConfig(BaseModel):
         if pga:
             query_dict["maximum_acceleration"] = pga
 
+        for field, (lower, upper) in INTENSITY_MEASURE_FILTER.items():
+            im_range: dict = {}
+            if (value := getattr(self, lower)) is not None:
+                im_range["$gte"] = value
+            if (value := getattr(self, upper)) is not None:
+                im_range["$lte"] = value
+            if im_range:
+                query_dict[field] = im_range
+
         if self.direction is not None:
             query_dict["direction"] = {"$regex": self.direction, "$options": "i"}
 
@@ -403,6 +688,15 @@ class QueryConfig(BaseModel):
         if pga_range:
             query_must.append({"range": {"maximum_acceleration": pga_range}})
 
+        for field, (lower, upper) in INTENSITY_MEASURE_FILTER.items():
+            im_range = {}
+            if (value := getattr(self, lower)) is not None:
+                im_range["gte"] = value
+            if (value := getattr(self, upper)) is not None:
+                im_range["lte"] = value
+            if im_range:
+                query_must.append({"range": {field: im_range}})
+
         if self.event_location is not None:
             max_distance = (
                 self.max_event_distance
@@ -454,6 +748,79 @@ class QueryConfig(BaseModel):
         return query_dict
 
 
+class SimilarityConfig(BaseModel):
+    period: list[Annotated[float, Field(gt=0)]] = Field(
+        ..., min_length=2, description="Periods of the target spectrum in seconds."
+    )
+    spectrum: list[Annotated[float, Field(gt=0)]] = Field(
+        ...,
+        min_length=2,
+        description="The 5%-damped target spectral acceleration in cm/s/s.",
+    )
+    top_k: int = Field(10, ge=1, le=1000)
+    with_scaling: bool = Field(
+        False,
+        description="Scale each record by the factor that minimises its misfit.",
+    )
+    prune_stride: int = Field(
+        1,
+        ge=1,
+        description="If larger than one, candidates are first shortlisted on a coarse period grid, "
+        "which is faster but approximate.",
+    )
+    query: QueryConfig | None = Field(
+        None, description="Only records matching the query are considered."
+    )
+
+    @model_validator(mode="after")
+    def check_length(self):
+        if len(self.period) != len(self.spectrum):
+            raise ValueError("Period and spectrum should have the same length.")
+        return self
+
+
+class SimilarRecordResponse(MetadataResponse):
+    misfit: float = Field(..., description="Root mean square of log spectral ratios.")
+    amplitude_scale: float = Field(
+        1.0,
+        description="The factor applied to the record to best match the target, "
+        "one unless amplitude scaling is requested.",
+    )
+
+
+class ListSimilarRecordResponse(BaseModel):
+    records: list[SimilarRecordResponse] = Field(None)
+    unindexed: int = Field(
+        0,
+        description="The number of records not considered as they have no spectra, see `/backfill`.",
+    )
+
+
+class CorrelationConfig(BaseModel):
+    record_id: str = Field(..., description="The ID of the record to compare against.")
+    query: QueryConfig = Field(
+        default_factory=QueryConfig,
+        description="Candidates are the records matching the query, paginated as in `/query`.",
+    )
+    top_k: int = Field(10, ge=1, le=1000)
+    max_lag: float | None = Field(
+        None, gt=0, description="Only lags within this value in seconds are considered."
+    )
+
+
+class CorrelatedRecordResponse(MetadataResponse):
+    correlation: float = Field(
+        ..., description="Peak normalised cross-correlation with the query record."
+    )
+    lag: float = Field(
+        ..., description="Lag of the record behind the query record at peak, in s."
+    )
+
+
+class ListCorrelatedRecordResponse(BaseModel):
+    records: list[CorrelatedRecordResponse] = Field(None)
+
+
 class UploadTaskResponse(BaseModel):
     id: str
     create_time: datetime
@@ -0,0 +1,242 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+from asyncio import Lock
+from functools import partial
+from time import monotonic
+
+import numpy as np
+from beanie.operators import NE, In
+from pydantic import BaseModel
+
+from ..record.async_record import MetadataRecord, Record, load_waveform
+from ..record.correlation import correlation_spectra, cross_correlate
+from ..record.similarity import SpectrumIndex, interpolate_target
+from ..utility.cache import LRUCache
+from .process import offload
+from .response import (
+    CorrelatedRecordResponse,
+    CorrelationConfig,
+    ListCorrelatedRecordResponse,
+    ListSimilarRecordResponse,
+    SimilarityConfig,
+    SimilarRecordResponse,
+)
+
+# the index is rebuilt from the database once it is older than this, in seconds
+REFRESH_INTERVAL: float = 600.0
+
+# spectra for cross-correlation keyed by record id and file hash, about 128 KB each
+CORRELATION_CACHE = LRUCache("correlation_spectrum", 1024)
+
+_index: SpectrumIndex | None = None
+# number of records without spectra when the index was built, see `backfill_record`
+_unindexed: int = 0
+_timestamp: float = 0.0
+_lock = Lock()
+
+
+class _SpectrumProjection(BaseModel):
+    id: str
+    response_spectrum: bytes
+
+    class Settings:
+        projection = {"id": "$_id", "response_spectrum": 1}
+
+
+class _IdProjection(BaseModel):
+    id: str
+
+    class Settings:
+        projection = {"id": "$_id"}
+
+
+class _HashProjection(BaseModel):
+    id: str
+    file_hash: str | None = None
+
+    class Settings:
+        projection = {"id": "$_id", "file_hash": 1}
+
+
+async def spectrum_index(refresh: bool = False) -> SpectrumIndex:
+    """
+    Get the in-process spectrum index, it is loaded from the database on first use.
+    """
+    global _index, _unindexed, _timestamp
+
+    async with _lock:
+        if refresh or _index is None or monotonic() - _timestamp > REFRESH_INTERVAL:
+            results = (
+                await Record.find(NE(Record.response_spectrum, None))
+                .project(_SpectrumProjection)
+                .to_list()
+            )
+            _index = SpectrumIndex(
+                [x.id for x in results], [x.response_spectrum for x in results]
+            )
+            _unindexed = await Record.find({"response_spectrum": None}).count()
+            _timestamp = monotonic()
+
+    return _index
+
+
+async def search_similar(config: SimilarityConfig) -> ListSimilarRecordResponse:
+    index = await spectrum_index()
+
+    rows: np.ndarray | None = None
+    unindexed: int = _unindexed
+    if config.query is not None:
+        candidates = (
+            await Record.find(config.query.generate_query_string())
+            .project(_IdProjection)
+            .to_list()
+        )
+        rows = index.rows([x.id for x in candidates])
+        unindexed = len(candidates) - len(rows)
+
+    log_target, mask = interpolate_target(
+        np.array(config.period), np.array(config.spectrum)
+    )
+    # the index stays in this process, it is searched in a thread
+    best, misfit, amplitude_scale = await offload(
+        partial(
+            index.search,
+            log_target,
+            mask,
+            config.top_k,
+            rows=rows,
+            with_scaling=config.with_scaling,
+            prune_stride=config.prune_stride,
+        ),
+        local=True,
+    )
+
+    record_id: list[str] = [index.record_id[i] for i in best]
+    metadata: dict[str, MetadataRecord] = {
+        x.id: x
+        for x in await Record.find(In(Record.id, record_id))
+        .project(MetadataRecord)
+        .to_list()
+    }
+
+    return ListSimilarRecordResponse(
+        records=[
+            SimilarRecordResponse(
+                **metadata[x].model_dump(exclude_none=True),
+                endpoint="/similar",
+                misfit=y,
+                amplitude_scale=z,
+            )
+            for x, y, z in zip(record_id, misfit, amplitude_scale, strict=True)
+            if x in metadata
+        ],
+        unindexed=unindexed,
+    )
+
+
+async def _correlation_spectra(
+    candidates: list[_HashProjection],
+) -> dict[str, np.ndarray]:
+    """
+    Get correlation spectra of the given records, only uncached records are loaded.
+    """
+    spectra: dict[str, np.ndarray] = {}
+    missing: list[str] = []
+    for x in candidates:
+        if (spectrum := CORRELATION_CACHE.get((x.id, x.file_hash))) is None:
+            missing.append(x.id)
+        else:
+            spectra[x.id] = spectrum
+
+    if missing:
+        records = await load_waveform(
+            await Record.find(In(Record.id, missing)).to_list()
+        )
+        computed = await offload(
+            correlation_spectra, [x.to_waveform(unit="cm/s/s") for x in records]
+        )
+        for record, spectrum in zip(records, computed, strict=True):
+            # arrays come back writeable from worker processes
+            spectrum.flags.writeable = False
+            CORRELATION_CACHE.put((record.id, record.file_hash), spectrum)
+            spectra[record.id] = spectrum
+
+    return spectra
+
+
+async def search_correlated(
+    config: CorrelationConfig,
+) -> ListCorrelatedRecordResponse | None:
+    target = (
+        await Record.find(Record.id == config.record_id)
+        .project(_HashProjection)
+        .first_or_none()
+    )
+    if target is None:
+        return None
+
+    pagination = config.query.pagination
+    candidates = [
+        x
+        for x in await Record.find(config.query.generate_query_string())
+        .sort(pagination.sort_by)
+        .skip(pagination.page_number * pagination.page_size)
+        .limit(pagination.page_size)
+        .project(_HashProjection)
+        .to_list()
+        if x.id != target.id
+    ]
+
+    spectra = await _correlation_spectra([target, *candidates])
+    if target.id not in spectra:
+        return None
+
+    candidates = [x for x in candidates if x.id in spectra]
+    if not candidates:
+        return ListCorrelatedRecordResponse(records=[])
+
+    # cached spectra are large, they are correlated in a thread instead of being pickled
+    correlation, lag = await offload(
+        cross_correlate,
+        spectra[target.id],
+        [spectra[x.id] for x in candidates],
+        config.max_lag,
+        local=True,
+    )
+    best = np.argsort(-correlation, kind="stable")[: config.top_k]
+
+    record_id: list[str] = [candidates[i].id for i in best]
+    metadata: dict[str, MetadataRecord] = {
+        x.id: x
+        for x in await Record.find(In(Record.id, record_id))
+        .project(MetadataRecord)
+        .to_list()
+    }
+
+    return ListCorrelatedRecordResponse(
+        records=[
+            CorrelatedRecordResponse(
+                **metadata[candidates[i].id].model_dump(exclude_none=True),
+                endpoint="/correlated",
+                correlation=correlation[i],
+                lag=lag[i],
+            )
+            for i in best
+            if candidates[i].id in metadata
+        ]
+    )
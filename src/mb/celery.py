@@ -19,7 +19,9 @@ from celery import Celery
 from celery.signals import worker_process_init, worker_process_shutdown
 from pymongo import AsyncMongoClient
 
+from mb.record.warm_up import warm_up
 from mb.utility.config import mb_init_beanie, mongo_uri, rabbitmq_uri
+from mb.utility.env import MB_WARM_UP
 
 celery = Celery(
     "mb",
@@ -61,6 +63,8 @@ def _ensure_loop():
 @worker_process_init.connect
 def init_mongo_in_celery_worker(**_):
     _ensure_loop().run_until_complete(startup())
+    if MB_WARM_UP:
+        warm_up()
 
 
 @worker_process_shutdown.connect
@@ -33,7 +33,15 @@ from pint import Quantity
 from rich.console import Console
 from rich.progress import track
 
-from mb.app.response import PaginationConfig, QueryConfig, RecordResponse
+from mb.app.response import (
+    CorrelationConfig,
+    PaginationConfig,
+    ProcessConfig,
+    QueryConfig,
+    RecordResponse,
+)
+from mb.record.response_spectrum import batch_integrate, batch_response_spectrum
+from mb.record.utility import pack_waveforms
 
 
 class MBRecord(RecordResponse):
@@ -103,21 +111,32 @@ class MBRecord(RecordResponse):
         self,
         damping_ratio: float = 0.05,
         period_bracket: np.ndarray = np.arange(0, 10, 0.01),
+        tolerance: float | None = None,
+        log_scale: bool = False,
     ):
-        self.to_response_spectrum(damping_ratio, period_bracket)
+        """
+        Plot response spectra on the given periods.
+
+        If `tolerance` is given, the periods are refined adaptively, for example,
+        `plot_response_spectrum(period_bracket=log_period(0.01, 10, 32), tolerance=0.01, log_scale=True)`.
+        """
+        self.to_response_spectrum(damping_ratio, period_bracket, tolerance)
 
         fig = plt.figure(figsize=(10, 6), dpi=100)
         fig.add_subplot(311)
         plt.title(f"{self.id}")
         plt.plot(self.period, self.displacement_spectrum)
+        plt.xscale("log" if log_scale else "linear")
         plt.xlabel("Period (s)")
         plt.ylabel("SD")
         fig.add_subplot(312)
         plt.plot(self.period, self.velocity_spectrum)
+        plt.xscale("log" if log_scale else "linear")
         plt.xlabel("Period (s)")
         plt.ylabel("SV")
         fig.add_subplot(313)
         plt.plot(self.period, self.acceleration_spectrum)
+        plt.xscale("log" if log_scale else "linear")
         plt.xlabel("Period (s)")
         plt.ylabel("SA")
         fig.tight_layout()
@@ -126,6 +145,51 @@ class MBRecord(RecordResponse):
     def print(self):
         Console().print(self)
 
+    @staticmethod
+    def batch_response_spectrum(
+        records: list[MBRecord],
+        damping_ratio: float = 0.05,
+        period_bracket: np.ndarray = np.arange(0, 10, 0.01),
+    ):
+        """
+        Compute response spectra of all given records in one parallel call.
+
+        This is considerably faster than calling `to_response_spectrum` on each record.
+        """
+        motion, offset = pack_waveforms([np.array(r.waveform) for r in records])
+        spectra = batch_response_spectrum(
+            np.array([damping_ratio]),
+            np.array([r.time_interval for r in records], dtype=float),
+            motion,
+            offset,
+            np.asarray(period_bracket, dtype=float),
+        )
+        for record, spectrum in zip(records, spectra[:, 0], strict=True):
+            record.period = np.asarray(period_bracket).tolist()
+            record.displacement_spectrum = spectrum[:, 0].tolist()
+            record.velocity_spectrum = spectrum[:, 1].tolist()
+            record.acceleration_spectrum = spectrum[:, 2].tolist()
+
+        return records
+
+    @staticmethod
+    def batch_integrate(records: list[MBRecord], baseline_correction: bool = False):
+        """
+        Integrate all given records into velocity and displacement in one parallel call.
+        """
+        motion, offset = pack_waveforms([np.array(r.waveform) for r in records])
+        displacement, velocity = batch_integrate(
+            np.array([r.time_interval for r in records], dtype=float),
+            motion,
+            offset,
+            baseline_correction=baseline_correction,
+        )
+        for i, record in enumerate(records):
+            record.displacement = displacement[offset[i] : offset[i + 1]].tolist()
+            record.velocity = velocity[offset[i] : offset[i + 1]].tolist()
+
+        return records
+
 
 class MBToken:
     def __init__(self, access_token: str):
@@ -392,6 +456,66 @@ class MBClient:
 
         return [MBRecord.new_record(r) for r in result.json()["records"]]
 
+    async def process(
+        self, record_id: list[str], config: ProcessConfig | dict
+    ) -> list[MBRecord] | None:
+        """
+        Process records on the server with the same configuration.
+
+        Enable `with_integration` to obtain velocity and displacement without downloading
+        and integrating waveforms locally.
+        """
+        result = await self.client.post(
+            "/process/bulk",
+            json={
+                "record_id": record_id,
+                "process_config": config.model_dump(mode="json", exclude_none=True)
+                if isinstance(config, ProcessConfig)
+                else config,
+            },
+        )
+        if result.status_code != HTTPStatus.OK:
+            self.print("[red]Failed to process records.[/]")
+            return None
+
+        if missing := result.json().get("missing"):
+            self.print(f"[yellow]Records not found: {', '.join(missing)}.[/]")
+
+        return [MBRecord.new_record(r) for r in result.json()["records"]]
+
+    async def rotd(self, record_id: str, config: ProcessConfig | dict) -> dict | None:
+        """
+        Compute RotD50 and RotD100 spectra of the horizontal pair that the given record belongs to.
+        """
+        result = await self.client.post(
+            "/process/rotd",
+            params={"record_id": record_id},
+            json=config.model_dump(mode="json", exclude_none=True)
+            if isinstance(config, ProcessConfig)
+            else config,
+        )
+        if result.status_code != HTTPStatus.OK:
+            self.print("[red]Failed to compute RotD spectra.[/]")
+            return None
+
+        return result.json()
+
+    async def correlated(self, config: CorrelationConfig | dict) -> list[dict] | None:
+        """
+        Find records whose waveforms are highly correlated with the given record.
+        """
+        result = await self.client.post(
+            "/correlated",
+            json=config.model_dump(mode="json", exclude_none=True)
+            if isinstance(config, CorrelationConfig)
+            else config,
+        )
+        if result.status_code != HTTPStatus.OK:
+            self.print("[red]Failed to search correlated records.[/]")
+            return None
+
+        return result.json()["records"]
+
     async def retrieve_all(self, query: QueryConfig | dict):
         search_after = None
         json_query = (
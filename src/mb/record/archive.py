@@ -0,0 +1,216 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ARCHIVE_DTYPE = np.dtype("<i4")
+ARCHIVE_INDEX: str = "index.npz"
+ARCHIVE_LOCK: str = "archive.lock"
+
+
+class ArchiveBusyError(RuntimeError):
+    pass
+
+
+class WaveformArchive:
+    """
+    An append-only archive of raw waveforms for read-heavy deployments.
+
+    Samples of all records are stored back to back as little-endian int32 in a single file,
+    which is memory-mapped so that all workers on the same host share the page cache.
+    An index maps each record id to its slice and the hash of the file it was parsed from,
+    so that an entry of an overwritten record is not served.
+
+    The index is replaced atomically after samples are appended, so readers never observe
+    an index that refers to samples not yet written. A compacting rebuild writes a new
+    generation of the sample file, the previous one stays valid for readers still mapping it.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path: Path = Path(path)
+
+        self._lock = Lock()
+        self._version: tuple | None = None
+        self._samples_name: str | None = None
+        # index and mapped samples are swapped together so that readers see a consistent pair
+        self._state: tuple[dict[str, tuple[str, int, int]], np.ndarray] = (
+            {},
+            np.empty(0, dtype=ARCHIVE_DTYPE),
+        )
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __contains__(self, record_id: str):
+        return record_id in self._state[0]
+
+    def refresh(self):
+        """
+        Reload the index if it has been rebuilt since it was last read, which is cheap otherwise.
+        """
+        try:
+            stat = (self.path / ARCHIVE_INDEX).stat()
+        except FileNotFoundError:
+            return
+
+        if (version := (stat.st_ino, stat.st_mtime_ns, stat.st_size)) == self._version:
+            return
+
+        with self._lock:
+            with np.load(self.path / ARCHIVE_INDEX) as content:
+                samples_name = str(content["samples"])
+                index = {
+                    i: (h, o, s)
+                    for i, h, o, s in zip(
+                        content["id"].tolist(),
+                        content["file_hash"].tolist(),
+                        content["offset"].tolist(),
+                        content["size"].tolist(),
+                        strict=True,
+                    )
+                }
+
+            samples_path: Path = self.path / samples_name
+            self._state = (
+                index,
+                np.memmap(samples_path, dtype=ARCHIVE_DTYPE, mode="r")
+                if samples_path.stat().st_size
+                else np.empty(0, dtype=ARCHIVE_DTYPE),
+            )
+            self._samples_name = samples_name
+            self._version = version
+
+    def get(self, record_id: str, file_hash: str | None = None) -> np.ndarray | None:
+        """
+        Get the raw samples of the given record as a read-only view into the mapped file.
+
+        If `file_hash` is given, the entry is only returned if it was archived from the same file.
+        """
+        index, samples = self._state
+        if (entry := index.get(record_id)) is None or (
+            file_hash is not None and entry[0] != file_hash
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return samples[entry[1] : entry[1] + entry[2]].view(np.ndarray)
+
+    def entries(self) -> dict[str, str]:
+        """
+        Get the archived record ids mapped to file hashes.
+        """
+        return {k: v[0] for k, v in self._state[0].items()}
+
+    @contextmanager
+    def writer(self, compact: bool = False):
+        """
+        Open the archive for writing, only one writer is allowed at a time across processes.
+
+        Yields a callable `append(record_id, file_hash, samples)` and a callable `remove(record_ids)`.
+        With `compact`, entries not appended again are dropped and a new sample file is written.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        with open(self.path / ARCHIVE_LOCK, "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError as e:
+                    raise ArchiveBusyError(
+                        f"Archive {self.path} is being written."
+                    ) from e
+
+            self.refresh()
+
+            index: dict[str, tuple[str, int, int]] = (
+                {} if compact else dict(self._state[0])
+            )
+            samples_name: str = self._samples_name or "samples-0.bin"
+            if compact and self._samples_name is not None:
+                samples_name = f"samples-{int(samples_name[8:-4]) + 1}.bin"
+                (self.path / samples_name).unlink(missing_ok=True)
+
+            with open(self.path / samples_name, "ab") as samples_file:
+                offset: int = samples_file.tell() // ARCHIVE_DTYPE.itemsize
+
+                def append(record_id: str, file_hash: str, samples: np.ndarray):
+                    nonlocal offset
+                    samples_file.write(
+                        np.asarray(samples, dtype=ARCHIVE_DTYPE).tobytes()
+                    )
+                    index[record_id] = (file_hash, offset, samples.size)
+                    offset += samples.size
+
+                def remove(record_ids: list[str]):
+                    for record_id in record_ids:
+                        index.pop(record_id, None)
+
+                yield append, remove
+
+                samples_file.flush()
+                os.fsync(samples_file.fileno())
+
+            self._write_index(index, samples_name)
+
+            if compact:
+                for x in self.path.glob("samples-*.bin"):
+                    if x.name != samples_name:
+                        x.unlink()
+
+        self.refresh()
+
+    def _write_index(self, index: dict[str, tuple[str, int, int]], samples_name: str):
+        ids: list[str] = list(index)
+        values: list[tuple] = [index[x] for x in ids]
+        with open(temp_path := self.path / f"{ARCHIVE_INDEX}.tmp", "wb") as index_file:
+            np.savez(
+                index_file,
+                samples=np.array(samples_name),
+                id=np.array(ids, dtype=str),
+                file_hash=np.array([x[0] or "" for x in values], dtype=str),
+                offset=np.array([x[1] for x in values], dtype=np.int64),
+                size=np.array([x[2] for x in values], dtype=np.int64),
+            )
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(temp_path, self.path / ARCHIVE_INDEX)
+
+    def stats(self) -> dict:
+        total: int = self.hits + self.misses
+        index, samples = self._state
+        return {
+            "path": str(self.path),
+            "records": len(index),
+            "samples": samples.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
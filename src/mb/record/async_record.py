@@ -15,19 +15,69 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+import asyncio
+import re
+from datetime import datetime, timedelta
+from enum import Enum
 
 import numpy as np
 import pint
+import structlog
 from beanie import Document, Indexed
-from pydantic import Field, model_validator
-
-from .utility import convert_to, normalise, perform_fft, str_factory, uuid5_str
+from beanie.odm.utils.dump import get_dict
+from beanie.operators import In
+from pydantic import Field, PrivateAttr, model_validator
+from pymongo import IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ..utility.env import (
+    MB_BULK_SIZE,
+    MB_RESULT_STORE,
+    MB_RESULT_TTL,
+    MB_WAVEFORM_ARCHIVE,
+    MB_WAVEFORM_CODEC,
+    MB_WAVEFORM_STORE,
+)
+from ..utility.files import delete_blobs, load_blobs, store_blobs
+from .archive import WaveformArchive
+from .intensity_measure import INTENSITY_MEASURE, batch_intensity_measure
+from .response_spectrum import batch_response_spectrum
+from .similarity import SPECTRUM_DAMPING_RATIO, SPECTRUM_PERIOD, encode_spectrum
+from .utility import (
+    WaveformCodec,
+    convert_to,
+    decode_waveform,
+    encode_waveform,
+    normalise,
+    pack_waveforms,
+    perform_fft,
+    str_factory,
+    uuid5_str,
+)
+
+_logger = structlog.get_logger(__name__)
 
 ASCENDING = 1
 DESCENDING = -1
 GEOSPHERE = "2dsphere"
 
+VERTICAL_DIRECTION: tuple[str, ...] = ("UD", "UP", "Z")
+
+WAVEFORM_ARCHIVE: WaveformArchive | None = (
+    WaveformArchive(MB_WAVEFORM_ARCHIVE) if MB_WAVEFORM_ARCHIVE else None
+)
+
+
+def is_horizontal(direction: str | None) -> bool:
+    return direction is not None and not direction.upper().startswith(
+        VERTICAL_DIRECTION
+    )
+
+
+def _sensor(direction: str) -> str:
+    # KiK-net records carry the sensor index (1: borehole, 2: surface) after the direction
+    return match.group(1) if (match := re.fullmatch(r"[A-Z]{2}(\d)", direction)) else ""
+
 
 # noinspection PyTypeHints
 class MetadataRecord(Document):
@@ -47,6 +97,23 @@ class MetadataRecord(Document):
     maximum_acceleration: Indexed(float, DESCENDING) = Field(
         None, description="PGA in Gal."
     )
+    maximum_velocity: Indexed(float, DESCENDING) = Field(
+        None, description="PGV in cm/s."
+    )
+    maximum_displacement: Indexed(float, DESCENDING) = Field(
+        None, description="PGD in cm."
+    )
+    arias_intensity: Indexed(float, DESCENDING) = Field(
+        None, description="Arias intensity in m/s."
+    )
+    cumulative_absolute_velocity: Indexed(float, DESCENDING) = Field(
+        None, description="Cumulative absolute velocity (CAV) in cm/s."
+    )
+    significant_duration: Indexed(float, DESCENDING) = Field(
+        None,
+        description="Significant duration (D5-95) in seconds, "
+        "the time between 5% and 95% of the Arias intensity.",
+    )
 
     event_time: Indexed(datetime, DESCENDING) = Field(
         None, description="The origin time of the record."
@@ -104,7 +171,7 @@ class MetadataRecord(Document):
             return data
         return {k: v for k, v in data.items() if v is not None}
 
-    async def save(self, *args, **kwargs):
+    def generate_id(self) -> str:
         token: str = self.file_name
         if self.region is not None:
             token += self.region
@@ -114,27 +181,50 @@ class MetadataRecord(Document):
             token += self.last_update_time.isoformat()
         if self.direction is not None:
             token += self.direction
-        self.id = uuid5_str(token)
+        return uuid5_str(token)
+
+    async def save(self, *args, **kwargs):
+        self.id = self.generate_id()
 
         return await super().save(*args, **kwargs)
 
 
 class Record(MetadataRecord):
-    raw_data: list[int] = Field(
-        None, description="The raw acceleration data of the record."
+    raw_data: bytes | list[int] = Field(
+        None,
+        description="The raw acceleration data of the record, "
+        "encoded by `encode_waveform` when saved, legacy records may store a plain list.",
     )
     raw_data_unit: str = Field(
         None, description="The unit of the raw acceleration data of the record."
     )
     offset: float = Field(0, description="The offset of the record.")
+    response_spectrum: bytes = Field(
+        None,
+        description="The 5%-damped spectral acceleration in cm/s/s on the log-period grid `SPECTRUM_PERIOD`, "
+        "stored as little-endian float32.",
+    )
+
+    # raw samples served from the waveform archive
+    _samples: np.ndarray | None = PrivateAttr(None)
+
+    def to_raw_waveform(self) -> tuple[float, np.ndarray]:
+        if self._samples is not None:
+            return 1 / self.sampling_frequency, self._samples
 
-    def to_raw_waveform(self) -> tuple[float, list]:
-        return 1 / self.sampling_frequency, self.raw_data
+        if self.raw_data is None:
+            raise ValueError(
+                f"Waveform of record {self.id} is not loaded, see `load_waveform`."
+            )
+
+        return 1 / self.sampling_frequency, decode_waveform(self.raw_data)
 
     def to_waveform(self, **kwargs) -> tuple[float, np.ndarray]:
-        sampling_interval: float = 1 / self.sampling_frequency
+        sampling_interval, raw_data = self.to_raw_waveform()
 
-        numpy_array: np.ndarray = np.array(self.raw_data, dtype=float) + self.offset
+        # raw integers are converted to the requested precision directly
+        numpy_array: np.ndarray = raw_data.astype(kwargs.get("dtype", np.float64))
+        numpy_array += self.offset
         if kwargs.get("normalised", False):
             numpy_array = normalise(numpy_array)
             unit = None
@@ -150,15 +240,91 @@ class Record(MetadataRecord):
         _, waveform = self.to_waveform(**kwargs)
         return perform_fft(self.sampling_frequency, waveform)
 
+    async def horizontal_partner(self) -> Record | None:
+        """
+        Find the other horizontal component recorded by the same sensor of the same station during the same event.
+        """
+        if not is_horizontal(self.direction):
+            return None
+
+        candidates: list[Record] = await Record.find(
+            Record.region == self.region,
+            Record.category == self.category,
+            Record.station_code == self.station_code,
+            Record.event_time == self.event_time,
+        ).to_list()
+        candidates = sorted(
+            (
+                x
+                for x in candidates
+                if x.id != self.id
+                and is_horizontal(x.direction)
+                and x.direction != self.direction
+                and _sensor(x.direction) == _sensor(self.direction)
+            ),
+            key=lambda x: x.direction,
+        )
+
+        return candidates[0] if candidates else None
+
+    def prepare(self, compute: bool = True) -> Record:
+        """
+        Prepare the record to be written, shared by `save` and `RecordWriter`.
+
+        The waveform is encoded and the id is assigned.
+        With `compute`, intensity measures and spectra are computed as well,
+        otherwise they are left to `compute_features`, see `prepare_records`.
+        """
+        if self.raw_data is not None and not isinstance(self.raw_data, bytes):
+            self.raw_data = encode_waveform(
+                self.raw_data, WaveformCodec(MB_WAVEFORM_CODEC)
+            )
+
+        # intensity measures and spectra are computed once at ingestion so that
+        # records can be selected without touching waveforms
+        if compute:
+            compute_features([self])
+
+        self.id = self.generate_id()
+
+        return self
+
+    async def save(self, *args, **kwargs):
+        self.prepare()
+
+        # results of an overwritten record are stale
+        await delete_result([self.id])
+
+        if (
+            self.raw_data is None
+            or WaveformStore(MB_WAVEFORM_STORE) == WaveformStore.Inline
+        ):
+            return await super().save(*args, **kwargs)
+
+        # the waveform is stored first so that the metadata never refers to a missing waveform
+        await store_waveform({self.id: self.raw_data})
+
+        raw_data, self.raw_data = self.raw_data, None
+        try:
+            return await super().save(*args, **kwargs)
+        finally:
+            self.raw_data = raw_data
+
+    async def delete(self, *args, **kwargs):
+        await delete_waveform([self.id])
+        await delete_result([self.id])
+        return await super().delete(*args, **kwargs)
+
 
 class NIED(Record):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.region = "jp"
 
-    async def save(self, *args, **kwargs):
-        self.offset = -sum(self.raw_data) / len(self.raw_data)
-        return await super().save(*args, **kwargs)
+    def prepare(self, compute: bool = True) -> NIED:
+        raw_data: np.ndarray = decode_waveform(self.raw_data)
+        self.offset = -int(raw_data.sum(dtype=np.int64)) / raw_data.size
+        return super().prepare(compute)
 
 
 class NZSM(Record):
@@ -172,6 +338,249 @@ class NZSM(Record):
         self.raw_data_unit = str(pint.Unit("mm/s/s"))
 
 
+def compute_features(records: list[Record]) -> list[Record]:
+    """
+    Compute intensity measures and response spectra of records with waveforms in one parallel launch.
+
+    Each waveform is decoded once, records without waveforms are left untouched.
+    """
+    loaded: list[Record] = []
+    interval: list[float] = []
+    waveforms: list[np.ndarray] = []
+    for record in records:
+        if record.raw_data is None and record._samples is None:
+            continue
+        x, y = record.to_waveform(unit="cm/s/s")
+        if y.size == 0:
+            continue
+        loaded.append(record)
+        interval.append(x)
+        waveforms.append(y)
+
+    if not loaded:
+        return records
+
+    motion, offset = pack_waveforms(waveforms)
+    spectra = batch_response_spectrum(
+        np.array([SPECTRUM_DAMPING_RATIO]),
+        np.array(interval),
+        motion,
+        offset,
+        SPECTRUM_PERIOD,
+    )[:, 0, :, 2]
+    measures = batch_intensity_measure(np.array(interval), motion, offset)
+    for record, spectrum, measure in zip(loaded, spectra, measures, strict=True):
+        record.response_spectrum = encode_spectrum(spectrum)
+        for k, v in zip(INTENSITY_MEASURE, measure.tolist(), strict=True):
+            setattr(record, k, v)
+
+    return records
+
+
+def prepare_records(records: list[Record]) -> list[Record]:
+    """
+    Prepare records to be written, intensity measures and spectra are computed in one batch.
+    """
+    return compute_features([x.prepare(compute=False) for x in records])
+
+
+class WaveformStore(Enum):
+    Inline = "inline"
+    Collection = "collection"
+    Bucket = "s3"
+
+
+WAVEFORM_FOLDER: str = "waveform"
+
+
+class Waveform(Document):
+    """
+    The encoded raw data of a record stored apart from its metadata, keyed by the record id.
+    """
+
+    id: str
+    raw_data: bytes
+
+
+async def store_waveform(waveforms: dict[str, bytes]):
+    """
+    Store encoded waveforms keyed by record ids in the configured store, existing ones are replaced.
+    """
+    if not waveforms:
+        return
+
+    store = WaveformStore(MB_WAVEFORM_STORE)
+    if store == WaveformStore.Collection:
+        await Waveform.get_pymongo_collection().bulk_write(
+            [
+                ReplaceOne({"_id": k}, {"_id": k, "raw_data": v}, upsert=True)
+                for k, v in waveforms.items()
+            ],
+            ordered=False,
+        )
+    elif store == WaveformStore.Bucket:
+        await store_blobs(WAVEFORM_FOLDER, waveforms)
+
+
+def waveform_projection() -> dict | None:
+    """
+    The projection of record queries followed by `load_waveform`.
+
+    If the waveform archive is enabled, inline waveforms are excluded so that
+    they are served from the archive instead of being transferred from the database.
+    """
+    return None if WAVEFORM_ARCHIVE is None else {"raw_data": 0}
+
+
+async def find_records(record_id: list[str]) -> list[Record]:
+    """
+    Find records by IDs to be used with `load_waveform`, see `waveform_projection`.
+    """
+    query: dict = {"_id": {"$in": record_id}}
+    if (projection := waveform_projection()) is None:
+        return await Record.find(query).to_list()
+
+    return [
+        Record.model_validate(x)
+        async for x in Record.get_pymongo_collection().find(query, projection)
+    ]
+
+
+async def load_waveform(records: list[Record]) -> list[Record]:
+    """
+    Populate waveforms of records stored apart from their metadata.
+
+    Records are fetched without waveforms so that metadata queries do not carry them.
+    Waveforms are loaded on demand, all missing ones in a single batch.
+    If the waveform archive is enabled, archived waveforms are mapped instead,
+    inline waveforms of records missing from the archive are then fetched from the database.
+    """
+    if not (
+        missing := {
+            x.id: x for x in records if x.raw_data is None and x._samples is None
+        }
+    ):
+        return records
+
+    if WAVEFORM_ARCHIVE is not None:
+        WAVEFORM_ARCHIVE.refresh()
+        for k in list(missing):
+            if (samples := WAVEFORM_ARCHIVE.get(k, missing[k].file_hash)) is not None:
+                missing.pop(k)._samples = samples
+        if not missing:
+            return records
+
+    store = WaveformStore(MB_WAVEFORM_STORE)
+    if store == WaveformStore.Collection:
+        async for x in Waveform.find(In(Waveform.id, list(missing))):
+            missing[x.id].raw_data = x.raw_data
+    elif store == WaveformStore.Bucket:
+        for k, v in (await load_blobs(WAVEFORM_FOLDER, list(missing))).items():
+            missing[k].raw_data = v
+    elif WAVEFORM_ARCHIVE is not None:
+        async for x in Record.get_pymongo_collection().find(
+            {"_id": {"$in": list(missing)}, "raw_data": {"$ne": None}},
+            {"raw_data": 1},
+        ):
+            missing[x["_id"]].raw_data = x["raw_data"]
+
+    return records
+
+
+async def delete_waveform(record_ids: list[str]):
+    store = WaveformStore(MB_WAVEFORM_STORE)
+    if store == WaveformStore.Collection:
+        await Waveform.find(In(Waveform.id, record_ids)).delete()
+    elif store == WaveformStore.Bucket:
+        await delete_blobs(WAVEFORM_FOLDER, record_ids)
+
+
+class ResultStore(Enum):
+    Disabled = "none"
+    Collection = "collection"
+    Bucket = "s3"
+
+
+RESULT_FOLDER: str = "result"
+
+
+class ProcessedResult(Document):
+    """
+    The compressed processing result of a record under a configuration, shared by all workers.
+
+    Results expire after `MB_RESULT_TTL` hours as they can always be computed again.
+    """
+
+    id: str
+    record_id: Indexed(str)
+    data: bytes
+    create_time: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        indexes = [
+            IndexModel(
+                "create_time",
+                expireAfterSeconds=int(timedelta(hours=MB_RESULT_TTL).total_seconds()),
+            )
+        ]
+
+
+async def store_result(record_id: str, key: str, data: bytes):
+    """
+    Store the result of a record keyed by the record id and the digest of its configuration.
+    """
+    store = ResultStore(MB_RESULT_STORE)
+    if store == ResultStore.Collection:
+        await ProcessedResult.get_pymongo_collection().replace_one(
+            {"_id": f"{record_id}/{key}"},
+            {
+                "_id": f"{record_id}/{key}",
+                "record_id": record_id,
+                "data": data,
+                "create_time": datetime.now(),
+            },
+            upsert=True,
+        )
+    elif store == ResultStore.Bucket:
+        await store_blobs(RESULT_FOLDER, {f"{record_id}/{key}": data})
+
+
+async def load_result(keys: dict[str, str]) -> dict[str, bytes]:
+    """
+    Load the results of records given as record ids mapped to keys, missing ones are omitted.
+    """
+    if not keys:
+        return {}
+
+    store = ResultStore(MB_RESULT_STORE)
+    if store == ResultStore.Collection:
+        return {
+            x.record_id: x.data
+            async for x in ProcessedResult.find(
+                In(ProcessedResult.id, [f"{k}/{v}" for k, v in keys.items()])
+            )
+        }
+    if store == ResultStore.Bucket:
+        return {
+            k.split("/")[0]: v
+            for k, v in (
+                await load_blobs(RESULT_FOLDER, [f"{k}/{v}" for k, v in keys.items()])
+            ).items()
+        }
+    return {}
+
+
+async def delete_result(record_ids: list[str]):
+    """
+    Delete the shared results of records under all configurations.
+    """
+    store = ResultStore(MB_RESULT_STORE)
+    if store == ResultStore.Collection:
+        await ProcessedResult.find(In(ProcessedResult.record_id, record_ids)).delete()
+    elif store == ResultStore.Bucket:
+        await delete_blobs(RESULT_FOLDER, record_ids, recursive=True)
+
+
 class UploadTask(Document):
     id: str = Field(default_factory=str_factory)
     create_time: datetime = Field(default_factory=datetime.now)
@@ -194,3 +603,298 @@ async def create_task(task_id: str | None = None):
 async def delete_task(task_id: str):
     if (task := await UploadTask.get(task_id)) is not None:
         await task.delete()
+
+
+class RecordWriter:
+    """
+    Accumulate parsed records and write them in batches of unordered bulk upserts.
+
+    Records are keyed by their deterministic ids, so that a record parsed again replaces
+    the existing one. With `overwrite_existing`, existing records parsed from the same file
+    under a different id are removed as well. Progress of the given task is saved with each batch.
+    Use it as an async context manager so that the last batch is written on exit.
+    Records are prepared in batches in a thread when flushed, see `prepare_records`,
+    so that the event loop is not blocked by the computation of intensity measures and spectra.
+    Records rejected by the database are tracked in `failed`, use `written` to drop them.
+    """
+
+    def __init__(
+        self,
+        overwrite_existing: bool = True,
+        task: UploadTask | None = None,
+        batch_size: int = MB_BULK_SIZE,
+    ):
+        self.overwrite_existing: bool = overwrite_existing
+        self.task: UploadTask | None = task
+        self.batch_size: int = max(1, batch_size)
+
+        self.failed: set[str] = set()
+
+        self._pending: list[Record] = []
+
+    async def __aenter__(self) -> RecordWriter:
+        return self
+
+    async def __aexit__(self, *_):
+        await self.flush()
+
+    async def add(self, record: Record) -> Record:
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        return record
+
+    def written(self, records: list[Record]) -> list[Record]:
+        """
+        Drop records that failed to be written from the given list.
+        """
+        return [x for x in records if x.id not in self.failed]
+
+    async def flush(self):
+        records, self._pending = self._pending, []
+        if records:
+            await asyncio.to_thread(prepare_records, records)
+            await self._write(records)
+        if self.task:
+            await self.task.save()
+
+    async def _write(self, records: list[Record]):
+        record_ids: list[str] = [x.id for x in records]
+
+        if self.overwrite_existing and (
+            stale := await Record.get_pymongo_collection().distinct(
+                "_id",
+                {
+                    "file_hash": {"$in": [x.file_hash for x in records]},
+                    "_id": {"$nin": record_ids},
+                },
+            )
+        ):
+            await Record.find(In(Record.id, stale)).delete()
+            await delete_waveform(stale)
+            await delete_result(stale)
+
+        split: bool = WaveformStore(MB_WAVEFORM_STORE) != WaveformStore.Inline
+        if split:
+            # the waveforms are stored first so that the metadata never refers to a missing waveform
+            await store_waveform(
+                {x.id: x.raw_data for x in records if x.raw_data is not None}
+            )
+
+        operations: list[ReplaceOne] = []
+        for record in records:
+            document: dict = get_dict(record, to_db=True)
+            if split:
+                document["raw_data"] = None
+            operations.append(ReplaceOne({"_id": record.id}, document, upsert=True))
+
+        try:
+            await Record.get_pymongo_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # indices refer to `operations`, which follow the order of `records`
+            self.failed.update(records[x["index"]].id for x in e.details["writeErrors"])
+            _logger.critical(
+                "Failed to write records.",
+                failed=len(e.details["writeErrors"]),
+                total=len(operations),
+                exc_info=e,
+            )
+
+        # results of overwritten records are stale
+        await delete_result(record_ids)
+
+
+async def migrate_waveform(
+    task_id: str | None = None,
+    batch_size: int = 1000,
+    codec: WaveformCodec | None = None,
+    delta: bool = True,
+) -> int:
+    """
+    Convert waveforms stored as plain integer arrays into the binary format of `encode_waveform`.
+
+    If waveforms are stored apart from metadata, see `MB_WAVEFORM_STORE`, waveforms still
+    embedded in metadata documents are moved to the configured store as well.
+
+    Documents are converted in batches of `batch_size` in the order of their IDs,
+    the progress is reported via the task of `task_id` if given.
+    Converted documents no longer match the filter, so the migration can be safely resumed.
+    Returns the number of converted documents.
+    """
+    if codec is None:
+        codec = WaveformCodec(MB_WAVEFORM_CODEC)
+
+    split: bool = WaveformStore(MB_WAVEFORM_STORE) != WaveformStore.Inline
+
+    collection = Record.get_pymongo_collection()
+    legacy: dict = {"raw_data": {"$type": ["array", "binData"] if split else "array"}}
+
+    task: UploadTask | None = None
+    if task_id is not None and (task := await UploadTask.get(task_id)) is not None:
+        task.total_size = await collection.count_documents(legacy)
+        await task.save()
+
+    migrated: int = 0
+    last_id: str | None = None
+    while True:
+        batch_filter: dict = (
+            legacy if last_id is None else legacy | {"_id": {"$gt": last_id}}
+        )
+        batch: list = (
+            await collection.find(batch_filter, {"raw_data": 1})
+            .sort("_id")
+            .limit(batch_size)
+            .to_list()
+        )
+        if not batch:
+            break
+
+        waveforms: dict[str, bytes] = {
+            x["_id"]: x["raw_data"]
+            if isinstance(x["raw_data"], bytes)
+            else encode_waveform(x["raw_data"], codec, delta)
+            for x in batch
+        }
+        if split:
+            await store_waveform(waveforms)
+
+        await collection.bulk_write(
+            [
+                UpdateOne({"_id": k}, {"$set": {"raw_data": None if split else v}})
+                for k, v in waveforms.items()
+            ],
+            ordered=False,
+        )
+
+        migrated += len(batch)
+        last_id = batch[-1]["_id"]
+        if task is not None:
+            task.current_size = migrated
+            await task.save()
+
+    if task is not None:
+        await task.delete()
+
+    return migrated
+
+
+async def backfill_record(task_id: str | None = None, batch_size: int = 1000) -> int:
+    """
+    Compute intensity measures and response spectra of records ingested before they were computed at ingestion.
+
+    Records are processed in batches of `batch_size` in the order of their IDs, see `compute_features`,
+    the progress is reported via the task of `task_id` if given.
+    Records without waveforms are skipped, the backfill can be safely resumed.
+    Returns the number of updated records.
+    """
+    collection = Record.get_pymongo_collection()
+    missing: dict = {
+        "$or": [{x: None} for x in ("response_spectrum", *INTENSITY_MEASURE)]
+    }
+
+    task: UploadTask | None = None
+    if task_id is not None and (task := await UploadTask.get(task_id)) is not None:
+        task.total_size = await collection.count_documents(missing)
+        await task.save()
+
+    updated: int = 0
+    processed: int = 0
+    last_id: str | None = None
+    while True:
+        batch_filter: dict = (
+            missing if last_id is None else missing | {"_id": {"$gt": last_id}}
+        )
+        batch: list[Record] = await load_waveform(
+            await Record.find(batch_filter).sort("_id").limit(batch_size).to_list()
+        )
+        if not batch:
+            break
+
+        operations: list[UpdateOne] = [
+            UpdateOne(
+                {"_id": x.id},
+                {
+                    "$set": {
+                        k: getattr(x, k)
+                        for k in ("response_spectrum", *INTENSITY_MEASURE)
+                    }
+                },
+            )
+            # kernels release the GIL so that the event loop is not blocked
+            for x in await asyncio.to_thread(compute_features, batch)
+            if x.response_spectrum is not None
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+        updated += len(operations)
+        processed += len(batch)
+        last_id = batch[-1].id
+        if task is not None:
+            task.current_size = processed
+            await task.save()
+
+    if task is not None:
+        await task.delete()
+
+    return updated
+
+
+async def build_archive(
+    task_id: str | None = None, batch_size: int = 1000, compact: bool = False
+) -> int:
+    """
+    Bring the waveform archive up to date with records.
+
+    Only records that are new or have been parsed from a different file since the last build
+    are appended, records that no longer exist are dropped from the index.
+    With `compact`, all records are written to a new sample file to reclaim the space of stale entries.
+    Records whose samples do not fit into int32 are not archived and are served from the store.
+    Returns the number of archived records.
+    """
+    archive: WaveformArchive = WAVEFORM_ARCHIVE
+    archive.refresh()
+
+    archived: dict[str, str] = {} if compact else archive.entries()
+    current: dict[str, str] = {
+        x["_id"]: x.get("file_hash") or ""
+        async for x in Record.get_pymongo_collection().find({}, {"file_hash": 1})
+    }
+    outdated: list[str] = [k for k, v in current.items() if archived.get(k) != v]
+
+    task: UploadTask | None = None
+    if task_id is not None and (task := await UploadTask.get(task_id)) is not None:
+        task.total_size = len(outdated)
+        await task.save()
+
+    bound = np.iinfo(np.int32)
+
+    appended: int = 0
+    with archive.writer(compact) as (append, remove):
+        remove([k for k in archived if k not in current])
+
+        for i in range(0, len(outdated), batch_size):
+            for record in await load_waveform(
+                await Record.find(In(Record.id, outdated[i : i + batch_size])).to_list()
+            ):
+                try:
+                    _, samples = record.to_raw_waveform()
+                except ValueError:
+                    continue
+
+                if samples.size and (
+                    samples.min() < bound.min or samples.max() > bound.max
+                ):
+                    continue
+
+                append(record.id, current[record.id], samples)
+                appended += 1
+
+            if task is not None:
+                task.current_size = min(i + batch_size, len(outdated))
+                await task.save()
+
+    if task is not None:
+        await task.delete()
+
+    return appended
@@ -0,0 +1,100 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+from fractions import Fraction
+
+import numpy as np
+from scipy import signal
+
+# waveforms are resampled to this common sampling frequency in Hz before correlation
+CORRELATION_FREQUENCY: float = 20.0
+# waveforms are truncated to this many samples after resampling
+CORRELATION_LENGTH: int = 2**14
+# zero padding to twice the length avoids circular wrap-around
+CORRELATION_FFT_SIZE: int = 2 * CORRELATION_LENGTH
+# number of candidates transformed back together, bounds the memory of the batched inverse FFT
+CORRELATION_BATCH: int = 64
+
+
+def correlation_spectrum(interval: float, waveform: np.ndarray) -> np.ndarray:
+    """
+    Compute the spectrum used in normalised cross-correlation.
+
+    The waveform is resampled to `CORRELATION_FREQUENCY`, truncated to `CORRELATION_LENGTH`,
+    demeaned and scaled to unit energy, so that the cross-correlation of two such spectra
+    is bounded by one in magnitude.
+
+    The returned array is read-only so that it can be shared via caches.
+    """
+    ratio = Fraction(CORRELATION_FREQUENCY * interval).limit_denominator(1000)
+    resampled = signal.resample_poly(
+        np.asarray(waveform, dtype=np.float64), ratio.numerator, ratio.denominator
+    )[:CORRELATION_LENGTH]
+    resampled -= resampled.mean()
+
+    norm: float = float(np.linalg.norm(resampled))
+    if norm > 0:
+        resampled /= norm
+
+    spectrum = np.fft.rfft(resampled, CORRELATION_FFT_SIZE).astype(np.complex64)
+    spectrum.flags.writeable = False
+    return spectrum
+
+
+def correlation_spectra(
+    waveforms: list[tuple[float, np.ndarray]],
+) -> list[np.ndarray]:
+    """
+    Compute spectra of several `(interval, waveform)` pairs, see `correlation_spectrum`.
+    """
+    return [correlation_spectrum(*x) for x in waveforms]
+
+
+def cross_correlate(
+    query: np.ndarray, candidates: list[np.ndarray], max_lag: float | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the peak normalised cross-correlation between the query and each candidate.
+
+    All inputs are spectra from `correlation_spectrum`. Candidates are processed in batches,
+    each batch is transformed back to lag domain in a single inverse FFT.
+    If `max_lag` (in seconds) is given, only lags within it are considered.
+
+    Returns the peak correlations and the corresponding lags in seconds,
+    a positive lag means the candidate lags behind the query.
+    """
+    lag = np.fft.fftfreq(CORRELATION_FFT_SIZE, 1 / CORRELATION_FFT_SIZE)
+    lag /= CORRELATION_FREQUENCY
+    valid = np.ones(len(lag), dtype=bool) if max_lag is None else np.abs(lag) <= max_lag
+
+    conjugate = np.conj(query)
+    peak = np.empty(len(candidates), dtype=np.float64)
+    peak_lag = np.empty(len(candidates), dtype=np.float64)
+    for i in range(0, len(candidates), CORRELATION_BATCH):
+        correlation = np.fft.irfft(
+            np.stack(candidates[i : i + CORRELATION_BATCH]) * conjugate,
+            CORRELATION_FFT_SIZE,
+            axis=1,
+        )
+        correlation[:, ~valid] = -np.inf
+        location = np.argmax(correlation, axis=1)
+        peak[i : i + CORRELATION_BATCH] = correlation[
+            np.arange(len(location)), location
+        ]
+        peak_lag[i : i + CORRELATION_BATCH] = lag[location]
+
+    return peak, peak_lag
@@ -0,0 +1,128 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+from numba import float64, int64, njit, prange, types
+
+from .response_spectrum import _newmark, _remove_linear_trend
+
+GRAVITY: float = 980.665  # cm/s/s
+
+INTENSITY_MEASURE: tuple[str, ...] = (
+    "maximum_velocity",
+    "maximum_displacement",
+    "arias_intensity",
+    "cumulative_absolute_velocity",
+    "significant_duration",
+)
+
+
+@njit(cache=True)
+def _crossing_time(interval: float, cumulative: np.ndarray, target: float) -> float:
+    i: int = np.searchsorted(cumulative, target)
+    if i == 0:
+        return 0.0
+    if i >= len(cumulative):
+        return interval * (len(cumulative) - 1)
+    gap: float = cumulative[i] - cumulative[i - 1]
+    fraction: float = (target - cumulative[i - 1]) / gap if gap > 0 else 0.0
+    return interval * (i - 1 + fraction)
+
+
+@njit(cache=True)
+def _intensity_measure(interval: float, acceleration: np.ndarray) -> np.ndarray:
+    result = np.zeros(len(INTENSITY_MEASURE), dtype=np.float64)
+
+    size: int = len(acceleration)
+    if size < 2:
+        return result
+
+    displacement = np.empty(size, dtype=np.float64)
+    velocity = np.empty(size, dtype=np.float64)
+    _newmark(0.5, 0.25, interval, acceleration, displacement, velocity)
+    _remove_linear_trend(interval, displacement, velocity)
+
+    # trapezoidal rule for both arias intensity and cav
+    arias = np.zeros(size, dtype=np.float64)
+    cav: float = 0.0
+    for i in range(1, size):
+        a0 = acceleration[i - 1]
+        a1 = acceleration[i]
+        arias[i] = arias[i - 1] + 0.5 * interval * (a0 * a0 + a1 * a1)
+        cav += 0.5 * interval * (abs(a0) + abs(a1))
+
+    result[0] = np.max(np.abs(velocity))
+    result[1] = np.max(np.abs(displacement))
+    # cm/s/s -> m/s
+    result[2] = 0.01 * np.pi / (2 * GRAVITY) * arias[-1]
+    result[3] = cav
+    if arias[-1] > 0:
+        result[4] = _crossing_time(interval, arias, 0.95 * arias[-1]) - _crossing_time(
+            interval, arias, 0.05 * arias[-1]
+        )
+
+    return result
+
+
+@njit(
+    (float64[:], types.Array(float64, 1, "C", readonly=True), int64[:]),
+    parallel=True,
+    nogil=True,
+    cache=True,
+)
+def _batch_intensity_measure(
+    interval: np.ndarray, motion: np.ndarray, offset: np.ndarray
+) -> np.ndarray:
+    result = np.empty((len(offset) - 1, len(INTENSITY_MEASURE)), dtype=np.float64)
+    for i in prange(len(offset) - 1):
+        result[i] = _intensity_measure(interval[i], motion[offset[i] : offset[i + 1]])
+
+    return result
+
+
+def batch_intensity_measure(
+    interval: np.ndarray, motion: np.ndarray, offset: np.ndarray
+) -> np.ndarray:
+    """
+    Compute intensity measures of many acceleration records in one parallel launch.
+
+    The records are packed in the same layout as in `batch_response_spectrum` and shall be in cm/s/s.
+    The columns of the result follow `INTENSITY_MEASURE`:
+
+    1. PGV in cm/s,
+    2. PGD in cm,
+    3. Arias intensity in m/s,
+    4. cumulative absolute velocity in cm/s,
+    5. significant duration D5-95 in seconds.
+
+    PGV and PGD are obtained via Newmark integration with linear baseline correction of velocity.
+    """
+    return _batch_intensity_measure(
+        np.asarray(interval, dtype=np.float64), motion, offset
+    )
+
+
+def intensity_measure(interval: float, acceleration: np.ndarray) -> dict[str, float]:
+    """
+    Compute intensity measures of one acceleration record in cm/s/s.
+
+    See `batch_intensity_measure`.
+    """
+    result = batch_intensity_measure(
+        np.array([interval]),
+        np.ascontiguousarray(acceleration, dtype=np.float64),
+        np.array([0, len(acceleration)], dtype=np.int64),
+    )[0]
+    return dict(zip(INTENSITY_MEASURE, result.tolist(), strict=True))
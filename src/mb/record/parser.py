@@ -31,7 +31,7 @@ import structlog
 import tzdata  # noqa
 
 from ..utility import UPath
-from .async_record import NIED, NZSM, UploadTask
+from .async_record import NIED, NZSM, RecordWriter, UploadTask
 from .base_parser import BaseParserNIED, BaseParserNZSM
 
 _logger = structlog.get_logger(__name__)
@@ -70,7 +70,7 @@ class ParserNIED(BaseParserNIED):
         task: UploadTask | None,
         category: str,
         user_id: str,
-        overwrite_existing: bool,
+        writer: RecordWriter,
         current_depth: int,
     ):
         if task:
@@ -81,7 +81,6 @@ class ParserNIED(BaseParserNIED):
         for f in archive:
             if task:
                 task.current_size += 1
-                await task.save()
 
             if (
                 not f.isfile()
@@ -97,19 +96,18 @@ class ParserNIED(BaseParserNIED):
                         task,
                         category,
                         user_id,
-                        overwrite_existing,
+                        writer,
                         current_depth + 1,
                     )
                 )
                 continue
 
             try:
-                record = await ParserNIED.parse_file(target, overwrite_existing)
+                record = await ParserNIED.parse_file(target)
                 record.uploaded_by = user_id
                 record.file_name = os.path.basename(f.name)
                 record.category = category
-                await record.save()
-                records.append(record)
+                records.append(await writer.add(record))
             except Exception as e:
                 _logger.critical("Failed to parse.", file_name=f.name, exc_info=e)
 
@@ -121,7 +119,7 @@ class ParserNIED(BaseParserNIED):
         task: UploadTask | None,
         category: str,
         user_id: str,
-        overwrite_existing: bool,
+        writer: RecordWriter,
         current_depth: int = 0,
     ):
         records: list[NIED] = []
@@ -132,7 +130,7 @@ class ParserNIED(BaseParserNIED):
         try:
             with tarfile.open(None, "r:gz", fo) as archive:
                 records = await ParserNIED._parse_tar(
-                    archive, task, category, user_id, overwrite_existing, current_depth
+                    archive, task, category, user_id, writer, current_depth
                 )
         except tarfile.ReadError as e:
             _logger.critical("Failed to open the archive.", exc_info=e)
@@ -169,20 +167,22 @@ class ParserNIED(BaseParserNIED):
             if isinstance(archive_obj, UPath):
                 task.archive_path = archive_obj.as_posix()
 
-        with _proxy(archive_obj) as fo:
-            records = await ParserNIED._parse_archive(
-                fo, task, category, user_id, overwrite_existing
-            )
+        async with RecordWriter(overwrite_existing, task) as writer:
+            with _proxy(archive_obj) as fo:
+                records = await ParserNIED._parse_archive(
+                    fo, task, category, user_id, writer
+                )
 
         if task:
             await task.delete()
 
-        return records
+        return writer.written(records)
 
     @staticmethod
-    async def parse_file(
-        file_path: str | IO[bytes], overwrite_existing: bool = True
-    ) -> NIED:
+    async def parse_file(file_path: str | IO[bytes]) -> NIED:
+        """
+        Parse a single file, the record is not written, see `RecordWriter`.
+        """
         if isinstance(file_path, str):
             with open(file_path, encoding="utf-8") as f:
                 lines = f.readlines()
@@ -192,10 +192,6 @@ class ParserNIED(BaseParserNIED):
             lines = [line.decode("utf-8").strip() for line in file_path.readlines()]
 
         file_hash = hashlib.sha256("".join(lines).encode("utf-8")).hexdigest()
-        if overwrite_existing and (
-            record := await NIED.find_one(NIED.file_hash == file_hash)
-        ):
-            await record.delete()
 
         def _parse_date(string: str) -> datetime:
             return datetime.strptime(string, "%Y/%m/%d %H:%M:%S").replace(
@@ -255,7 +251,7 @@ class ParserNZSM(BaseParserNZSM):
         archive: zipfile.ZipFile,
         task: UploadTask | None,
         user_id: str,
-        overwrite_existing: bool,
+        writer: RecordWriter,
         current_depth: int,
     ):
         if task:
@@ -266,7 +262,6 @@ class ParserNZSM(BaseParserNZSM):
         for f in archive.namelist():
             if task:
                 task.current_size += 1
-                await task.save()
 
             is_zip, is_tar, is_archive = ParserNZSM._flags(f)
 
@@ -281,7 +276,7 @@ class ParserNZSM(BaseParserNZSM):
                             target,
                             task,
                             user_id,
-                            overwrite_existing,
+                            writer,
                             current_depth + 1,
                         )
                     )
@@ -289,7 +284,7 @@ class ParserNZSM(BaseParserNZSM):
                     try:
                         records.extend(
                             await ParserNZSM.parse_file(
-                                target, user_id, os.path.basename(f), overwrite_existing
+                                target, user_id, os.path.basename(f), writer
                             )
                         )
                     except Exception as e:
@@ -302,7 +297,7 @@ class ParserNZSM(BaseParserNZSM):
         archive: tarfile.TarFile,
         task: UploadTask | None,
         user_id: str,
-        overwrite_existing: bool,
+        writer: RecordWriter,
         current_depth: int,
     ):
         if task:
@@ -313,7 +308,6 @@ class ParserNZSM(BaseParserNZSM):
         for f in archive:
             if task:
                 task.current_size += 1
-                await task.save()
 
             is_zip, is_tar, is_archive = ParserNZSM._flags(f.name)
 
@@ -331,7 +325,7 @@ class ParserNZSM(BaseParserNZSM):
                         target,
                         task,
                         user_id,
-                        overwrite_existing,
+                        writer,
                         current_depth + 1,
                     )
                 )
@@ -340,7 +334,7 @@ class ParserNZSM(BaseParserNZSM):
             try:
                 records.extend(
                     await ParserNZSM.parse_file(
-                        target, user_id, os.path.basename(f.name), overwrite_existing
+                        target, user_id, os.path.basename(f.name), writer
                     )
                 )
             except Exception as e:
@@ -354,7 +348,7 @@ class ParserNZSM(BaseParserNZSM):
         fo: IO[bytes],
         task: UploadTask | None,
         user_id: str,
-        overwrite_existing: bool,
+        writer: RecordWriter,
         current_depth: int = 0,
     ):
         records: list[NZSM] = []
@@ -366,7 +360,7 @@ class ParserNZSM(BaseParserNZSM):
             try:
                 with tarfile.open(None, "r:gz", fo) as archive:
                     records = await ParserNZSM._parse_tar(
-                        archive, task, user_id, overwrite_existing, current_depth
+                        archive, task, user_id, writer, current_depth
                     )
             except tarfile.ReadError as e:
                 _logger.critical("Failed to open the archive.", exc_info=e)
@@ -374,7 +368,7 @@ class ParserNZSM(BaseParserNZSM):
             try:
                 with zipfile.ZipFile(fo) as archive:
                     records = await ParserNZSM._parse_zip(
-                        archive, task, user_id, overwrite_existing, current_depth
+                        archive, task, user_id, writer, current_depth
                     )
             except zipfile.BadZipFile as e:
                 _logger.critical("Failed to open the archive.", exc_info=e)
@@ -405,27 +399,40 @@ class ParserNZSM(BaseParserNZSM):
                 task.archive_path = archive_obj.as_posix()
             task.pid = os.getpid()
 
-        with _proxy(archive_obj) as fo:
-            records: list[NZSM] = await ParserNZSM._parse_archive(
-                "tar" if name_string.endswith(".tar.gz") else "zip",
-                fo,
-                task,
-                user_id,
-                overwrite_existing,
-            )
+        async with RecordWriter(overwrite_existing, task) as writer:
+            with _proxy(archive_obj) as fo:
+                records: list[NZSM] = await ParserNZSM._parse_archive(
+                    "tar" if name_string.endswith(".tar.gz") else "zip",
+                    fo,
+                    task,
+                    user_id,
+                    writer,
+                )
 
         if task:
             await task.delete()
 
-        return records
+        return writer.written(records)
 
     @staticmethod
     async def parse_file(
         file_path: str | IO[bytes],
         user_id: str,
         file_name: str | None = None,
-        overwrite_existing: bool = True,
+        writer: RecordWriter | None = None,
     ) -> list[NZSM]:
+        """
+        Parse a single file which may contain several components.
+
+        Records are written by the given writer, or a new one writing them before returning.
+        """
+        if writer is None:
+            async with RecordWriter() as writer:
+                records = await ParserNZSM.parse_file(
+                    file_path, user_id, file_name, writer
+                )
+            return writer.written(records)
+
         if isinstance(file_path, str):
             with open(file_path, encoding="utf-8") as f:
                 lines = f.readlines()
@@ -458,8 +465,7 @@ class ParserNZSM(BaseParserNZSM):
             )
             if last_update_time is not None:
                 record.last_update_time = last_update_time
-            await record.save()
-            return record
+            return await writer.add(record)
 
         int_header = ParserNZSM._parse_header(lines)[0]
         a_lines = (int_header[33] + 9) // 10
@@ -467,18 +473,16 @@ class ParserNZSM(BaseParserNZSM):
         d_lines = (int_header[35] + 9) // 10
 
         if (target_lines := a_lines + v_lines + d_lines + 26) == len(lines):
-            tasks = [ParserNZSM.parse_lines(lines, overwrite_existing)]
+            tasks = [ParserNZSM.parse_lines(lines)]
         else:
             assert 3 * target_lines == len(lines), (
                 "Number of lines should be a multiple of 3."
             )
 
             tasks = [
-                ParserNZSM.parse_lines(lines[:target_lines], overwrite_existing),
-                ParserNZSM.parse_lines(
-                    lines[target_lines : 2 * target_lines], overwrite_existing
-                ),
-                ParserNZSM.parse_lines(lines[2 * target_lines :], overwrite_existing),
+                ParserNZSM.parse_lines(lines[:target_lines]),
+                ParserNZSM.parse_lines(lines[target_lines : 2 * target_lines]),
+                ParserNZSM.parse_lines(lines[2 * target_lines :]),
             ]
 
         records.extend(
@@ -488,17 +492,13 @@ class ParserNZSM(BaseParserNZSM):
         return records
 
     @staticmethod
-    async def parse_lines(lines: list[str], overwrite_existing: bool = True) -> NZSM:
+    async def parse_lines(lines: list[str]) -> NZSM:
         """
         Parse file according to the format shown in the following link.
 
         https://www.geonet.org.nz/data/supplementary/strong_motion_file_formats
         """
         file_hash = hashlib.sha256("".join(lines).encode("utf-8")).hexdigest()
-        if overwrite_existing and (
-            record := await NZSM.find_one(NZSM.file_hash == file_hash)
-        ):
-            await record.delete()
 
         record = NZSM()
 
@@ -14,9 +14,49 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import numpy as np
-from numba import float64, njit, prange
+from numba import boolean, float32, float64, int64, njit, prange, types
 from numba.experimental import jitclass
 
+from ..utility.cache import LRUCache
+
+
+@njit(cache=True)
+def _peak_response(
+    a: float, b: float, c: float, gamma: float, interval: float, motion: np.ndarray
+) -> tuple:
+    # same recurrence as in Oscillator.populate, but only the running maxima are kept
+    # so that no response history needs to be allocated
+    factor: float = gamma * a
+
+    current: float = 0.0
+    previous: float = 0.0
+    velocity: float = 0.0
+
+    max_displacement: float = 0.0
+    max_velocity: float = 0.0
+    max_acceleration: float = abs(motion[0])
+
+    for i in range(1, len(motion)):
+        new_displacement = b * current - c * previous - motion[i - 1]
+        new_velocity = new_displacement - current
+        new_acceleration = new_velocity - velocity
+
+        max_displacement = max(max_displacement, abs(new_displacement))
+        max_velocity = max(max_velocity, abs(new_velocity))
+        max_acceleration = max(
+            max_acceleration, abs(new_acceleration * factor / interval + motion[i])
+        )
+
+        previous = current
+        current = new_displacement
+        velocity = new_velocity
+
+    return (
+        max_displacement * factor * interval,
+        max_velocity * factor,
+        max_acceleration,
+    )
+
 
 @jitclass(
     [
@@ -91,42 +131,720 @@ class Oscillator:
     def compute_maximum_response(self, interval: float, motion: np.ndarray) -> tuple:
         self.compute_parameter(interval)
 
-        displacement, velocity, acceleration = self.populate(motion)
+        return _peak_response(self.a, self.b, self.c, self.gamma, interval, motion)
+
+
+COEFFICIENT_CACHE = LRUCache("oscillator_coefficient", 64)
+
+
+@njit((float64[:], float64, float64[:]), cache=True)
+def _compute_coefficient(
+    damping_ratio: np.ndarray, interval: float, period: np.ndarray
+) -> np.ndarray:
+    table = np.zeros((len(damping_ratio), len(period), 4), dtype=np.float64)
+    for i in range(len(damping_ratio)):
+        for j in range(len(period)):
+            if period[j] == 0.0:
+                continue
+            oscillator = Oscillator(2 * np.pi / period[j], damping_ratio[i])
+            oscillator.compute_parameter(interval)
+            table[i, j, 0] = oscillator.a
+            table[i, j, 1] = oscillator.b
+            table[i, j, 2] = oscillator.c
+            table[i, j, 3] = oscillator.gamma
+
+    return table
+
+
+def oscillator_coefficient(
+    damping_ratio: np.ndarray, interval: float, period: np.ndarray
+) -> np.ndarray:
+    """
+    Return the oscillator coefficients `(a, b, c, gamma)` of shape `(len(damping_ratio), len(period), 4)`.
+
+    The tables are cached by the sampling interval, the damping ratios and the period grid.
+    The returned array is read-only as it is shared among callers.
+    """
+    damping_ratio = np.ascontiguousarray(damping_ratio, dtype=np.float64)
+    period = np.ascontiguousarray(period, dtype=np.float64)
+
+    def _compute():
+        table = _compute_coefficient(damping_ratio, interval, period)
+        table.flags.writeable = False
+        return table
+
+    return COEFFICIENT_CACHE.get_or_create(
+        (float(interval), damping_ratio.tobytes(), period.tobytes()), _compute
+    )
+
+
+@njit(cache=True)
+def _multi_damping_response(
+    coefficient: np.ndarray, interval: float, motion: np.ndarray
+) -> np.ndarray:
+    # advance the oscillators of all damping ratios together
+    # so that the motion is traversed only once for the given frequency
+    size: int = coefficient.shape[0]
+
+    peak = np.zeros((size, 3), dtype=np.float64)
 
-        return (
-            self.amplitude(displacement) * self.factor * interval,
-            self.amplitude(velocity) * self.factor,
-            self.amplitude(acceleration * self.factor / interval + motion),
+    if size == 1:
+        # scalar states are kept in registers, which is faster for a single oscillator
+        peak[0, 0], peak[0, 1], peak[0, 2] = _peak_response(
+            coefficient[0, 0],
+            coefficient[0, 1],
+            coefficient[0, 2],
+            coefficient[0, 3],
+            interval,
+            motion,
         )
+        return peak
+
+    b = coefficient[:, 1]
+    c = coefficient[:, 2]
+    factor = np.empty(size, dtype=np.float64)
+    for j in range(size):
+        factor[j] = coefficient[j, 3] * coefficient[j, 0]
+
+    current = np.zeros(size, dtype=np.float64)
+    previous = np.zeros(size, dtype=np.float64)
+    velocity = np.zeros(size, dtype=np.float64)
+
+    peak[:, 2] = abs(motion[0])
+
+    for i in range(1, len(motion)):
+        for j in range(size):
+            new_displacement = b[j] * current[j] - c[j] * previous[j] - motion[i - 1]
+            new_velocity = new_displacement - current[j]
+            new_acceleration = new_velocity - velocity[j]
+
+            peak[j, 0] = max(peak[j, 0], abs(new_displacement))
+            peak[j, 1] = max(peak[j, 1], abs(new_velocity))
+            peak[j, 2] = max(
+                peak[j, 2],
+                abs(new_acceleration * factor[j] / interval + motion[i]),
+            )
+
+            previous[j] = current[j]
+            current[j] = new_displacement
+            velocity[j] = new_velocity
+
+    for j in range(size):
+        peak[j, 0] = peak[j, 0] * factor[j] * interval
+        peak[j, 1] = peak[j, 1] * factor[j]
+
+    return peak
+
+
+@njit(
+    [
+        (types.Array(float64, 3, "C", readonly=True), float64, float64[:], float64[:]),
+        (types.Array(float64, 3, "C", readonly=True), float64, float32[:], float64[:]),
+    ],
+    parallel=True,
+    cache=True,
+)
+def _response_spectra(
+    coefficient: np.ndarray, interval: float, motion: np.ndarray, period: np.ndarray
+) -> np.ndarray:
+    results = np.empty((coefficient.shape[0], len(period), 3), dtype=np.float64)
+    peak_acceleration: float = np.max(np.abs(motion))
+    for i in prange(len(period)):
+        if period[i] == 0.0:
+            results[:, i, 0] = 0
+            results[:, i, 1] = 0
+            results[:, i, 2] = peak_acceleration
+        else:
+            results[:, i, :] = _multi_damping_response(
+                coefficient[:, i, :], interval, motion
+            )
+
+    return results
+
+
+def response_spectra(
+    damping_ratio: np.ndarray, interval: float, motion: np.ndarray, period: np.ndarray
+) -> np.ndarray:
+    """
+    Compute response spectra of several damping ratios in a single parallel launch.
+
+    The result is of shape `(len(damping_ratio), len(period), 3)`, the last axis holds
+    the displacement, velocity and acceleration spectra, respectively.
+    """
+    return _response_spectra(
+        oscillator_coefficient(damping_ratio, interval, period),
+        interval,
+        motion,
+        period,
+    )
 
 
-@njit((float64, float64, float64[:], float64[:]), parallel=True)
 def response_spectrum(
     damping_ratio: float, interval: float, motion: np.ndarray, period: np.ndarray
 ) -> np.ndarray:
-    results = np.empty((len(period), 3), dtype=np.float64)
-    if period[0] == 0.0:
-        results[0, 0] = 0
-        results[0, 1] = 0
-        results[0, 2] = np.max(np.abs(motion))
-        new_period = period.copy()
-        new_period[0] = 1e-6
-        frequency = 2 * np.pi / new_period
-        for i in prange(1, len(period)):
-            results[i] = Oscillator(
-                frequency[i], damping_ratio
-            ).compute_maximum_response(interval, motion)
-    else:
-        frequency = 2 * np.pi / period
-        for i in prange(0, len(period)):
-            results[i] = Oscillator(
-                frequency[i], damping_ratio
-            ).compute_maximum_response(interval, motion)
+    return response_spectra(np.array([damping_ratio]), interval, motion, period)[0]
+
+
+def log_period(start: float, end: float, size: int) -> np.ndarray:
+    """
+    Return `size` logarithmically spaced periods from `start` to `end`, both inclusive.
+    """
+    return np.geomspace(start, end, size)
+
+
+def adaptive_response_spectra(
+    damping_ratio: np.ndarray,
+    interval: float,
+    motion: np.ndarray,
+    period: np.ndarray,
+    tolerance: float = 1e-2,
+    max_size: int = 1000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute response spectra on a grid refined where the spectra change quickly.
+
+    Starting from the given (coarse) grid, each interval is bisected, in log scale if possible.
+    If the spectra at the new period deviate from the interpolation between both ends
+    by more than `tolerance` (relative), both halves are bisected again in the next pass.
+    Each pass evaluates all new periods in one parallel call.
+    Refinement stops when all intervals converge or the grid reaches `max_size` periods,
+    in which case intervals with larger deviations are refined first.
+
+    Returns the sorted periods and the spectra of shape `(len(damping_ratio), len(period), 3)`.
+    """
+    damping_ratio = np.asarray(damping_ratio, dtype=np.float64)
+    period = np.unique(np.asarray(period, dtype=np.float64))
+    spectra = response_spectra(damping_ratio, interval, motion, period)
+
+    # deviations of the intervals to be bisected, which are unknown at the beginning
+    left, right = period[:-1], period[1:]
+    deviation = np.full(len(left), np.inf)
+    while len(left) > 0 and len(period) < max_size:
+        order = np.argsort(-deviation, kind="stable")[: max_size - len(period)]
+        left, right = left[order], right[order]
+
+        middle = np.where(left > 0, np.sqrt(left * right), 0.5 * (left + right))
+        new_spectra = response_spectra(damping_ratio, interval, motion, middle)
+
+        # the interpolation is linear in log period, thus half way between both ends
+        location = np.searchsorted(period, left)
+        expected = 0.5 * (spectra[:, location] + spectra[:, location + 1])
+        scale = np.max(np.abs(spectra), axis=1, keepdims=True)
+        error = np.abs(new_spectra - expected) / (np.abs(new_spectra) + 1e-3 * scale)
+        error = np.max(error, axis=(0, 2))
+
+        period = np.concatenate((period, middle))
+        spectra = np.concatenate((spectra, new_spectra), axis=1)
+        order = np.argsort(period, kind="stable")
+        period, spectra = period[order], spectra[:, order]
+
+        active = error > tolerance
+        left = np.concatenate((left[active], middle[active]))
+        right = np.concatenate((middle[active], right[active]))
+        deviation = np.tile(error[active], 2)
+
+    return period, spectra
+
+
+@njit(
+    [
+        (float64[:, :, :, :], int64[:], float64[:], float64[:], int64[:], float64[:]),
+        (float64[:, :, :, :], int64[:], float64[:], float32[:], int64[:], float64[:]),
+    ],
+    parallel=True,
+    nogil=True,
+    cache=True,
+)
+def _batch_response_spectrum(
+    coefficient: np.ndarray,
+    table_index: np.ndarray,
+    interval: np.ndarray,
+    motion: np.ndarray,
+    offset: np.ndarray,
+    period: np.ndarray,
+) -> np.ndarray:
+    record_size: int = len(offset) - 1
+    period_size: int = len(period)
+    results = np.empty(
+        (record_size, coefficient.shape[1], period_size, 3), dtype=np.float64
+    )
+    for k in prange(record_size * period_size):
+        i = k // period_size
+        j = k % period_size
+        record = motion[offset[i] : offset[i + 1]]
+        if period[j] == 0.0:
+            results[i, :, j, 0] = 0
+            results[i, :, j, 1] = 0
+            results[i, :, j, 2] = np.max(np.abs(record))
+        else:
+            results[i, :, j, :] = _multi_damping_response(
+                coefficient[table_index[i], :, j, :], interval[i], record
+            )
 
     return results
 
 
-@njit((float64, float64, float64, float64[:]))
+def batch_response_spectrum(
+    damping_ratio: np.ndarray,
+    interval: np.ndarray,
+    motion: np.ndarray,
+    offset: np.ndarray,
+    period: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute response spectra of many records in one parallel launch.
+
+    The records are packed into `motion` back to back, the i-th record spans
+    `motion[offset[i] : offset[i + 1]]` and is sampled at `interval[i]`.
+    The work is distributed over records and periods jointly.
+
+    The result is of shape `(len(offset) - 1, len(damping_ratio), len(period), 3)`.
+    """
+    unique_interval, table_index = np.unique(interval, return_inverse=True)
+    coefficient = np.stack(
+        [oscillator_coefficient(damping_ratio, x, period) for x in unique_interval]
+    )
+    return _batch_response_spectrum(
+        coefficient,
+        table_index.astype(np.int64),
+        np.asarray(interval, dtype=np.float64),
+        motion,
+        offset,
+        period,
+    )
+
+
+@njit(cache=True)
+def _rotated_peak(history: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+    # equivalent to np.max(np.abs(history @ rotation), axis=0)
+    # the rank-two product is fused with the reduction so that the
+    # (len(history), len(angle)) product is never materialised
+    cosine = rotation[0]
+    sine = rotation[1]
+    peak = np.zeros(rotation.shape[1], dtype=np.float64)
+    for i in range(history.shape[0]):
+        first = history[i, 0]
+        second = history[i, 1]
+        for k in range(rotation.shape[1]):
+            peak[k] = max(peak[k], abs(cosine[k] * first + sine[k] * second))
+
+    return peak
+
+
+@njit(
+    (
+        types.Array(float64, 2, "C", readonly=True),
+        float64,
+        types.Array(float64, 2, "C"),
+        types.Array(float64, 2, "C"),
+        float64[:],
+    ),
+    parallel=True,
+    cache=True,
+)
+def _rotated_spectrum(
+    coefficient: np.ndarray,
+    interval: float,
+    motion: np.ndarray,
+    rotation: np.ndarray,
+    period: np.ndarray,
+) -> np.ndarray:
+    result = np.empty((len(period), rotation.shape[1]), dtype=np.float64)
+    for j in prange(len(period)):
+        if period[j] == 0.0:
+            result[j] = _rotated_peak(motion, rotation)
+            continue
+
+        a, b, c, gamma = coefficient[j]
+        # displacement histories of both components, same recurrence as in Oscillator.populate
+        history = np.zeros_like(motion)
+        for i in range(1, motion.shape[0]):
+            for m in range(2):
+                history[i, m] = b * history[i - 1, m] - motion[i - 1, m]
+                if i > 1:
+                    history[i, m] -= c * history[i - 2, m]
+
+        omega: float = 2 * np.pi / period[j]
+        result[j] = _rotated_peak(history, rotation) * (gamma * a * interval * omega**2)
+
+    return result
+
+
+def rotated_spectrum(
+    damping_ratio: float,
+    interval: float,
+    first: np.ndarray,
+    second: np.ndarray,
+    period: np.ndarray,
+    angle_step: float = 1.0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute pseudo-spectral accelerations of two orthogonal horizontal components
+    rotated over all non-redundant angles in `[0, 180)` degrees.
+
+    The oscillator is linear, thus the response of the rotated motion is the rotation of the responses.
+    For each period, displacement histories of both components are computed once,
+    all angles are then obtained by multiplying the `(n, 2)` histories with the `(2, len(angle))`
+    rotation matrix, the product is reduced to peaks on the fly.
+
+    Returns the angles in degrees and the peak responses of shape `(len(period), len(angle))`.
+    At zero period, the peak rotated ground acceleration is returned.
+    """
+    size: int = min(len(first), len(second))
+    motion = np.column_stack((first[:size], second[:size])).astype(np.float64)
+
+    angle = np.arange(0, 180, angle_step, dtype=np.float64)
+    radian = np.deg2rad(angle)
+    rotation = np.ascontiguousarray(np.vstack((np.cos(radian), np.sin(radian))))
+
+    return angle, _rotated_spectrum(
+        oscillator_coefficient(np.array([damping_ratio]), interval, period)[0],
+        interval,
+        motion,
+        rotation,
+        period,
+    )
+
+
+def rotd_spectrum(
+    damping_ratio: float,
+    interval: float,
+    first: np.ndarray,
+    second: np.ndarray,
+    period: np.ndarray,
+    percentile: tuple[float, ...] = (50, 100),
+    angle_step: float = 1.0,
+) -> np.ndarray:
+    """
+    Compute orientation-independent RotDnn spectra, by default RotD50 and RotD100.
+
+    The result is of shape `(len(period), len(percentile))`.
+    """
+    _, peak = rotated_spectrum(
+        damping_ratio, interval, first, second, period, angle_step
+    )
+    return np.percentile(peak, percentile, axis=1).T
+
+
+# relative tolerance on the normalised yield strength in bisection
+STRENGTH_TOLERANCE: float = 1e-3
+
+
+@njit(cache=True)
+def _bilinear_peak(
+    omega: float,
+    zeta: float,
+    hardening_ratio: float,
+    yield_strength: float,
+    interval: float,
+    motion: np.ndarray,
+) -> float:
+    """
+    Peak displacement of a unit mass bilinear oscillator with kinematic hardening.
+
+    The average acceleration Newmark method is used, the restoring force is
+    return-mapped onto the bilinear envelope in each Newton iteration.
+    """
+    stiffness: float = omega**2
+    damping: float = 2 * zeta * omega
+
+    a0: float = 4 / interval**2
+    a1: float = 2 / interval
+    a2: float = 4 / interval
+    effective: float = a0 + a1 * damping
+
+    displacement: float = 0.0
+    velocity: float = 0.0
+    acceleration: float = -motion[0]
+    force: float = 0.0
+    tangent: float = stiffness
+
+    peak: float = 0.0
+    for i in range(1, len(motion)):
+        load = (
+            -motion[i]
+            + a0 * displacement
+            + a2 * velocity
+            + acceleration
+            + damping * (a1 * displacement + velocity)
+        )
+
+        new_displacement = displacement
+        new_force = force
+        for _ in range(20):
+            trial = force + stiffness * (new_displacement - displacement)
+            offset = hardening_ratio * stiffness * new_displacement
+            upper = (1 - hardening_ratio) * yield_strength + offset
+            lower = -(1 - hardening_ratio) * yield_strength + offset
+            if trial > upper:
+                new_force = upper
+                tangent = hardening_ratio * stiffness
+            elif trial < lower:
+                new_force = lower
+                tangent = hardening_ratio * stiffness
+            else:
+                new_force = trial
+                tangent = stiffness
+
+            residual = load - new_force - effective * new_displacement
+            if abs(residual) <= 1e-12 * (abs(load) + abs(new_force)):
+                break
+            new_displacement += residual / (tangent + effective)
+
+        increment = new_displacement - displacement
+        new_velocity = a1 * increment - velocity
+        acceleration = a0 * increment - a2 * velocity - acceleration
+
+        displacement = new_displacement
+        velocity = new_velocity
+        force = new_force
+        peak = max(peak, abs(displacement))
+
+    return peak
+
+
+@njit(cache=True)
+def _ductility(
+    omega: float,
+    zeta: float,
+    hardening_ratio: float,
+    yield_strength: float,
+    interval: float,
+    motion: np.ndarray,
+) -> float:
+    return (
+        _bilinear_peak(omega, zeta, hardening_ratio, yield_strength, interval, motion)
+        * omega**2
+        / yield_strength
+    )
+
+
+@njit(cache=True)
+def _strength_ratio(
+    omega: float,
+    zeta: float,
+    hardening_ratio: float,
+    elastic_strength: float,
+    interval: float,
+    motion: np.ndarray,
+    target: float,
+) -> float:
+    """
+    Ratio of the yield strength reaching the target ductility to the elastic strength demand.
+
+    The bisection is warm-started with the Newmark-Hall estimate of the strength reduction factor,
+    the bracket is grown from the estimate by halving or doubling until it encloses the solution.
+    """
+    if target <= 1.0:
+        return 1.0
+
+    # equal displacement for long periods and equal energy for short ones
+    guess: float = 1 / (target if omega < 4 * np.pi else np.sqrt(2 * target - 1))
+
+    upper: float = guess
+    lower: float = guess
+    if (
+        _ductility(
+            omega, zeta, hardening_ratio, guess * elastic_strength, interval, motion
+        )
+        < target
+    ):
+        # too strong, the solution is below the guess
+        lower = 0.5 * guess
+        while (
+            _ductility(
+                omega, zeta, hardening_ratio, lower * elastic_strength, interval, motion
+            )
+            < target
+            and lower > 1e-6
+        ):
+            upper = lower
+            lower *= 0.5
+    else:
+        upper = min(1.0, 2 * guess)
+        while (
+            upper < 1.0
+            and _ductility(
+                omega, zeta, hardening_ratio, upper * elastic_strength, interval, motion
+            )
+            >= target
+        ):
+            lower = upper
+            upper = min(1.0, 2 * upper)
+
+    while upper - lower > STRENGTH_TOLERANCE * upper:
+        middle = 0.5 * (lower + upper)
+        if (
+            _ductility(
+                omega,
+                zeta,
+                hardening_ratio,
+                middle * elastic_strength,
+                interval,
+                motion,
+            )
+            < target
+        ):
+            upper = middle
+        else:
+            lower = middle
+
+    return 0.5 * (lower + upper)
+
+
+@njit(
+    (float64, float64, float64, float64[:], float64[:], float64[:]),
+    parallel=True,
+    cache=True,
+)
+def _constant_ductility_spectrum(
+    damping_ratio: float,
+    hardening_ratio: float,
+    interval: float,
+    motion: np.ndarray,
+    period: np.ndarray,
+    ductility: np.ndarray,
+) -> np.ndarray:
+    period_size: int = len(period)
+    elastic_strength = np.zeros(period_size, dtype=np.float64)
+    for j in prange(period_size):
+        if period[j] != 0.0:
+            omega = 2 * np.pi / period[j]
+            elastic_strength[j] = omega**2 * _bilinear_peak(
+                omega, damping_ratio, hardening_ratio, np.inf, interval, motion
+            )
+
+    peak_acceleration: float = np.max(np.abs(motion)) if len(motion) > 0 else 0.0
+
+    # each pair is solved independently so that the work is distributed over both axes
+    result = np.zeros((len(ductility), period_size, 3), dtype=np.float64)
+    for n in prange(len(ductility) * period_size):
+        k = n // period_size
+        j = n % period_size
+        if period[j] == 0.0:
+            result[k, j, 0] = peak_acceleration
+            result[k, j, 1] = 1.0
+            continue
+        if elastic_strength[j] == 0.0:
+            continue
+
+        omega = 2 * np.pi / period[j]
+        ratio = _strength_ratio(
+            omega,
+            damping_ratio,
+            hardening_ratio,
+            elastic_strength[j],
+            interval,
+            motion,
+            ductility[k],
+        )
+        strength = ratio * elastic_strength[j]
+        result[k, j, 0] = strength
+        result[k, j, 1] = 1 / ratio
+        result[k, j, 2] = _bilinear_peak(
+            omega, damping_ratio, hardening_ratio, strength, interval, motion
+        )
+
+    return result
+
+
+@njit(
+    (float64, float64, float64, float64[:], float64[:], float64[:]),
+    parallel=True,
+    cache=True,
+)
+def _constant_strength_spectrum(
+    damping_ratio: float,
+    hardening_ratio: float,
+    interval: float,
+    motion: np.ndarray,
+    period: np.ndarray,
+    reduction_factor: np.ndarray,
+) -> np.ndarray:
+    result = np.zeros((len(reduction_factor), len(period), 2), dtype=np.float64)
+    for j in prange(len(period)):
+        if period[j] == 0.0:
+            result[:, j, 0] = 1.0
+            continue
+
+        omega: float = 2 * np.pi / period[j]
+        stiffness: float = omega**2
+        elastic_strength: float = stiffness * _bilinear_peak(
+            omega, damping_ratio, hardening_ratio, np.inf, interval, motion
+        )
+        if elastic_strength == 0.0:
+            continue
+
+        for k in range(len(reduction_factor)):
+            strength = elastic_strength / reduction_factor[k]
+            peak = _bilinear_peak(
+                omega, damping_ratio, hardening_ratio, strength, interval, motion
+            )
+            result[k, j, 0] = peak * stiffness / strength
+            result[k, j, 1] = peak
+
+    return result
+
+
+def constant_ductility_spectrum(
+    damping_ratio: float,
+    interval: float,
+    motion: np.ndarray,
+    period: np.ndarray,
+    ductility: np.ndarray,
+    hardening_ratio: float = 0.0,
+) -> np.ndarray:
+    """
+    Compute constant-ductility inelastic spectra of a bilinear oscillator.
+
+    For each period and target ductility, the yield strength is found by bisection
+    on the ratio to the elastic strength demand. All pairs of periods and target ductilities
+    are solved independently in parallel, each bisection is warm-started with the Newmark-Hall
+    estimate of the strength reduction factor instead of the solution of a smaller ductility,
+    so that requests with few periods and many ductilities still use all cores.
+    When ductility is not monotonic in strength, the solution bracketed from the estimate is returned.
+
+    The result is of shape `(len(ductility), len(period), 3)`, the last axis contains
+    the yield strength per unit mass (in the unit of motion), the strength reduction factor
+    and the peak displacement.
+    """
+    return _constant_ductility_spectrum(
+        damping_ratio,
+        hardening_ratio,
+        interval,
+        np.ascontiguousarray(motion, dtype=np.float64),
+        np.asarray(period, dtype=np.float64),
+        np.asarray(ductility, dtype=np.float64),
+    )
+
+
+def constant_strength_spectrum(
+    damping_ratio: float,
+    interval: float,
+    motion: np.ndarray,
+    period: np.ndarray,
+    reduction_factor: np.ndarray,
+    hardening_ratio: float = 0.0,
+) -> np.ndarray:
+    """
+    Compute constant-strength inelastic spectra of a bilinear oscillator.
+
+    The yield strength is the elastic strength demand divided by the given strength reduction factor.
+
+    The result is of shape `(len(reduction_factor), len(period), 2)`, the last axis contains
+    the ductility demand and the peak displacement.
+    """
+    return _constant_strength_spectrum(
+        damping_ratio,
+        hardening_ratio,
+        interval,
+        np.ascontiguousarray(motion, dtype=np.float64),
+        np.asarray(period, dtype=np.float64),
+        np.asarray(reduction_factor, dtype=np.float64),
+    )
+
+
+@njit((float64, float64, float64, float64[:]), cache=True)
 def sdof_response(
     damping_ratio: float, interval: float, freq: float, motion: np.ndarray
 ) -> np.ndarray:
@@ -140,6 +858,169 @@ def sdof_response(
     )
 
 
+@njit(cache=True)
+def _newmark(
+    gamma: float,
+    beta: float,
+    interval: float,
+    acceleration: np.ndarray,
+    displacement: np.ndarray,
+    velocity: np.ndarray,
+):
+    fa: float = interval * gamma
+    fb: float = interval - fa
+    fc: float = interval**2 * beta
+    fd: float = interval**2 * 0.5 - fc
+
+    # states are carried in double precision regardless of the storage precision
+    current_displacement: float = 0.0
+    current_velocity: float = 0.0
+    displacement[0] = 0.0
+    velocity[0] = 0.0
+    for i in range(1, len(acceleration)):
+        new_velocity = (
+            current_velocity + fb * acceleration[i - 1] + fa * acceleration[i]
+        )
+        current_displacement += (
+            current_velocity * interval
+            + fd * acceleration[i - 1]
+            + fc * acceleration[i]
+        )
+        current_velocity = new_velocity
+        displacement[i] = current_displacement
+        velocity[i] = current_velocity
+
+
+@njit(cache=True)
+def _remove_linear_trend(
+    interval: float, displacement: np.ndarray, velocity: np.ndarray
+):
+    """
+    Remove the least squares linear trend `c0 + c1 * t` from velocity.
+
+    This is identical to integrating `acceleration - c1` with an initial velocity of `-c0`,
+    thus displacement is corrected by `c0 * t + c1 * t**2 / 2` accordingly.
+    """
+    size: int = len(velocity)
+    if size < 2:
+        return
+
+    t_mean: float = 0.5 * interval * (size - 1)
+    v_mean: float = np.mean(velocity)
+    sxy: float = 0.0
+    sxx: float = 0.0
+    for i in range(size):
+        t = i * interval - t_mean
+        sxy += t * (velocity[i] - v_mean)
+        sxx += t * t
+
+    slope: float = sxy / sxx
+    intercept: float = v_mean - slope * t_mean
+    for i in range(size):
+        t = i * interval
+        velocity[i] -= intercept + slope * t
+        displacement[i] -= (intercept + 0.5 * slope * t) * t
+
+
+@njit(
+    [
+        (
+            float64,
+            float64,
+            float64[:],
+            types.Array(dtype, 1, "C", readonly=True),
+            int64[:],
+            boolean,
+        )
+        for dtype in (float64, float32)
+    ],
+    parallel=True,
+    cache=True,
+)
+def _batch_integrate(
+    gamma: float,
+    beta: float,
+    interval: np.ndarray,
+    motion: np.ndarray,
+    offset: np.ndarray,
+    baseline_correction: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    displacement = np.empty_like(motion)
+    velocity = np.empty_like(motion)
+    for i in prange(len(offset) - 1):
+        if offset[i] == offset[i + 1]:
+            continue
+        record_displacement = displacement[offset[i] : offset[i + 1]]
+        record_velocity = velocity[offset[i] : offset[i + 1]]
+        _newmark(
+            gamma,
+            beta,
+            interval[i],
+            motion[offset[i] : offset[i + 1]],
+            record_displacement,
+            record_velocity,
+        )
+        if baseline_correction:
+            _remove_linear_trend(interval[i], record_displacement, record_velocity)
+
+    return displacement, velocity
+
+
+def batch_integrate(
+    interval: np.ndarray,
+    motion: np.ndarray,
+    offset: np.ndarray,
+    *,
+    baseline_correction: bool = False,
+    gamma: float = 0.5,
+    beta: float = 0.25,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Integrate many acceleration records into displacement and velocity in one parallel launch.
+
+    The records are packed in the same layout as in `batch_response_spectrum`.
+    The Newmark method is used, the default parameters correspond to the average acceleration method.
+    If `baseline_correction` is enabled, the least squares linear trend of velocity is removed,
+    displacement is corrected consistently.
+
+    The results are packed in the same layout as `motion`.
+    """
+    return _batch_integrate(
+        gamma,
+        beta,
+        np.asarray(interval, dtype=np.float64),
+        motion,
+        offset,
+        baseline_correction,
+    )
+
+
+def integrate(
+    interval: float,
+    acceleration: np.ndarray,
+    *,
+    baseline_correction: bool = False,
+    gamma: float = 0.5,
+    beta: float = 0.25,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Integrate one acceleration record into displacement and velocity.
+
+    See `batch_integrate`.
+    """
+    return batch_integrate(
+        np.array([interval]),
+        np.ascontiguousarray(
+            acceleration,
+            dtype=np.float32 if acceleration.dtype == np.float32 else np.float64,
+        ),
+        np.array([0, len(acceleration)], dtype=np.int64),
+        baseline_correction=baseline_correction,
+        gamma=gamma,
+        beta=beta,
+    )
+
+
 @jitclass(
     [
         ("beta", float64),
@@ -157,20 +1038,6 @@ class Newmark:
         displacement: np.ndarray = np.zeros_like(acceleration)
         velocity: np.ndarray = np.zeros_like(acceleration)
 
-        fa: float = interval * self.gamma
-        fb: float = interval - fa
-        fc: float = interval**2 * self.beta
-        fd: float = interval**2 * 0.5 - fc
-
-        for i in range(1, len(acceleration)):
-            velocity[i] = (
-                velocity[i - 1] + fb * acceleration[i - 1] + fa * acceleration[i]
-            )
-            displacement[i] = (
-                displacement[i - 1]
-                + velocity[i - 1] * interval
-                + fd * acceleration[i - 1]
-                + fc * acceleration[i]
-            )
+        _newmark(self.gamma, self.beta, interval, acceleration, displacement, velocity)
 
         return displacement, velocity
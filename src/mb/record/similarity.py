@@ -0,0 +1,180 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import numpy as np
+from numba import boolean, float32, int64, njit, prange, types
+
+# fixed log-period grid on which spectra are stored at ingestion
+SPECTRUM_PERIOD: np.ndarray = np.logspace(-2, 1, 64)
+SPECTRUM_DAMPING_RATIO: float = 0.05
+SPECTRUM_DTYPE = np.dtype("<f4")
+
+# spectral accelerations below this value are clipped before taking logarithm
+MINIMUM_ACCELERATION: float = 1e-6
+# number of candidates per requested record kept by the coarse scan when pruning
+PRUNE_FACTOR: int = 32
+
+
+def encode_spectrum(spectrum: np.ndarray) -> bytes:
+    return np.asarray(spectrum, dtype=SPECTRUM_DTYPE).tobytes()
+
+
+def decode_spectrum(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=SPECTRUM_DTYPE)
+
+
+def interpolate_target(
+    period: np.ndarray, spectrum: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Interpolate a target spectrum onto `SPECTRUM_PERIOD` in log-log space.
+
+    Returns the logarithm of the interpolated spectrum and a mask of grid points
+    covered by the target, points outside the target period range do not contribute to misfit.
+    """
+    period = np.asarray(period, dtype=np.float64)
+    spectrum = np.asarray(spectrum, dtype=np.float64)
+    order = np.argsort(period)
+    period = period[order]
+    spectrum = spectrum[order]
+
+    mask = (period[0] <= SPECTRUM_PERIOD) & (period[-1] >= SPECTRUM_PERIOD)
+    log_target = np.interp(
+        np.log(SPECTRUM_PERIOD),
+        np.log(period),
+        np.log(np.maximum(spectrum, MINIMUM_ACCELERATION)),
+    )
+    return log_target.astype(np.float32), mask
+
+
+@njit(
+    (
+        types.Array(float32, 2, "C", readonly=True),
+        int64[:],
+        types.Array(float32, 1, "C", readonly=True),
+        int64[:],
+        boolean,
+    ),
+    parallel=True,
+    nogil=True,
+    cache=True,
+)
+def _misfit(
+    log_spectrum: np.ndarray,
+    rows: np.ndarray,
+    log_target: np.ndarray,
+    columns: np.ndarray,
+    with_scaling: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    misfit = np.empty(len(rows), dtype=np.float64)
+    shift = np.zeros(len(rows), dtype=np.float64)
+    for i in prange(len(rows)):
+        total: float = 0.0
+        square: float = 0.0
+        for j in columns:
+            difference = float(log_target[j]) - float(log_spectrum[rows[i], j])
+            total += difference
+            square += difference * difference
+        total /= len(columns)
+        square /= len(columns)
+        if with_scaling:
+            shift[i] = total
+            square -= total * total
+        misfit[i] = np.sqrt(max(square, 0.0))
+
+    return misfit, shift
+
+
+class SpectrumIndex:
+    """
+    An exact, in-memory similarity index of response spectra.
+
+    Spectra are stored as a dense `(n, len(SPECTRUM_PERIOD))` matrix of log spectral accelerations.
+    The misfit between a record and the target is the root mean square of log differences,
+    which is a parallel scan over the matrix.
+    With amplitude scaling, each record is scaled by the factor that minimises its misfit,
+    this factor is the exponential of the mean log difference.
+    """
+
+    def __init__(self, record_id: list[str], spectrum: list[bytes]):
+        self.record_id: list[str] = record_id
+        self.row: dict[str, int] = {x: i for i, x in enumerate(record_id)}
+        self.log_spectrum: np.ndarray = np.log(
+            np.maximum(
+                np.frombuffer(b"".join(spectrum), dtype=SPECTRUM_DTYPE).reshape(
+                    len(record_id), len(SPECTRUM_PERIOD)
+                ),
+                MINIMUM_ACCELERATION,
+            )
+        ).astype(np.float32)
+        self.log_spectrum.flags.writeable = False
+
+    def __len__(self):
+        return len(self.record_id)
+
+    def rows(self, record_id: list[str]) -> np.ndarray:
+        return np.fromiter(
+            (i for x in record_id if (i := self.row.get(x)) is not None),
+            dtype=np.int64,
+        )
+
+    def search(
+        self,
+        log_target: np.ndarray,
+        mask: np.ndarray,
+        top_k: int,
+        *,
+        rows: np.ndarray | None = None,
+        with_scaling: bool = False,
+        prune_stride: int = 1,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the `top_k` records with the smallest misfit.
+
+        If `rows` is given, only those rows are considered.
+        If `prune_stride` is larger than one, a coarse scan on every `prune_stride`-th
+        period first shortlists candidates, the exact misfit is then computed on the shortlist only.
+        Pruning is thus approximate.
+
+        Returns rows, misfits and scale factors, sorted by misfit.
+        """
+        if rows is None:
+            rows = np.arange(len(self), dtype=np.int64)
+        columns = np.flatnonzero(mask).astype(np.int64)
+        if len(columns) == 0 or len(rows) == 0 or top_k < 1:
+            empty = np.empty(0)
+            return empty.astype(np.int64), empty, empty
+
+        if prune_stride > 1 and len(rows) > PRUNE_FACTOR * top_k:
+            misfit, _ = _misfit(
+                self.log_spectrum,
+                rows,
+                log_target,
+                columns[::prune_stride].copy(),
+                with_scaling,
+            )
+            shortlist: int = PRUNE_FACTOR * top_k
+            rows = rows[np.argpartition(misfit, shortlist - 1)[:shortlist]]
+
+        misfit, shift = _misfit(
+            self.log_spectrum, rows, log_target, columns, with_scaling
+        )
+        top_k = min(top_k, len(rows))
+        best = np.argpartition(misfit, top_k - 1)[:top_k]
+        best = best[np.argsort(misfit[best])]
+
+        return rows[best], misfit[best], np.exp(shift[best])
@@ -15,23 +15,34 @@
 
 from __future__ import annotations
 
+import struct
+import zlib
 from enum import Enum
 from uuid import NAMESPACE_OID, uuid4, uuid5
 
 import numpy as np
 import pint
-from numba import float64, int32, njit
-from scipy import signal
+from numba import float32, float64, int32, njit, prange, types
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft, signal, sparse
+
+from ..utility.cache import LRUCache
+
+try:
+    from compression import zstd
+except ImportError:  # Python < 3.14
+    from backports import zstd
 
 
 def perform_fft(
     sampling_frequency: float, magnitude: np.ndarray
 ) -> tuple[float, np.ndarray]:
+    # float32 input is transformed in single precision
     fft_magnitude: np.ndarray = 2 * np.abs(np.fft.rfft(magnitude)) / len(magnitude)
     return sampling_frequency / magnitude.size, fft_magnitude
 
 
-@njit((float64[:],), parallel=True)
+@njit([(float64[:],), (float32[:],)], parallel=True, cache=True)
 def normalise(magnitude: np.ndarray) -> np.ndarray:
     max_value: float = abs(np.max(magnitude))
     min_value: float = abs(np.min(magnitude))
@@ -43,20 +54,147 @@ def convert_to(quantity: pint.Quantity, unit: pint.Unit | None):
     return quantity.to(unit).magnitude if unit else quantity.magnitude
 
 
-@njit((float64[:], float64[:]))
-def apply_filter(window, waveform: np.ndarray) -> np.ndarray:
+# windows longer than this are applied via overlap-add FFT convolution
+# below it the direct convolution is faster
+FFT_FILTER_THRESHOLD: int = 256
+
+
+def apply_filter(window: np.ndarray, waveform: np.ndarray) -> np.ndarray:
+    # follow the precision of the waveform
+    window = window.astype(waveform.dtype, copy=False)
+    if FFT_FILTER_THRESHOLD < len(window) <= len(waveform):
+        return signal.oaconvolve(waveform, window, mode="same")
     return np.convolve(waveform, window, mode="same")
 
 
-@njit((int32, float64[:]))
+@njit([(int32, float64[:]), (int32, float32[:])], cache=True)
 def zero_stuff(ratio: int, waveform: np.ndarray | list[float]) -> np.ndarray:
     if ratio == 1:
         return np.array(waveform) if isinstance(waveform, list) else waveform
-    output: np.ndarray = np.zeros(len(waveform) * ratio)
+    output: np.ndarray = np.zeros(len(waveform) * ratio, dtype=waveform.dtype)
     output[::ratio] = waveform
     return output
 
 
+@njit(
+    [
+        (int32, int32, types.Array(float64, 1, "C", readonly=True), float64[:]),
+        (int32, int32, types.Array(float64, 1, "C", readonly=True), float32[:]),
+    ],
+    parallel=True,
+    cache=True,
+)
+def polyphase_resample(
+    up_ratio: int, down_ratio: int, window: np.ndarray, waveform: np.ndarray
+) -> np.ndarray:
+    """
+    Resample the waveform by a rational factor `up_ratio/down_ratio` using the given FIR window.
+
+    It is equivalent to `apply_filter(window, zero_stuff(up_ratio, waveform))[::down_ratio]`,
+    but only the retained samples are computed and only the taps hitting nonzero samples are visited.
+    As with `np.convolve`, the output covers the longer of the window and the upsampled waveform.
+    """
+    # the "same" part of the full convolution as defined by `np.convolve`
+    half: int = (min(len(window), len(waveform) * up_ratio) - 1) // 2
+    size: int = max(len(window), len(waveform) * up_ratio)
+
+    # rearrange taps into polyphase branches so that each branch is contiguous
+    branch_size: int = (len(window) + up_ratio - 1) // up_ratio
+    branch: np.ndarray = np.zeros((up_ratio, branch_size))
+    for j in range(len(window)):
+        branch[j % up_ratio, j // up_ratio] = window[j]
+
+    # taps and sums are kept in double precision
+    output: np.ndarray = np.empty(
+        (size + down_ratio - 1) // down_ratio, dtype=waveform.dtype
+    )
+    for k in prange(len(output)):
+        # index into the full convolution of the zero-stuffed waveform
+        position = k * down_ratio + half
+        phase = position % up_ratio
+        anchor = position // up_ratio
+        total: float = 0.0
+        for t in range(
+            max(0, anchor - len(waveform) + 1), min(branch_size, anchor + 1)
+        ):
+            total += branch[phase, t] * waveform[anchor - t]
+        output[k] = total
+
+    return output
+
+
+def pack_waveforms(
+    waveforms: list[np.ndarray], dtype: np.dtype | type = np.float64
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pack waveforms of different lengths into a flat array of `dtype` and the corresponding offsets.
+
+    The i-th waveform can be recovered by `flat[offset[i] : offset[i + 1]]`.
+    """
+    offset: np.ndarray = np.zeros(len(waveforms) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in waveforms], out=offset[1:])
+    if not waveforms:
+        return np.empty(0, dtype=dtype), offset
+    return np.concatenate(waveforms).astype(dtype, copy=False), offset
+
+
+def to_list(data: np.ndarray) -> list:
+    """
+    Convert an array to (nested) lists of Python floats.
+
+    Single precision values are rounded to nine significant digits, which is sufficient
+    to recover the exact single precision values, so that they are serialised compactly
+    instead of with the 17 digits of the promoted double precision values.
+    """
+    if data.dtype != np.float32:
+        return data.tolist()
+
+    promoted = data.astype(np.float64)
+    magnitude = np.abs(promoted)
+    finite = np.isfinite(magnitude) & (magnitude > 0)
+    digits = 8 - np.floor(np.log10(np.where(finite, magnitude, 1))).astype(np.int64)
+    # powers of ten up to 1e22 are exact, a single correctly rounded operation then gives
+    # the double nearest to the rounded decimal, whose repr has at most nine digits
+    exact = np.abs(digits) <= 22
+    power = 10.0 ** np.abs(np.where(exact, digits, 0))
+    rounded = np.where(
+        digits >= 0,
+        np.round(promoted * power) / power,
+        np.round(promoted / power) * power,
+    )
+    # extreme magnitudes take the shortest repr of the single precision values
+    if (extreme := finite & ~exact).any():
+        rounded[extreme] = data[extreme].astype(str).astype(np.float64)
+    return rounded.tolist()
+
+
+WINDOW_CACHE = LRUCache("fir_window", 256)
+
+# cutoffs are normalised frequencies in (0, 1), round them so that
+# tiny floating point differences do not lead to distinct cache entries
+CUTOFF_DECIMALS: int = 12
+
+
+def _design_window(
+    filter_type: str,
+    window: tuple,
+    length: int,
+    cutoff: float | tuple[float, ...],
+    ratio: float,
+) -> np.ndarray:
+    # noinspection PyTypeChecker
+    designed = signal.firwin(
+        2 * length + 1,
+        list(cutoff) if isinstance(cutoff, tuple) else cutoff,
+        window=window,
+        pass_zero=filter_type,
+    )
+    if ratio != 1:
+        designed *= ratio
+    designed.flags.writeable = False
+    return designed
+
+
 def get_window(
     filter_type: str,
     window_type: str,
@@ -64,6 +202,11 @@ def get_window(
     cutoff: float | list[float],
     **kwargs,
 ) -> np.ndarray:
+    """
+    Design a FIR window via `scipy.signal.firwin`.
+
+    The designed windows are cached, the returned array is read-only and shall not be modified.
+    """
     if window_type == "flattop":
         window = ("flattop",)
     elif window_type == "blackmanharris":
@@ -75,16 +218,282 @@ def get_window(
     elif window_type == "hamming":
         window = ("hamming",)
     elif window_type == "kaiser":
-        window = ("kaiser", kwargs.get("beta", 9))
+        window = ("kaiser", float(kwargs.get("beta", 9)))
     elif window_type == "chebwin":
-        window = ("chebwin", kwargs.get("at", 80))
+        window = ("chebwin", float(kwargs.get("at", 80)))
     else:
         raise ValueError(f"Unknown window type: {window_type}.")
 
-    # noinspection PyTypeChecker
-    return signal.firwin(
-        2 * length + 1, cutoff, window=window, pass_zero=filter_type
-    ) * kwargs.get("ratio", 1)
+    quantised_cutoff: float | tuple[float, ...] = (
+        tuple(round(float(x), CUTOFF_DECIMALS) for x in cutoff)
+        if isinstance(cutoff, list | tuple | np.ndarray)
+        else round(float(cutoff), CUTOFF_DECIMALS)
+    )
+    ratio: float = kwargs.get("ratio", 1)
+
+    return WINDOW_CACHE.get_or_create(
+        (filter_type, window, int(length), quantised_cutoff, ratio),
+        lambda: _design_window(filter_type, window, length, quantised_cutoff, ratio),
+    )
+
+
+KONNO_OHMACHI_CACHE = LRUCache("konno_ohmachi", 32)
+# the window is truncated at this many zeros of the sinc function on each side
+# the fourth sidelobe is below 1e-4 of the main lobe
+KONNO_OHMACHI_SUPPORT: int = 4
+
+
+def _konno_ohmachi_matrix(
+    size: int, frequency_interval: float, frequency: np.ndarray, bandwidth: float
+) -> sparse.csr_matrix:
+    bin_frequency: np.ndarray = frequency_interval * np.arange(size)
+    ratio: float = 10 ** (KONNO_OHMACHI_SUPPORT * np.pi / bandwidth)
+
+    rows: list[np.ndarray] = []
+    columns: list[np.ndarray] = []
+    values: list[np.ndarray] = []
+    for i, centre in enumerate(frequency):
+        # the zero frequency bin is excluded
+        start = max(1, np.searchsorted(bin_frequency, centre / ratio))
+        stop = np.searchsorted(bin_frequency, centre * ratio, side="right")
+        if start >= stop:
+            continue
+        x = bandwidth * np.log10(bin_frequency[start:stop] / centre)
+        weight = np.sinc(x / np.pi) ** 4
+        rows.append(np.full(stop - start, i))
+        columns.append(np.arange(start, stop))
+        values.append(weight / weight.sum())
+
+    matrix = sparse.csr_matrix(
+        (
+            np.concatenate(values) if values else np.empty(0),
+            (
+                np.concatenate(rows) if rows else np.empty(0, dtype=int),
+                np.concatenate(columns) if columns else np.empty(0, dtype=int),
+            ),
+        ),
+        shape=(len(frequency), size),
+    )
+    matrix.data.flags.writeable = False
+    return matrix
+
+
+def konno_ohmachi_matrix(
+    size: int, frequency_interval: float, frequency: np.ndarray, bandwidth: float = 40.0
+) -> sparse.csr_matrix:
+    """
+    Get the sparse weight matrix that maps an amplitude spectrum of `size` bins
+    spaced at `frequency_interval` to its Konno-Ohmachi smoothed values at `frequency`.
+
+    Each row holds the normalised window centred at one target frequency, truncated
+    to `KONNO_OHMACHI_SUPPORT` lobes on each side, thus the matrix is banded in log frequency.
+    Matrices are cached, the returned matrix shall not be modified.
+    """
+    frequency = np.asarray(frequency, dtype=np.float64)
+    return KONNO_OHMACHI_CACHE.get_or_create(
+        (
+            int(size),
+            round(float(frequency_interval), CUTOFF_DECIMALS),
+            frequency.tobytes(),
+            float(bandwidth),
+        ),
+        lambda: _konno_ohmachi_matrix(size, frequency_interval, frequency, bandwidth),
+    )
+
+
+def smooth_spectrum(
+    frequency_interval: float,
+    spectrum: np.ndarray,
+    frequency: np.ndarray,
+    bandwidth: float = 40.0,
+) -> np.ndarray:
+    """
+    Evaluate the Konno-Ohmachi smoothed amplitude spectrum at the given frequencies.
+    """
+    return (
+        konno_ohmachi_matrix(len(spectrum), frequency_interval, frequency, bandwidth)
+        @ spectrum
+    )
+
+
+BASELINE_CACHE = LRUCache("baseline_basis", 32)
+
+
+def baseline_basis(size: int, order: int) -> np.ndarray:
+    """
+    Get the orthonormal basis of polynomials up to `order` sampled at `size` points.
+
+    It is the Q factor of the QR decomposition of the Vandermonde matrix on `[-1, 1]`,
+    which is well-conditioned for moderate orders.
+    The bases are cached, the returned array is read-only and shall not be modified.
+    """
+
+    def _create():
+        vandermonde = np.polynomial.legendre.legvander(np.linspace(-1, 1, size), order)
+        basis = np.ascontiguousarray(np.linalg.qr(vandermonde)[0])
+        basis.flags.writeable = False
+        return basis
+
+    return BASELINE_CACHE.get_or_create((int(size), int(order)), _create)
+
+
+def remove_baseline(waveform: np.ndarray, order: int = 1) -> np.ndarray:
+    """
+    Remove the least squares polynomial baseline of the given order.
+
+    Order zero removes the mean, order one removes the linear trend.
+    """
+    if len(waveform) <= order:
+        return np.zeros_like(waveform)
+
+    basis = baseline_basis(len(waveform), order)
+    return (waveform - basis @ (waveform @ basis)).astype(waveform.dtype, copy=False)
+
+
+def apply_taper(waveform: np.ndarray, ratio: float) -> np.ndarray:
+    """
+    Taper both ends of the waveform with half cosines, each spanning `ratio` of the waveform.
+    """
+    if ratio <= 0 or len(waveform) < 2:
+        return waveform
+
+    taper = get_taper(("tukey", 2 * min(ratio, 0.5)), len(waveform), symmetric=True)
+    return waveform * taper.astype(waveform.dtype, copy=False)
+
+
+TAPER_CACHE = LRUCache("taper", 32)
+
+
+def get_taper(
+    window_type: str | tuple, length: int, symmetric: bool = False
+) -> np.ndarray:
+    """
+    Get a taper via `scipy.signal.get_window`, periodic for spectral analysis by default,
+    or symmetric for tapering waveforms.
+
+    The tapers are cached, the returned array is read-only and shall not be modified.
+    """
+
+    def _create():
+        taper = signal.get_window(window_type, length, fftbins=not symmetric)
+        taper.flags.writeable = False
+        return taper
+
+    return TAPER_CACHE.get_or_create((window_type, int(length), symmetric), _create)
+
+
+def _pool(data: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """
+    Average consecutive blocks along `axis` so that at most `size` entries remain.
+    """
+    length: int = data.shape[axis]
+    if length <= size:
+        return data
+    edge = np.linspace(0, length, size + 1).astype(np.int64)
+    shape = [1] * data.ndim
+    shape[axis] = size
+    return np.add.reduceat(data, edge[:-1], axis=axis) / np.diff(edge).reshape(shape)
+
+
+# number of frames tapered and transformed at a time
+STFT_BATCH: int = 256
+
+
+def spectrogram(
+    interval: float,
+    waveform: np.ndarray,
+    window_length: int = 256,
+    overlap: float = 0.75,
+    *,
+    window_type: str = "hann",
+    time_bins: int = 256,
+    frequency_bins: int = 128,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the short-time Fourier amplitude spectrum.
+
+    Frames are strided views of the waveform, they are tapered into a reused buffer and
+    transformed in batched FFTs of `STFT_BATCH` frames, so that the tapered frames are never
+    materialised at once. The result is block averaged to at most `frequency_bins` by `time_bins`.
+
+    Returns the frame centre times, the frequencies and the amplitude of shape (n_frequency, n_time).
+    """
+    waveform = np.asarray(waveform, dtype=np.float64)
+    window_length = max(2, min(int(window_length), len(waveform)))
+    hop: int = max(1, round(window_length * (1 - overlap)))
+
+    taper = get_taper(window_type, window_length)
+    frames = sliding_window_view(waveform, window_length)[::hop]
+
+    amplitude = np.empty((len(frames), window_length // 2 + 1))
+    buffer = np.empty((min(STFT_BATCH, len(frames)), window_length))
+    for start in range(0, len(frames), STFT_BATCH):
+        batch = frames[start : start + STFT_BATCH]
+        tapered = np.multiply(batch, taper, out=buffer[: len(batch)])
+        np.abs(np.fft.rfft(tapered, axis=1), out=amplitude[start : start + len(batch)])
+    amplitude *= 2 / taper.sum()
+
+    time = (np.arange(len(frames)) * hop + window_length / 2) * interval
+    frequency = np.fft.rfftfreq(window_length, interval)
+
+    return (
+        _pool(time, time_bins, 0),
+        _pool(frequency, frequency_bins, 0),
+        _pool(_pool(amplitude.T, frequency_bins, 0), time_bins, 1),
+    )
+
+
+# central angular frequency of the Morlet wavelet
+MORLET_OMEGA: float = 6.0
+# the wavelet spectrum is truncated at this many standard deviations from its centre
+MORLET_SUPPORT: float = 6.0
+
+
+def scalogram(
+    interval: float,
+    waveform: np.ndarray,
+    frequency: np.ndarray,
+    *,
+    time_bins: int = 256,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the Morlet wavelet scalogram at the given frequencies.
+
+    The waveform is transformed once. Since the wavelet at each scale is band-limited,
+    its coefficients are recovered by a short inverse FFT over the occupied band only,
+    which samples them at the coarsest rate that still resolves `time_bins`.
+    The wavelet is normalised so that a sinusoid at the scale frequency has unit gain.
+
+    Returns the times and the amplitude of shape (n_frequency, n_time).
+    """
+    waveform = np.asarray(waveform, dtype=np.float64)
+    frequency = np.asarray(frequency, dtype=np.float64)
+    size: int = len(waveform)
+    # zero padding avoids wrap-around at both ends
+    fft_size: int = fft.next_fast_len(2 * size, real=True)
+    time_bins = min(size, time_bins)
+
+    omega_interval: float = 2 * np.pi / (fft_size * interval)
+    spectrum = np.fft.rfft(waveform, fft_size)
+    # sample each time bin at least four times
+    minimum_length: int = -(-4 * time_bins * fft_size // size)
+
+    amplitude = np.empty((len(frequency), time_bins))
+    for i, scale in enumerate(MORLET_OMEGA / (2 * np.pi * frequency)):
+        band: int = min(
+            int((MORLET_OMEGA + MORLET_SUPPORT) / (scale * omega_interval)) + 1,
+            len(spectrum),
+        )
+        length: int = fft.next_fast_len(max(band, minimum_length))
+        kernel = 2 * np.exp(
+            -0.5 * (scale * omega_interval * np.arange(band) - MORLET_OMEGA) ** 2
+        )
+        coefficient = np.fft.ifft(spectrum[:band] * kernel, length)
+        # rescale from the short inverse transform and keep the unpadded part
+        coefficient = coefficient[: -(-size * length // fft_size)] * (length / fft_size)
+        amplitude[i] = _pool(np.abs(coefficient), time_bins, 0)
+
+    return _pool(np.arange(size) * interval, time_bins, 0), amplitude
 
 
 def str_factory():
@@ -95,5 +504,106 @@ def uuid5_str(token: str) -> str:
     return str(uuid5(NAMESPACE_OID, token))
 
 
+class Precision(Enum):
+    Single = "float32"
+    Double = "float64"
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.value)
+
+
+class PeriodGrid(Enum):
+    Uniform = "uniform"
+    Logarithmic = "log"
+    Adaptive = "adaptive"
+
+
 class IntegrationType(Enum):
     Newmark = "Newmark"
+
+
+class WaveformCodec(Enum):
+    Plain = "none"
+    Deflate = "deflate"
+    Zstandard = "zstd"
+
+
+# magic, codec index, flags, number of samples
+WAVEFORM_HEADER = struct.Struct("<2sBBI")
+WAVEFORM_MAGIC: bytes = b"MB"
+WAVEFORM_DELTA: int = 1
+WAVEFORM_WIDE: int = 2
+
+
+def encode_waveform(
+    data: list[int] | np.ndarray,
+    codec: WaveformCodec = WaveformCodec.Zstandard,
+    delta: bool = True,
+) -> bytes:
+    """
+    Encode integer samples into a compact little-endian binary blob.
+
+    Samples are stored as int32 unless they do not fit, in which case int64 is used.
+    With `delta`, successive differences are stored instead, which compress better for smooth signals.
+    Wrapping arithmetic makes the differences exactly invertible regardless of overflow.
+    """
+    samples = np.asarray(data, dtype=np.int64)
+
+    flags: int = 0
+    if samples.size and (
+        samples.min() < np.iinfo(np.int32).min or samples.max() > np.iinfo(np.int32).max
+    ):
+        flags |= WAVEFORM_WIDE
+        samples = samples.astype("<i8")
+    else:
+        samples = samples.astype("<i4")
+
+    if delta:
+        flags |= WAVEFORM_DELTA
+        samples = np.diff(samples, prepend=samples.dtype.type(0))
+
+    payload: bytes = samples.tobytes()
+    if codec == WaveformCodec.Deflate:
+        payload = zlib.compress(payload)
+    elif codec == WaveformCodec.Zstandard:
+        payload = zstd.compress(payload)
+
+    return (
+        WAVEFORM_HEADER.pack(
+            WAVEFORM_MAGIC, list(WaveformCodec).index(codec), flags, samples.size
+        )
+        + payload
+    )
+
+
+def decode_waveform(data: bytes | list[int]) -> np.ndarray:
+    """
+    Decode a blob produced by `encode_waveform` into integer samples.
+
+    Uncompressed samples without delta encoding are viewed in place, otherwise the
+    decompressed buffer is viewed without any per-sample conversion.
+    The returned array is read-only when it is a view.
+    Legacy documents storing samples as a plain list are also accepted.
+    """
+    if not isinstance(data, bytes | bytearray | memoryview):
+        return np.asarray(data, dtype=np.int64)
+
+    magic, codec, flags, size = WAVEFORM_HEADER.unpack_from(data)
+    if magic != WAVEFORM_MAGIC:
+        raise ValueError("Unknown waveform encoding.")
+
+    payload = memoryview(data)[WAVEFORM_HEADER.size :]
+    codec = list(WaveformCodec)[codec]
+    if codec == WaveformCodec.Deflate:
+        payload = zlib.decompress(payload)
+    elif codec == WaveformCodec.Zstandard:
+        payload = zstd.decompress(payload)
+
+    samples = np.frombuffer(
+        payload, dtype="<i8" if flags & WAVEFORM_WIDE else "<i4", count=size
+    )
+    if flags & WAVEFORM_DELTA:
+        samples = np.cumsum(samples, dtype=samples.dtype)
+
+    return samples
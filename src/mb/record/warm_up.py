@@ -0,0 +1,94 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from time import perf_counter
+
+import numpy as np
+import structlog
+
+from .intensity_measure import intensity_measure
+from .response_spectrum import (
+    Newmark,
+    batch_integrate,
+    batch_response_spectrum,
+    constant_ductility_spectrum,
+    constant_strength_spectrum,
+    response_spectra,
+    response_spectrum,
+    rotd_spectrum,
+    sdof_response,
+)
+from .similarity import SPECTRUM_PERIOD, SpectrumIndex, encode_spectrum
+from .utility import (
+    apply_filter,
+    get_window,
+    normalise,
+    pack_waveforms,
+    polyphase_resample,
+    zero_stuff,
+)
+
+_logger = structlog.get_logger(__name__)
+
+
+def warm_up() -> float:
+    """
+    Calls every numba kernel once with tiny double precision inputs so that they are compiled,
+    or loaded from the on-disk cache, before the first real request arrives.
+
+    This covers response spectra, integration, RotD and inelastic spectra, intensity measures,
+    filtering and resampling, and the spectral similarity scan.
+
+    Returns the elapsed time in seconds.
+    """
+    start: float = perf_counter()
+
+    interval: float = 0.01
+    motion: np.ndarray = np.sin(np.linspace(0, 4 * np.pi, 64))
+    period: np.ndarray = np.array([0.0, 0.1, 0.2])
+    damping: np.ndarray = np.array([0.02, 0.05])
+
+    response_spectrum(0.05, interval, motion, period)
+    response_spectra(damping, interval, motion, period)
+    batch_response_spectrum(
+        damping,
+        np.array([interval, 2 * interval]),
+        *pack_waveforms([motion, motion]),
+        period,
+    )
+    batch_integrate(
+        np.array([interval, 2 * interval]),
+        *pack_waveforms([motion, motion]),
+        baseline_correction=True,
+    )
+    sdof_response(0.05, interval, 1.0, motion)
+    Newmark().integrate(interval, motion)
+    rotd_spectrum(0.05, interval, motion, motion[::-1].copy(), period)
+    constant_ductility_spectrum(0.05, interval, motion, period[1:], np.array([2.0]))
+    constant_strength_spectrum(0.05, interval, motion, period[1:], np.array([2.0]))
+    intensity_measure(interval, motion)
+
+    index = SpectrumIndex(["0"], [encode_spectrum(np.ones(len(SPECTRUM_PERIOD)))])
+    index.search(index.log_spectrum[0], np.ones(len(SPECTRUM_PERIOD), dtype=bool), 1)
+
+    window: np.ndarray = get_window("lowpass", "hann", 9, 0.4)
+    apply_filter(window, motion)
+    zero_stuff(2, motion)
+    polyphase_resample(2, 1, window, motion)
+    normalise(motion.copy())
+
+    elapsed: float = perf_counter() - start
+    _logger.info(f"Numba kernels warmed up in {elapsed:.2f} s.")
+    return elapsed
@@ -0,0 +1,129 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+
+_registry: dict[str, LRUCache] = {}
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe, least recently used cache with hit/miss counters.
+
+    The cache is bounded by the number of entries, and optionally by the total bytes
+    of entries if `max_bytes` is given, the size of each entry is given when it is put.
+
+    Each cache is registered under its name so that the statistics of all caches
+    can be collected via `cache_stats`.
+    """
+
+    def __init__(self, name: str, max_size: int, max_bytes: int | None = None):
+        self.name: str = name
+        self.max_size: int = max_size
+        self.max_bytes: int | None = max_bytes
+
+        self._data: OrderedDict = OrderedDict()
+        self._bytes: dict = {}
+        self._lock = Lock()
+
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        _registry[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value, nbytes: int = 0):
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            self._discard(key)
+            self._data[key] = value
+            self._bytes[key] = nbytes
+            self.bytes += nbytes
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._discard(next(iter(self._data)))
+                self.evictions += 1
+
+    def _discard(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self.bytes -= self._bytes.pop(key)
+
+    def get_or_create(self, key: Hashable, factory: Callable):
+        if (value := self.get(key)) is None:
+            self.put(key, value := factory())
+        return value
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            value = self._data.get(key, default)
+            self._discard(key)
+            return value
+
+    def remove_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Remove all entries whose keys satisfy the predicate, returns the number of removed entries.
+        """
+        with self._lock:
+            for key in (matched := [k for k in self._data if predicate(k)]):
+                self._discard(key)
+            return len(matched)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes.clear()
+            self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        total: int = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def cache_stats() -> dict[str, dict]:
+    return {name: cache.stats() for name, cache in _registry.items()}
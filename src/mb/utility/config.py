@@ -19,7 +19,7 @@ from beanie import init_beanie
 from pymongo import AsyncMongoClient
 
 from ..app.utility import User
-from ..record.async_record import Record, UploadTask
+from ..record.async_record import ProcessedResult, Record, UploadTask, Waveform
 from .env import (
     MONGO_DB_NAME,
     MONGO_HOST,
@@ -44,7 +44,7 @@ def mongo_uri():
 async def mb_init_beanie(client: AsyncMongoClient, db: str | None):
     await init_beanie(
         database=client.get_database(db or MONGO_DB_NAME),
-        document_models=[Record, User, UploadTask],
+        document_models=[Record, User, UploadTask, Waveform, ProcessedResult],
     )
 
 
@@ -36,6 +36,11 @@ def generate_elastic_mapping() -> dict:
             "uploaded_by": {"type": "text"},
             "magnitude": {"type": "float"},
             "maximum_acceleration": {"type": "float"},
+            "maximum_velocity": {"type": "float"},
+            "maximum_displacement": {"type": "float"},
+            "arias_intensity": {"type": "float"},
+            "cumulative_absolute_velocity": {"type": "float"},
+            "significant_duration": {"type": "float"},
             "event_time": {"type": "date"},
             "event_location": {"type": "geo_point"},
             "depth": {"type": "float"},
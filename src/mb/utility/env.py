@@ -77,6 +77,33 @@ MB_FS_USERNAME: str = os.getenv("MB_FS_USERNAME", MB_SUPERUSER_USERNAME)
 MB_FS_PASSWORD: str = os.getenv("MB_FS_PASSWORD", MB_SUPERUSER_PASSWORD)
 MB_FS_PERSISTENT: bool = bool(os.getenv("MB_FS_PERSISTENT", ""))
 
+MB_WARM_UP: bool = bool(os.getenv("MB_WARM_UP", ""))
+# worker processes for CPU heavy processing per server worker, zero runs it in threads instead
+MB_PROCESS_WORKERS: int = int(os.getenv("MB_PROCESS_WORKERS", "0"))
+# numba threads of each worker process
+MB_PROCESS_THREADS: int = int(os.getenv("MB_PROCESS_THREADS", "1"))
+# requests admitted to the pool at a time, others are rejected with 503
+MB_PROCESS_QUEUE: int = int(os.getenv("MB_PROCESS_QUEUE", "64"))
+# compression of stored waveforms, one of none, deflate and zstd
+MB_WAVEFORM_CODEC: str = os.getenv("MB_WAVEFORM_CODEC", "zstd")
+# where waveforms are stored, one of inline, collection and s3
+# inline keeps waveforms in record documents, collection and s3 keep them in a separate collection
+# or in the bucket of MB_FS_BUCKET so that metadata queries do not carry waveforms
+MB_WAVEFORM_STORE: str = os.getenv("MB_WAVEFORM_STORE", "inline")
+# directory of the local waveform archive, leave empty to disable
+# waveforms of records not carrying them are then served from the memory-mapped archive if present
+MB_WAVEFORM_ARCHIVE: str = os.getenv("MB_WAVEFORM_ARCHIVE", "")
+# memory budget in MB of processing results cached in each server worker, zero disables it
+MB_RESULT_CACHE_SIZE: int = int(os.getenv("MB_RESULT_CACHE_SIZE", "256"))
+# where processing results are shared between workers, one of none, collection and s3
+MB_RESULT_STORE: str = os.getenv("MB_RESULT_STORE", "none")
+# hours shared processing results are kept in the collection
+MB_RESULT_TTL: int = int(os.getenv("MB_RESULT_TTL", "168"))
+# records written to the database in one batch when parsing uploaded archives
+MB_BULK_SIZE: int = int(os.getenv("MB_BULK_SIZE", "256"))
+# process waveforms in single precision unless requested otherwise
+MB_FLOAT32: bool = bool(os.getenv("MB_FLOAT32", ""))
+
 TURNSTILE_SECRET: str = os.getenv("TURNSTILE_SECRET", "")
 
 LOADED = True
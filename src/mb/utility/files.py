@@ -15,8 +15,10 @@
 
 from __future__ import annotations
 
+import asyncio
 import os
 import tarfile
+from contextlib import suppress
 from os.path import basename
 from shutil import copyfileobj
 from tempfile import TemporaryDirectory
@@ -63,6 +65,44 @@ def _remote_obj(file_name: str):
     raise FileExistsError(f"File {remote_obj} already exists.")
 
 
+async def store_blobs(folder: str, blobs: dict[str, bytes]):
+    """
+    Write blobs under the given folder of the bucket, keyed by their names.
+    """
+    if blobs:
+        bucket: UPath = _remote_bucket() / folder
+        await asyncio.to_thread(
+            bucket.fs.pipe, {(bucket / quote(k)).path: v for k, v in blobs.items()}
+        )
+
+
+async def load_blobs(folder: str, keys: list[str]) -> dict[str, bytes]:
+    """
+    Read blobs under the given folder of the bucket concurrently, missing blobs are omitted.
+    """
+    if not keys:
+        return {}
+
+    bucket: UPath = _remote_bucket() / folder
+    paths: dict[str, str] = {(bucket / quote(k)).path: k for k in keys}
+    results: dict = await asyncio.to_thread(bucket.fs.cat, list(paths), on_error="omit")
+    return {paths[k]: v for k, v in results.items() if k in paths}
+
+
+async def delete_blobs(folder: str, keys: list[str], recursive: bool = False):
+    """
+    Delete blobs under the given folder of the bucket, with `recursive`, keys are treated as prefixes.
+    """
+    if keys:
+        bucket: UPath = _remote_bucket() / folder
+        with suppress(FileNotFoundError):
+            await asyncio.to_thread(
+                bucket.fs.rm,
+                [(bucket / quote(k)).path for k in keys],
+                recursive=recursive,
+            )
+
+
 def _store(upload: UploadFile) -> str:
     remote_obj = _remote_obj(upload.filename)
     with remote_obj.open("wb") as remote_file:
@@ -110,7 +150,13 @@ def serialize_records(records: list):
         bulk_body.append(
             r.model_dump(
                 # mode="json",
-                exclude={"scale_factor", "raw_data", "raw_data_unit", "offset"},
+                exclude={
+                    "scale_factor",
+                    "raw_data",
+                    "raw_data_unit",
+                    "offset",
+                    "response_spectrum",
+                },
                 exclude_none=True,
                 exclude_unset=True,
             )
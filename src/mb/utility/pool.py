@@ -0,0 +1,171 @@
+#  Copyright (C) 2022-2026 Theodore Chang
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import structlog
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+
+_logger = structlog.get_logger(__name__)
+
+
+class PoolSaturatedError(RuntimeError):
+    pass
+
+
+def _initialise(numba_threads: int, warm_up: bool):
+    import numba
+
+    numba.set_num_threads(max(1, min(numba_threads, numba.config.NUMBA_NUM_THREADS)))
+
+    if warm_up:
+        from ..record.warm_up import warm_up as _warm_up
+
+        _warm_up()
+
+
+def _timed(submitted: float, func: Callable, *args):
+    started: float = time.time()
+    return func(*args), started - submitted, time.time() - started
+
+
+class ComputePool:
+    """
+    A bounded pool that runs CPU heavy functions off the event loop.
+
+    With positive `max_workers`, functions run in spawned worker processes,
+    each limited to `numba_threads` numba threads, so that concurrent requests
+    scale with cores instead of serialising behind the GIL of a single process.
+    With zero `max_workers`, functions run in the thread pool of the server, which keeps
+    the event loop responsive for IO but does not add parallelism.
+
+    At most `max_pending` calls are admitted at a time, queued or running.
+    Further calls are rejected immediately with `PoolSaturatedError`, so that clients can back off.
+    HTTP exceptions with client error codes raised by functions, such as invalid configurations,
+    are counted as `client_errors` instead of `failed`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        numba_threads: int = 1,
+        max_pending: int = 64,
+        warm_up: bool = False,
+    ):
+        self.name: str = name
+        self.max_workers: int = max_workers
+        self.numba_threads: int = numba_threads
+        self.max_pending: int = max(max_pending, max_workers, 1)
+        self.warm_up: bool = warm_up
+
+        self._executor: ProcessPoolExecutor | None = None
+
+        self.pending: int = 0
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.client_errors: int = 0
+        self.rejected: int = 0
+        self.total_wait: float = 0.0
+        self.total_run: float = 0.0
+        self.max_wait: float = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.max_workers,
+                # forking a process with a running event loop and numba threads is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialise,
+                initargs=(self.numba_threads, self.warm_up),
+            )
+        return self._executor
+
+    async def run(self, func: Callable, *args, local: bool = False):
+        """
+        Run `func(*args)` in the pool, `func` and `args` shall be picklable if processes are used.
+
+        With `local`, the function runs in the thread pool even if processes are used,
+        which suits functions working on large in-process state that is costly to pickle.
+        Such calls are admitted and counted in the same way.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(f"Pool {self.name} is saturated.")
+
+        self.pending += 1
+        self.submitted += 1
+        try:
+            task = partial(_timed, time.time(), func, *args)
+            if self.max_workers > 0 and not local:
+                result, wait, run = await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), task
+                )
+            else:
+                result, wait, run = await run_in_threadpool(task)
+        except BrokenProcessPool:
+            # a worker died, start over with a fresh pool for subsequent calls
+            _logger.error("Worker process died, restarting pool.", pool=self.name)
+            self.failed += 1
+            self.shutdown()
+            raise
+        except HTTPException as e:
+            if e.status_code < 500:
+                self.client_errors += 1
+            else:
+                self.failed += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.total_wait += wait
+        self.total_run += run
+        self.max_wait = max(self.max_wait, wait)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "numba_threads": self.numba_threads,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "client_errors": self.client_errors,
+            "rejected": self.rejected,
+            "mean_wait": self.total_wait / self.completed if self.completed else 0.0,
+            "max_wait": self.max_wait,
+            "mean_run": self.total_run / self.completed if self.completed else 0.0,
+        }
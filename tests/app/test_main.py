@@ -15,9 +15,13 @@
 
 from http import HTTPStatus
 
+import numpy as np
 import pytest
 
-from mb.record.async_record import Record
+from mb.app.similarity import spectrum_index
+from mb.record import async_record
+from mb.record.archive import WaveformArchive
+from mb.record.async_record import Record, Waveform
 from mb.record.parser import ParserNZSM
 from mb.record.utility import str_factory
 from mb.utility import UPath
@@ -46,6 +50,18 @@ async def test_get_stats(mock_client):
     assert response.status_code == HTTPStatus.OK
 
 
+async def test_cache(mock_client):
+    response = await mock_client.get("/cache")
+    assert response.status_code == HTTPStatus.OK
+    assert "oscillator_coefficient" in response.json()
+
+
+async def test_pool(mock_client):
+    response = await mock_client.get("/pool")
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["pending"] == 0
+
+
 async def test_post_total(mock_client):
     response = await mock_client.post("/total")
     assert response.status_code == HTTPStatus.OK
@@ -92,6 +108,164 @@ async def test_query(mock_client, count_total):
     assert response.status_code == HTTPStatus.OK
 
 
+async def test_query_intensity_measure(sample_data, mock_client):
+    response = await mock_client.post(
+        "/query", json={"min_arias_intensity": 0, "max_significant_duration": 1e4}
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["records"]) > 0
+
+
+async def test_inelastic(sample_data, mock_client_superuser):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={
+            "with_inelastic_spectrum": True,
+            "ductility": [2, 4],
+            "strength_reduction_factor": [2],
+            "period_end": 1,
+            "period_step": 0.1,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["yield_strength"]) == 2
+    assert len(response.json()["ductility_demand"]) == 1
+
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={
+            "with_inelastic_spectrum": True,
+            "ductility": [2],
+            "strength_reduction_factor": [2],
+            "period_end": 1,
+            "period_step": 0.1,
+            "precision": "float32",
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    # inelastic spectra are rounded in the same way as other outputs
+    for key in ("yield_strength", "ductility_demand", "constant_strength_displacement"):
+        assert all(len(repr(y)) <= 16 for x in response.json()[key] for y in x)
+
+
+async def test_smoothed_spectrum(sample_data, mock_client_superuser):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={"with_smoothed_spectrum": True, "smoothing_frequency_count": 50},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json().get("spectrum") is None
+    assert len(response.json()["smoothed_spectrum"]) == 50
+
+
+async def test_spectrogram(sample_data, mock_client_superuser):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={
+            "with_spectrogram": True,
+            "with_scalogram": True,
+            "tile_time_bins": 32,
+            "tile_frequency_bins": 16,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    for key in ("spectrogram", "scalogram"):
+        amplitude = response.json()[key]["amplitude"]
+        assert len(amplitude) == len(response.json()[key]["frequency"]) <= 16
+        assert len(amplitude[0]) == len(response.json()[key]["time"]) <= 32
+
+
+async def test_single_precision(sample_data, mock_client_superuser):
+    responses = [
+        await mock_client_superuser.post(
+            f"/process?record_id={sample_data[0].id}",
+            json={"with_spectrum": True, "precision": precision},
+        )
+        for precision in ("float64", "float32")
+    ]
+    assert all(x.status_code == HTTPStatus.OK for x in responses)
+    assert len(responses[1].content) < len(responses[0].content)
+    assert np.allclose(
+        responses[1].json()["waveform"], responses[0].json()["waveform"], rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("period_grid", ["log", "adaptive"])
+async def test_period_grid(sample_data, mock_client_superuser, period_grid):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={
+            "with_response_spectrum": True,
+            "period_grid": period_grid,
+            "period_count": 50,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["period"]) <= 50
+    assert len(response.json()["acceleration_spectrum"]) == len(
+        response.json()["period"]
+    )
+
+
+async def test_baseline(sample_data, mock_client_superuser):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={"detrend_order": 2, "taper_ratio": 0.05, "with_integration": True},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["waveform"][0] == response.json()["waveform"][-1] == 0
+
+
+async def test_rotd(sample_data, mock_client_superuser):
+    record = next(x for x in sample_data if x.direction not in ("UP", "UD"))
+    response = await mock_client_superuser.post(
+        f"/process/rotd?record_id={record.id}",
+        json={"period_end": 2, "period_step": 0.1},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert record.id in response.json()["record_id"]
+    assert len(response.json()["rotd50"]) == len(response.json()["period"])
+
+
+@pytest.mark.parametrize("with_query", [True, False])
+async def test_similar(sample_data, mock_client, with_query):
+    config: dict = {
+        "period": [0.1, 0.5, 1.0, 2.0],
+        "spectrum": [200.0, 150.0, 60.0, 20.0],
+        "top_k": 3,
+        "with_scaling": True,
+    }
+    if with_query:
+        config["query"] = {"region": "nz"}
+    # parsed records carry their own scale factor, which is returned as is
+    assert all(x.scale_factor is not None for x in sample_data)
+    response = await mock_client.post("/similar", json=config)
+    assert response.status_code == HTTPStatus.OK
+    records = response.json()["records"]
+    assert 0 < len(records) <= 3
+    assert all(x["misfit"] >= 0 for x in records)
+    assert all(x["amplitude_scale"] > 0 for x in records)
+    assert all(x["scale_factor"] > 0 for x in records)
+
+
+async def test_correlated(sample_data, mock_client):
+    config: dict = {
+        "record_id": sample_data[0].id,
+        "query": {"pagination": {"page_size": 100}},
+        "top_k": 3,
+    }
+    for _ in range(2):
+        response = await mock_client.post("/correlated", json=config)
+        assert response.status_code == HTTPStatus.OK
+        records = response.json()["records"]
+        assert 0 < len(records) <= 3
+        assert all(-1 <= x["correlation"] <= 1 + 1e-6 for x in records)
+        assert sample_data[0].id not in [x["id"] for x in records]
+
+    response = await mock_client.post("/correlated", json={"record_id": "not-a-record"})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
 async def test_simple(sample_data, mock_client_superuser):
     response = await mock_client_superuser.post(
         f"/process?record_id={sample_data[0].id}",
@@ -107,6 +281,205 @@ async def test_simple(sample_data, mock_client_superuser):
     assert response.status_code == HTTPStatus.OK
 
 
+async def test_multi_damping(sample_data, mock_client_superuser):
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}",
+        json={"with_response_spectrum": True, "damping_ratios": [0.02, 0.05, 0.1]},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["acceleration_spectra"]) == 3
+
+
+@pytest.mark.parametrize("baseline_correction", [True, False])
+async def test_bulk(sample_data, mock_client_superuser, baseline_correction):
+    missing = str_factory()
+    response = await mock_client_superuser.post(
+        "/process/bulk",
+        json={
+            "record_id": [x.id for x in reversed(sample_data)] + [missing],
+            "process_config": {
+                "with_response_spectrum": True,
+                "with_integration": True,
+                "baseline_correction": baseline_correction,
+            },
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert [x["id"] for x in response.json()["records"]] == [
+        x.id for x in reversed(sample_data)
+    ]
+    assert response.json()["missing"] == [missing]
+    for record in response.json()["records"]:
+        assert len(record["velocity"]) == len(record["waveform"])
+        assert len(record["displacement"]) == len(record["waveform"])
+
+
+async def test_result_cache(sample_data, mock_client_superuser):
+    config = {"with_response_spectrum": True, "damping_ratio": 0.03}
+
+    async def _hits():
+        return (await mock_client_superuser.get("/cache")).json()["process_result"][
+            "hits"
+        ]
+
+    hits = await _hits()
+    first = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}", json=config
+    )
+    second = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}", json=config
+    )
+    assert first.status_code == second.status_code == HTTPStatus.OK
+    assert first.json() == second.json()
+    assert await _hits() == hits + 1
+
+    response = await mock_client_superuser.post(
+        "/process/bulk",
+        json={"record_id": [x.id for x in sample_data], "process_config": config},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        next(x for x in response.json()["records"] if x["id"] == sample_data[0].id)
+        == first.json()
+    )
+    assert await _hits() == hits + 2
+
+
+async def test_migrate(sample_data, mock_client_superuser):
+    record = sample_data[0]
+    _, raw_data = record.to_raw_waveform()
+    await Record.get_pymongo_collection().update_one(
+        {"_id": record.id}, {"$set": {"raw_data": raw_data.tolist()}}
+    )
+
+    response = await mock_client_superuser.post("/migrate")
+    assert response.status_code == HTTPStatus.ACCEPTED
+
+    migrated = await Record.get_pymongo_collection().find_one({"_id": record.id})
+    assert isinstance(migrated["raw_data"], bytes)
+    assert np.array_equal(
+        Record.model_validate(migrated).to_raw_waveform()[1], raw_data
+    )
+
+
+async def test_backfill(sample_data, mock_client_superuser):
+    record = sample_data[0]
+    await Record.get_pymongo_collection().update_one(
+        {"_id": record.id},
+        {"$set": {"response_spectrum": None, "maximum_velocity": None}},
+    )
+    await spectrum_index(refresh=True)
+
+    response = await mock_client_superuser.post("/query", json={"min_pgv": 0})
+    assert response.status_code == HTTPStatus.OK
+    assert record.id not in [x["id"] for x in response.json()["records"]]
+
+    config: dict = {
+        "period": [0.1, 0.5, 1.0],
+        "spectrum": [200.0, 150.0, 60.0],
+        "query": {"region": record.region},
+    }
+    response = await mock_client_superuser.post("/similar", json=config)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["unindexed"] == 1
+
+    response = await mock_client_superuser.post("/backfill")
+    assert response.status_code == HTTPStatus.ACCEPTED
+
+    backfilled = await Record.get(record.id)
+    assert np.allclose(
+        np.frombuffer(backfilled.response_spectrum, dtype=np.float32),
+        np.frombuffer(record.response_spectrum, dtype=np.float32),
+        rtol=1e-5,
+    )
+    assert np.isclose(backfilled.maximum_velocity, record.maximum_velocity)
+
+    await spectrum_index(refresh=True)
+    response = await mock_client_superuser.post("/similar", json=config)
+    assert response.json()["unindexed"] == 0
+
+
+async def test_split_waveform(sample_data, mock_client_superuser, monkeypatch):
+    monkeypatch.setattr(async_record, "MB_WAVEFORM_STORE", "collection")
+
+    response = await mock_client_superuser.post("/migrate")
+    assert response.status_code == HTTPStatus.ACCEPTED
+
+    record = sample_data[0]
+    document = await Record.get_pymongo_collection().find_one({"_id": record.id})
+    assert document["raw_data"] is None
+    assert await Waveform.get(record.id) is not None
+
+    response = await mock_client_superuser.post("/waveform", json=record.id)
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        len(response.json()["records"][0]["waveform"])
+        == record.to_raw_waveform()[1].size
+    )
+
+    await (await Record.get(record.id)).delete()
+    assert await Waveform.get(record.id) is None
+
+
+async def test_archive(sample_data, mock_client_superuser, monkeypatch, tmp_path):
+    monkeypatch.setattr(async_record, "MB_WAVEFORM_STORE", "collection")
+    monkeypatch.setattr(async_record, "WAVEFORM_ARCHIVE", WaveformArchive(tmp_path))
+
+    response = await mock_client_superuser.post("/migrate")
+    assert response.status_code == HTTPStatus.ACCEPTED
+    response = await mock_client_superuser.post("/archive")
+    assert response.status_code == HTTPStatus.ACCEPTED
+
+    response = await mock_client_superuser.get("/archive")
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["records"] == len(sample_data)
+
+    # waveforms are now served from the archive only
+    await Waveform.find_all().delete()
+
+    response = await mock_client_superuser.post("/waveform", json=sample_data[0].id)
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["records"][0]["waveform"]) == len(
+        sample_data[0].to_raw_waveform()[1]
+    )
+
+    response = await mock_client_superuser.post(
+        f"/process?record_id={sample_data[0].id}", json={"taper_ratio": 0.01}
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["raw_data"] == sample_data[0].to_raw_waveform()[1].tolist()
+
+
+async def test_archive_inline(
+    sample_data, mock_client_superuser, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(async_record, "WAVEFORM_ARCHIVE", WaveformArchive(tmp_path))
+
+    response = await mock_client_superuser.post("/archive")
+    assert response.status_code == HTTPStatus.ACCEPTED
+
+    # inline waveforms are not transferred, thus removing them does not matter
+    record = sample_data[0]
+    collection = Record.get_pymongo_collection()
+    await collection.update_one({"_id": record.id}, {"$set": {"raw_data": None}})
+    try:
+        response = await mock_client_superuser.post("/waveform", json=record.id)
+        assert response.status_code == HTTPStatus.OK
+        assert (
+            response.json()["records"][0]["raw_data"]
+            == record.to_raw_waveform()[1].tolist()
+        )
+
+        response = await mock_client_superuser.post(
+            f"/process?record_id={record.id}", json={"taper_ratio": 0.02}
+        )
+        assert response.status_code == HTTPStatus.OK
+    finally:
+        await collection.update_one(
+            {"_id": record.id}, {"$set": {"raw_data": record.raw_data}}
+        )
+
+
 @pytest.mark.parametrize("confirm", [True, False])
 async def test_purge(sample_data, mock_client_superuser, confirm):
     response = await mock_client_superuser.delete(f"/purge?confirm={confirm}")
@@ -20,7 +20,11 @@ from zipfile import ZipFile
 
 import numpy as np
 import pytest
+from beanie.operators import In
+from pymongo.errors import BulkWriteError
 
+from mb.record.async_record import Record, RecordWriter
+from mb.record.intensity_measure import INTENSITY_MEASURE
 from mb.record.parser import ParserNZSM
 from mb.record.response_spectrum import response_spectrum
 from mb.record.utility import str_factory
@@ -390,10 +394,59 @@ async def test_nz_parse_file(pwd, file_path, results, mongo_connection):
             mode="json",
             exclude_none=True,
             exclude_defaults=True,
-            exclude={"raw_data", "id", "uploaded_by"},
+            exclude={"raw_data", "id", "uploaded_by", *INTENSITY_MEASURE},
         )
         for x in records
     ]
+    for record in records:
+        assert all(getattr(record, x) >= 0 for x in INTENSITY_MEASURE)
+
+
+async def test_nz_record_writer(pwd, mongo_connection):
+    file_path = os.path.join(pwd, "data/20110222_015029_MQZ.V2A")
+
+    for _ in range(2):
+        # three components in two batches, parsing again replaces the existing records
+        async with RecordWriter(batch_size=2) as writer:
+            records = await ParserNZSM.parse_file(
+                file_path, str_factory(), None, writer
+            )
+
+    stored = await Record.find(
+        In(Record.file_hash, [x.file_hash for x in records])
+    ).to_list()
+    assert sorted(x.id for x in stored) == sorted(x.id for x in records)
+    assert all(x.response_spectrum is not None for x in stored)
+
+
+async def test_nz_record_writer_failure(pwd, mongo_connection, monkeypatch):
+    file_path = os.path.join(pwd, "data/20110222_015029_MQZ.V2A")
+    collection = Record.get_pymongo_collection()
+
+    class FailingCollection:
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+        @staticmethod
+        async def bulk_write(operations, **kwargs):
+            # the first record is rejected
+            await collection.bulk_write(operations[1:], **kwargs)
+            raise BulkWriteError(
+                {"writeErrors": [{"index": 0, "code": 2, "errmsg": "rejected"}]}
+            )
+
+    monkeypatch.setattr(
+        Record, "get_pymongo_collection", classmethod(lambda _: FailingCollection())
+    )
+
+    async with RecordWriter() as writer:
+        records = await ParserNZSM.parse_file(file_path, str_factory(), None, writer)
+        # records are only prepared when the batch is flushed
+        assert all(x.response_spectrum is None for x in records)
+
+    assert all(x.response_spectrum is not None for x in records)
+    assert writer.failed == {records[0].id}
+    assert writer.written(records) == records[1:]
 
 
 @pytest.mark.parametrize("file_path", ["nz_test.tar.gz", "nz_test.zip"])
@@ -14,9 +14,65 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import time
+
+import anyio
 import numpy as np
+import pytest
+from fastapi import HTTPException
 
-from mb.record.response_spectrum import Newmark, sdof_response
+from mb.record.archive import WaveformArchive
+from mb.record.correlation import correlation_spectrum, cross_correlate
+from mb.record.intensity_measure import batch_intensity_measure, intensity_measure
+from mb.record.response_spectrum import (
+    COEFFICIENT_CACHE,
+    Newmark,
+    Oscillator,
+    adaptive_response_spectra,
+    batch_integrate,
+    batch_response_spectrum,
+    constant_ductility_spectrum,
+    constant_strength_spectrum,
+    integrate,
+    log_period,
+    oscillator_coefficient,
+    response_spectra,
+    response_spectrum,
+    rotated_spectrum,
+    rotd_spectrum,
+    sdof_response,
+)
+from mb.record.similarity import (
+    SPECTRUM_PERIOD,
+    SpectrumIndex,
+    encode_spectrum,
+    interpolate_target,
+)
+from mb.record.utility import (
+    BASELINE_CACHE,
+    FFT_FILTER_THRESHOLD,
+    KONNO_OHMACHI_CACHE,
+    WINDOW_CACHE,
+    WaveformCodec,
+    apply_filter,
+    apply_taper,
+    decode_waveform,
+    encode_waveform,
+    get_window,
+    konno_ohmachi_matrix,
+    pack_waveforms,
+    perform_fft,
+    polyphase_resample,
+    remove_baseline,
+    scalogram,
+    smooth_spectrum,
+    spectrogram,
+    to_list,
+    zero_stuff,
+)
+from mb.record.warm_up import warm_up
+from mb.utility.cache import LRUCache
+from mb.utility.pool import ComputePool, PoolSaturatedError
 
 
 def test_integrate_newmark():
@@ -25,3 +81,498 @@ def test_integrate_newmark():
 
 def test_sdof():
     sdof_response(0.05, 0.01, 12.0, np.random.rand(1000))
+
+
+def test_response_spectra():
+    motion = np.random.rand(1000)
+    period = np.arange(0, 2, 0.01)
+    damping_ratio = np.array([0.02, 0.05, 0.1])
+    spectra = response_spectra(damping_ratio, 0.01, motion, period)
+    assert spectra.shape == (3, len(period), 3)
+    for i, ratio in enumerate(damping_ratio):
+        assert np.allclose(
+            spectra[i], response_spectrum(ratio, 0.01, motion, period), rtol=1e-12
+        )
+
+
+def test_batch_response_spectrum():
+    motions = [np.random.rand(n) for n in (300, 1000, 10)]
+    interval = np.array([0.01, 0.02, 0.005])
+    period = np.arange(0, 2, 0.01)
+    spectra = batch_response_spectrum(
+        np.array([0.05]), interval, *pack_waveforms(motions), period
+    )
+    assert spectra.shape == (3, 1, len(period), 3)
+    for i, motion in enumerate(motions):
+        assert np.allclose(
+            spectra[i, 0], response_spectrum(0.05, interval[i], motion, period)
+        )
+
+
+def test_maximum_response():
+    motion = np.random.rand(1000)
+    oscillator = Oscillator(2 * np.pi, 0.05)
+    peak = oscillator.compute_maximum_response(0.01, motion)
+    displacement, velocity, acceleration = oscillator.populate(motion)
+    assert peak == (
+        np.max(np.abs(displacement)) * oscillator.factor * 0.01,
+        np.max(np.abs(velocity)) * oscillator.factor,
+        np.max(np.abs(acceleration * oscillator.factor / 0.01 + motion)),
+    )
+
+
+def test_oscillator_coefficient_cache():
+    period = np.arange(0, 2, 0.01)
+    damping_ratio = np.array([0.05])
+    table = oscillator_coefficient(damping_ratio, 0.01, period)
+    hits = COEFFICIENT_CACHE.hits
+    assert table.shape == (1, len(period), 4)
+    assert not table.flags.writeable
+    assert oscillator_coefficient(damping_ratio, 0.01, period.copy()) is table
+    assert COEFFICIENT_CACHE.hits == hits + 1
+    assert oscillator_coefficient(damping_ratio, 0.02, period) is not table
+
+
+@pytest.mark.parametrize("window_length", [33, 2 * FFT_FILTER_THRESHOLD + 1])
+@pytest.mark.parametrize("waveform_length", [100, 10000])
+def test_apply_filter(window_length, waveform_length):
+    window = np.random.rand(window_length)
+    waveform = np.random.rand(waveform_length)
+    filtered = apply_filter(window, waveform)
+    reference = np.convolve(waveform, window, mode="same")
+    assert filtered.shape == reference.shape
+    assert np.allclose(filtered, reference, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("up_ratio,down_ratio", [(1, 2), (3, 1), (8, 5), (4, 4)])
+@pytest.mark.parametrize("filter_length", [32, 300])
+def test_polyphase_resample(up_ratio, down_ratio, filter_length):
+    waveform = np.random.rand(2000)
+    window = get_window(
+        "bandpass", "nuttall", filter_length, [0.01, 0.2], ratio=up_ratio
+    )
+    resampled = polyphase_resample(up_ratio, down_ratio, window, waveform)
+    reference = apply_filter(window, zero_stuff(up_ratio, waveform))[::down_ratio]
+    assert resampled.shape == reference.shape
+    assert np.allclose(resampled, reference, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("up_ratio,down_ratio", [(3, 1), (1, 3), (2, 3)])
+def test_polyphase_resample_short(up_ratio, down_ratio):
+    # the window is longer than the upsampled waveform
+    waveform = np.random.rand(100)
+    window = get_window("lowpass", "hann", 501, 0.2, ratio=up_ratio)
+    resampled = polyphase_resample(up_ratio, down_ratio, window, waveform)
+    reference = apply_filter(window, zero_stuff(up_ratio, waveform))[::down_ratio]
+    assert resampled.shape == reference.shape
+    assert np.allclose(resampled, reference, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("window_type", ["nuttall", "kaiser", "chebwin"])
+def test_get_window_cache(window_type):
+    window = get_window("bandpass", window_type, 64, [0.1, 0.3], ratio=2)
+    assert not window.flags.writeable
+    hits = WINDOW_CACHE.hits
+    assert (
+        get_window("bandpass", window_type, 64, [0.1 + 1e-15, 0.3], ratio=2) is window
+    )
+    assert WINDOW_CACHE.hits == hits + 1
+    assert get_window("bandpass", window_type, 64, [0.1, 0.3]) is not window
+
+
+def test_warm_up():
+    assert warm_up() >= 0
+
+
+def test_batch_integrate():
+    waveforms = [np.random.rand(n) for n in (100, 257, 1000)]
+    interval = np.array([0.01, 0.02, 0.005])
+    displacement, velocity = batch_integrate(interval, *pack_waveforms(waveforms))
+    offset = 0
+    for dt, waveform in zip(interval, waveforms, strict=True):
+        d, v = Newmark().integrate(dt, waveform)
+        assert np.array_equal(displacement[offset : offset + len(waveform)], d)
+        assert np.array_equal(velocity[offset : offset + len(waveform)], v)
+        offset += len(waveform)
+
+
+def test_baseline_correction():
+    # constant acceleration leads to linear velocity, which shall be fully removed
+    displacement, velocity = integrate(
+        0.01, np.full(200, 3.0), baseline_correction=True
+    )
+    assert np.allclose(velocity, 0, atol=1e-10)
+    assert np.allclose(displacement, 0, atol=1e-10)
+
+
+def test_intensity_measure():
+    # constant acceleration of 1 Gal over 10 seconds
+    result = intensity_measure(0.01, np.ones(1001))
+    assert result["maximum_velocity"] == pytest.approx(0, abs=1e-10)
+    assert result["maximum_displacement"] == pytest.approx(0, abs=1e-10)
+    assert result["arias_intensity"] == pytest.approx(np.pi / 2 / 9.80665 * 1e-3)
+    assert result["cumulative_absolute_velocity"] == pytest.approx(10)
+    assert result["significant_duration"] == pytest.approx(9)
+
+
+def test_batch_intensity_measure():
+    waveforms = [np.random.rand(n) - 0.5 for n in (100, 257, 1000)]
+    interval = np.array([0.01, 0.02, 0.005])
+    result = batch_intensity_measure(interval, *pack_waveforms(waveforms))
+    for dt, waveform, row in zip(interval, waveforms, result, strict=True):
+        assert np.allclose(list(intensity_measure(dt, waveform).values()), row)
+
+
+@pytest.mark.parametrize("prune_stride", [1, 4])
+def test_spectrum_index(prune_stride):
+    spectra = np.exp(np.random.randn(500, len(SPECTRUM_PERIOD)))
+    index = SpectrumIndex(
+        [str(i) for i in range(len(spectra))], [encode_spectrum(x) for x in spectra]
+    )
+
+    log_target, mask = interpolate_target(SPECTRUM_PERIOD, 3 * spectra[42])
+    assert mask.all()
+
+    rows, misfit, scale_factor = index.search(
+        log_target, mask, 5, with_scaling=True, prune_stride=prune_stride
+    )
+    assert rows[0] == 42
+    assert misfit[0] == pytest.approx(0, abs=1e-6)
+    assert scale_factor[0] == pytest.approx(3, rel=1e-5)
+    assert np.all(np.diff(misfit) >= 0)
+
+    rows, misfit, scale_factor = index.search(
+        log_target, mask, 5, rows=index.rows(["7", "42", "missing"])
+    )
+    assert rows.tolist() == [42, 7]
+    assert misfit[0] == pytest.approx(np.log(3), rel=1e-5)
+    assert np.all(scale_factor == 1)
+
+
+def test_interpolate_target():
+    log_target, mask = interpolate_target(np.array([1.0, 0.1]), np.array([50, 100]))
+    assert SPECTRUM_PERIOD[mask].min() >= 0.1
+    assert SPECTRUM_PERIOD[mask].max() <= 1.0
+    assert np.exp(log_target[mask][0]) == pytest.approx(100, rel=0.1)
+
+
+def test_rotated_spectrum():
+    first = np.random.randn(1000)
+    second = np.random.randn(1000)
+    period = np.arange(0, 2, 0.1)
+    angle, peak = rotated_spectrum(0.05, 0.01, first, second, period, angle_step=15)
+    assert peak.shape == (len(period), len(angle))
+
+    omega = 2 * np.pi / period[1:]
+    for i, theta in enumerate(np.deg2rad(angle)):
+        reference = response_spectrum(
+            0.05, 0.01, np.cos(theta) * first + np.sin(theta) * second, period
+        )
+        assert np.allclose(peak[1:, i], reference[1:, 0] * omega**2)
+        assert peak[0, i] == pytest.approx(reference[0, 2])
+
+    rotd = rotd_spectrum(0.05, 0.01, first, second, period)
+    assert np.all(rotd[:, 0] <= rotd[:, 1])
+
+
+@pytest.mark.parametrize("hardening_ratio", [0.0, 0.05])
+def test_inelastic_spectrum(hardening_ratio):
+    motion = np.convolve(100 * np.random.randn(1000), np.ones(5) / 5, mode="same")
+    period = np.arange(0, 2, 0.25)
+    ductility = np.array([4.0, 1.0, 2.0])
+
+    spectra = constant_ductility_spectrum(
+        0.05, 0.01, motion, period, ductility, hardening_ratio
+    )
+    assert spectra.shape == (3, len(period), 3)
+    # unit ductility gives elastic response, strength decreases with ductility
+    assert np.allclose(spectra[1, 1:, 1], 1)
+    assert np.all(spectra[0, 1:, 0] < spectra[2, 1:, 0])
+    assert np.all(spectra[2, 1:, 0] < spectra[1, 1:, 0])
+
+    # constant-strength spectra with the found reduction factors recover target ductilities
+    for j in range(1, len(period)):
+        demand = constant_strength_spectrum(
+            0.05, 0.01, motion, period, spectra[:, j, 1], hardening_ratio
+        )
+        assert np.allclose(demand[:, j, 0], ductility, rtol=1e-2)
+        assert np.allclose(demand[:, j, 1], spectra[:, j, 2])
+
+
+def test_smooth_spectrum():
+    frequency_interval, spectrum = perform_fft(100, np.random.randn(4000))
+    frequency = np.geomspace(0.5, 40, 20)
+    bandwidth = 40.0
+
+    smoothed = smooth_spectrum(frequency_interval, spectrum, frequency, bandwidth)
+
+    # dense reference over the whole spectrum
+    f = frequency_interval * np.arange(1, len(spectrum))
+    reference = np.empty_like(frequency)
+    for i, fc in enumerate(frequency):
+        weight = np.sinc(bandwidth * np.log10(f / fc) / np.pi) ** 4
+        reference[i] = weight @ spectrum[1:] / weight.sum()
+    assert np.allclose(smoothed, reference, rtol=1e-3)
+
+    # a flat spectrum stays flat
+    assert np.allclose(
+        smooth_spectrum(frequency_interval, np.ones_like(spectrum), frequency), 1
+    )
+
+    hits = KONNO_OHMACHI_CACHE.hits
+    assert konno_ohmachi_matrix(
+        len(spectrum), frequency_interval, frequency, bandwidth
+    ) is konno_ohmachi_matrix(len(spectrum), frequency_interval, frequency, bandwidth)
+    assert KONNO_OHMACHI_CACHE.hits > hits
+
+
+def test_spectrogram():
+    time = 0.01 * np.arange(6000)
+    waveform = 3 * np.sin(10 * np.pi * time) + np.sin(40 * np.pi * time) * (time > 30)
+
+    t, f, amplitude = spectrogram(0.01, waveform, 200, time_bins=64)
+    assert amplitude.shape == (len(f), len(t)) == (101, 64)
+    assert np.all(np.diff(t) > 0)
+    assert np.isclose(f[np.argmax(amplitude[:, 5])], 5)
+    assert np.isclose(amplitude[:, 5].max(), 3)
+    assert amplitude[np.argmin(np.abs(f - 20)), 5] < 1e-2
+    assert np.isclose(amplitude[np.argmin(np.abs(f - 20)), -5], 1)
+
+    # pooled to fewer frequency bins
+    t, f, amplitude = spectrogram(0.01, waveform, 200, time_bins=64, frequency_bins=50)
+    assert amplitude.shape == (len(f), len(t)) == (50, 64)
+
+    # six points per octave, 5 Hz and 20 Hz are on the grid
+    frequency = np.geomspace(1.25, 40, 31)
+    t, amplitude = scalogram(0.01, waveform, frequency, time_bins=64)
+    assert amplitude.shape == (len(frequency), len(t)) == (31, 64)
+    # unit gain at the scale frequency
+    assert np.argmax(amplitude[:, 16]) == 12
+    assert np.isclose(amplitude[12, 16], 3, rtol=1e-3)
+    assert np.isclose(amplitude[24, -16], 1, rtol=1e-3)
+
+
+def test_single_precision():
+    motion = np.convolve(100 * np.random.randn(2000), np.ones(5) / 5, mode="same")
+    single = motion.astype(np.float32)
+    period = np.arange(0, 2, 0.1)
+
+    spectra = response_spectra(np.array([0.02, 0.05]), 0.01, motion, period)
+    assert np.allclose(
+        response_spectra(np.array([0.02, 0.05]), 0.01, single, period),
+        spectra,
+        rtol=1e-5,
+    )
+
+    _, offset = pack_waveforms([motion, motion[:1000]])
+    packed, _ = pack_waveforms([single, single[:1000]], np.float32)
+    assert packed.dtype == np.float32
+    assert np.allclose(
+        batch_response_spectrum(
+            np.array([0.05]), np.array([0.01, 0.02]), packed, offset, period
+        )[0, 0],
+        spectra[1],
+        rtol=1e-5,
+    )
+
+    displacement, velocity = integrate(0.01, single, baseline_correction=True)
+    assert displacement.dtype == velocity.dtype == np.float32
+    reference, _ = integrate(0.01, motion, baseline_correction=True)
+    assert np.allclose(
+        displacement, reference, rtol=1e-4, atol=1e-4 * np.max(np.abs(reference))
+    )
+
+    window = get_window("lowpass", "hann", 64, 0.2, ratio=2)
+    resampled = polyphase_resample(2, 3, window, single)
+    assert resampled.dtype == np.float32
+    assert np.allclose(resampled, polyphase_resample(2, 3, window, motion), atol=1e-3)
+    assert apply_filter(window, single).dtype == np.float32
+    assert perform_fft(100, single)[1].dtype == np.float32
+
+    # single precision values survive serialisation exactly
+    assert np.array_equal(np.array(to_list(single), dtype=np.float32), single)
+    extreme = np.array([3.4e38, -7.5e30, 1.1, -2.5e-40, 1e-45, 0.0], dtype=np.float32)
+    assert np.array_equal(np.array(to_list(extreme), dtype=np.float32), extreme)
+    # no long reprs from rounding through inexact powers of ten
+    assert to_list(extreme)[0] == 3.4e38
+    assert all(len(repr(x)) <= 16 for x in to_list(extreme))
+
+
+def test_adaptive_response_spectra():
+    motion = np.convolve(100 * np.random.randn(500), np.ones(5) / 5, mode="same")
+    damping_ratio = np.array([0.02, 0.05])
+
+    period, spectra = adaptive_response_spectra(
+        damping_ratio, 0.01, motion, log_period(0.02, 5, 8), 0.02, 60
+    )
+    assert 8 < len(period) <= 60
+    assert np.all(np.diff(period) > 0)
+    assert np.allclose(spectra, response_spectra(damping_ratio, 0.01, motion, period))
+
+    # refined grids interpolate better than uniform grids of the same size
+    dense = log_period(0.02, 5, 300)
+    reference = response_spectra(damping_ratio, 0.01, motion, dense)[1, :, 2]
+
+    def error(grid, spectrum):
+        interpolated = np.interp(dense, grid, spectrum)
+        return np.max(np.abs(interpolated - reference) / reference)
+
+    uniform = np.linspace(0.02, 5, len(period))
+    assert error(period, spectra[1, :, 2]) < error(
+        uniform, response_spectra(damping_ratio, 0.01, motion, uniform)[1, :, 2]
+    )
+
+
+@pytest.mark.parametrize("order", [0, 1, 3])
+def test_remove_baseline(order):
+    time = np.linspace(0, 10, 1001)
+    signal = np.sin(2 * np.pi * time)
+    waveform = signal + np.polyval(np.arange(1, order + 2), time)
+
+    corrected = remove_baseline(waveform, order)
+    # the residual is orthogonal to all polynomials up to the order
+    assert np.allclose(np.polyfit(time, corrected, order), 0, atol=1e-10)
+    assert np.allclose(corrected, remove_baseline(signal, order))
+    assert remove_baseline(waveform.astype(np.float32), order).dtype == np.float32
+
+    hits = BASELINE_CACHE.hits
+    remove_baseline(signal, order)
+    assert BASELINE_CACHE.hits == hits + 1
+
+    tapered = apply_taper(waveform, 0.1)
+    assert tapered[0] == tapered[-1] == 0
+    assert np.array_equal(tapered[101:900], waveform[101:900])
+
+
+def test_cross_correlate():
+    waveform = np.convolve(np.random.randn(6000), np.ones(10) / 10, mode="same")
+    query = correlation_spectrum(0.01, waveform)
+
+    # the same motion resampled at 200 Hz and delayed by 3 s
+    delayed = np.interp(
+        np.arange(0, 60, 0.005), 0.01 * np.arange(6000) + 3, waveform, left=0, right=0
+    )
+    candidates = [
+        correlation_spectrum(0.005, delayed),
+        correlation_spectrum(0.01, 2 * waveform + 1),
+        correlation_spectrum(0.01, np.random.randn(3000)),
+    ]
+
+    correlation, lag = cross_correlate(query, candidates)
+    assert correlation[0] > 0.95
+    assert np.isclose(lag[0], 3)
+    assert np.isclose(correlation[1], 1, atol=1e-3)
+    assert lag[1] == 0
+    assert correlation[2] < 0.3
+
+    correlation, lag = cross_correlate(query, candidates, max_lag=1)
+    assert correlation[0] < 0.3
+    assert np.all(np.abs(lag) <= 1)
+
+
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_compute_pool():
+    pool = ComputePool("test", 0, max_pending=2)
+    assert await pool.run(np.sum, np.arange(10)) == 45
+
+    with pytest.raises(ValueError):
+        await pool.run(np.reshape, np.arange(10), (3, 3))
+
+    def invalid():
+        raise HTTPException(400, detail="Invalid configuration.")
+
+    with pytest.raises(HTTPException):
+        await pool.run(invalid, local=True)
+
+    rejected = []
+
+    async def submit():
+        try:
+            await pool.run(time.sleep, 0.1)
+        except PoolSaturatedError:
+            rejected.append(True)
+
+    async with anyio.create_task_group() as group:
+        for _ in range(4):
+            group.start_soon(submit)
+
+    stats = pool.stats()
+    assert len(rejected) == 2
+    assert stats["pending"] == 0
+    assert stats["submitted"] == 5
+    assert stats["completed"] == 3
+    assert stats["failed"] == 1
+    assert stats["client_errors"] == 1
+    assert stats["rejected"] == 2
+    assert stats["mean_run"] > 0
+
+
+@pytest.mark.parametrize("codec", list(WaveformCodec))
+@pytest.mark.parametrize("delta", [True, False])
+@pytest.mark.parametrize("bound", [2**31, 2**40])
+def test_waveform_codec(codec, delta, bound):
+    raw_data = np.random.randint(-bound, bound, 1000)
+    encoded = encode_waveform(raw_data.tolist(), codec, delta)
+    assert isinstance(encoded, bytes)
+    assert np.array_equal(decode_waveform(encoded), raw_data)
+    assert decode_waveform(encode_waveform([], codec, delta)).size == 0
+
+    smooth = np.cumsum(np.random.randint(-10, 10, 10000))
+    if codec != WaveformCodec.Plain:
+        assert len(encode_waveform(smooth, codec, delta)) < 2 * smooth.size
+
+    assert np.array_equal(decode_waveform(smooth.tolist()), smooth)
+
+
+def test_waveform_archive(tmp_path):
+    writer = WaveformArchive(tmp_path)
+    reader = WaveformArchive(tmp_path)
+
+    raw_data = {f"{i}": np.random.randint(-1000, 1000, 100 + i) for i in range(10)}
+    with writer.writer() as (append, _):
+        for k, v in raw_data.items():
+            append(k, f"hash{k}", v)
+
+    reader.refresh()
+    assert len(reader) == 10
+    for k, v in raw_data.items():
+        assert np.array_equal(reader.get(k, f"hash{k}"), v)
+    assert reader.get("0", "other") is None
+    assert reader.get("missing") is None
+
+    with writer.writer() as (append, remove):
+        append("0", "other", np.arange(5))
+        remove(["1"])
+
+    reader.refresh()
+    assert np.array_equal(reader.get("0", "other"), np.arange(5))
+    assert "1" not in reader
+
+    with writer.writer(compact=True) as (append, _):
+        append("2", "hash2", raw_data["2"])
+
+    reader.refresh()
+    assert len(reader) == 1
+    assert np.array_equal(reader.get("2"), raw_data["2"])
+    assert reader.stats()["samples"] == raw_data["2"].size
+
+
+def test_byte_bounded_cache():
+    cache = LRUCache("test_byte_bounded", 100, max_bytes=10)
+
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 4)
+    assert "b" not in cache
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("d", 4, 11)
+    assert "d" not in cache
+
+    cache.put("a", 5, 2)
+    assert cache.stats()["bytes"] == 6
+    assert cache.remove_if(lambda k: k in ("a", "c")) == 2
+    assert len(cache) == 0
+    assert cache.stats()["bytes"] == 0